@@ -1,4 +1,6 @@
+from api.jobs import router as router_jobs
+from api.metrics import router as router_metrics
 from api.templater import router as router_tables
 
 # should include all routes of project
-all_routers = [router_tables]
+all_routers = [router_tables, router_jobs, router_metrics]
@@ -0,0 +1,158 @@
+import asyncio
+from typing import Any, Dict, Literal
+from uuid import UUID
+
+from fastapi import APIRouter, HTTPException, Path, Query
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from api.templater import _stream_report
+from loaded_env import get_variables
+from schemas.templater import TemplaterRequest
+from services.report_jobs import REPORT_JOBS
+from utils.job_store import JOB_DONE, JOB_FAILED
+from utils.logger import GLOBAL_LOGGER
+
+router = APIRouter(
+    prefix="/enquiry/api/v1/jobs",
+    tags=["Report jobs"],
+)
+
+REPORT_MEDIA_TYPES = {
+    "xlsx": (
+        "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+    ),
+    "docx": (
+        "application/vnd.openxmlformats-officedocument.wordprocessingml"
+        ".document"
+    ),
+    "pdf": "application/pdf",
+}
+
+
+def _job_content(job: Dict[str, Any]) -> Dict[str, Any]:
+    """Формирует описание задачи для ответа API.
+
+    Args:
+        job (Dict[str, Any]): Задача из `ReportJobStore`.
+
+    Returns:
+        Dict[str, Any]: Статус задачи и ссылка на справку, если она готова.
+
+    """
+    content = {
+        "job_id": job["id"],
+        "enquiry_id": job["enquiry_id"],
+        "format": job["format"],
+        "status": job["status"],
+        "error": job["error"],
+        "size": job["size"],
+        "created_at": job["created_at"],
+        "started_at": job["started_at"],
+        "finished_at": job["finished_at"],
+    }
+    if job["status"] == JOB_DONE:
+        content["result_url"] = f"{router.prefix}/{job['id']}/result"
+    return content
+
+
+@router.post("/{enquiry_id}/{report_format}/")
+async def submit_report_job(
+    templater_params: TemplaterRequest,
+    enquiry_id: int = Path(
+        ..., description="ID справки для формирования шаблона"
+    ),
+    report_format: Literal["xlsx", "docx", "pdf"] = Path(
+        ..., description="Формат справки"
+    ),
+) -> JSONResponse:
+    """Ставит формирование справки в очередь фоновых задач.
+
+    Args:
+        templater_params (TemplaterRequest): Параметры для фильтрации
+            данных во внешних запросах.
+        enquiry_id (int): ID справки для формирования шаблона.
+        report_format (str): Формат справки.
+
+    Returns:
+        JSONResponse: Ответ `202` с ID задачи и ее статусом.
+
+    """
+    job = await REPORT_JOBS.submit(enquiry_id, report_format, templater_params)
+    GLOBAL_LOGGER.debug(
+        f"Задача {job['id']} на справку {enquiry_id} ({report_format}) "
+        "поставлена в очередь"
+    )
+    return JSONResponse(
+        status_code=202,
+        content=_job_content(job),
+        headers={"Location": f"{router.prefix}/{job['id']}"},
+    )
+
+
+@router.get("/{job_id}")
+async def get_report_job(
+    job_id: UUID = Path(..., description="ID задачи"),
+    wait: float = Query(
+        0,
+        ge=0,
+        description="Сколько секунд ждать завершения задачи (long-poll)",
+    ),
+) -> JSONResponse:
+    """Получает статус задачи, при `wait` - дожидаясь ее завершения.
+
+    Args:
+        job_id (UUID): ID задачи.
+        wait (float): Время ожидания завершения в секундах, не больше
+            `REPORT_JOB_MAX_WAIT`.
+
+    Returns:
+        JSONResponse: Статус задачи.
+
+    Raises:
+        HTTPException: Задача не найдена.
+    """
+    job = await REPORT_JOBS.wait(
+        job_id.hex, min(wait, get_variables().REPORT_JOB_MAX_WAIT)
+    )
+    if job is None:
+        raise HTTPException(status_code=404, detail="Задача не найдена")
+    return JSONResponse(content=_job_content(job))
+
+
+@router.get("/{job_id}/result", response_model=None)
+async def get_report_job_result(
+    job_id: UUID = Path(..., description="ID задачи"),
+) -> StreamingResponse:
+    """Отдает справку выполненной задачи.
+
+    Args:
+        job_id (UUID): ID задачи.
+
+    Returns:
+        StreamingResponse: HTTP-ответ, содержащий файл справки.
+
+    Raises:
+        HTTPException: Задача не найдена (`404`), еще не выполнена или
+        завершилась ошибкой (`409`), справка удалена из хранилища по
+        сроку или объему (`410`).
+    """
+    job = await REPORT_JOBS.get(job_id.hex)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Задача не найдена")
+    if job["status"] == JOB_FAILED:
+        raise HTTPException(status_code=409, detail=job["error"])
+    if job["status"] != JOB_DONE:
+        raise HTTPException(
+            status_code=409, detail="Справка еще не сформирована"
+        )
+    report = await asyncio.to_thread(REPORT_JOBS.artefacts.open, job_id.hex)
+    if report is None:
+        raise HTTPException(
+            status_code=410, detail="Справка удалена из хранилища"
+        )
+    return _stream_report(
+        report,
+        None,
+        REPORT_MEDIA_TYPES[job["format"]],
+        f"zealot.{job['format']}",
+    )
@@ -0,0 +1,34 @@
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+
+from utils.render_executor import RENDER_EXECUTOR
+from utils.report_cache import RENDERED_REPORT_CACHE
+
+router = APIRouter(
+    prefix="/enquiry/api/v1/metrics",
+    tags=["Metrics"],
+)
+
+
+@router.get("/render")
+async def get_render_metrics() -> JSONResponse:
+    """Получает метрики пула формирования документов.
+
+    Returns:
+        JSONResponse: Глубина очереди, число выполняемых задач и время
+        ожидания задач в очереди.
+
+    """
+    return JSONResponse(content=RENDER_EXECUTOR.stats())
+
+
+@router.get("/report-cache")
+async def get_report_cache_metrics() -> JSONResponse:
+    """Получает метрики кэша сформированных справок.
+
+    Returns:
+        JSONResponse: Попадания, промахи и объединенные запросы, доля
+        попаданий, заполненность кэша и число вытеснений.
+
+    """
+    return JSONResponse(content=RENDERED_REPORT_CACHE.stats())
@@ -1,25 +1,80 @@
 import os
 import shutil
 import time
+import zipfile
+from typing import BinaryIO, Iterator, Literal
 
-from fastapi import APIRouter, HTTPException, Path, Query
-from fastapi.encoders import jsonable_encoder
-from fastapi.responses import FileResponse, JSONResponse
-from starlette.background import BackgroundTask
+from fastapi import APIRouter, Header, HTTPException, Path, Query, Response
+from fastapi.responses import JSONResponse, StreamingResponse
+from starlette.background import BackgroundTasks
 
 from api.dependencies import UOWDep
 from schemas.templater import TemplaterRequest
+from services.base_templater import BaseTemplater
 from services.templaterDocx import DocxTemplate
 from services.templaterPdf import PdfCreation
 from services.templaterXlsx import TemplaterXlsx
 from utils.logger import GLOBAL_LOGGER
+from utils.render_executor import RENDER_EXECUTOR
 from utils.utils import ExternalQueryExecutor
+from utils.workspace import RequestWorkspace
 
 router = APIRouter(
     prefix="/enquiry/api/v1",
     tags=["Enquiries"],
 )
 
+REPORT_CHUNK_SIZE = 64 * 1024
+# Форматы справки в архиве и имена их файлов
+BUNDLE_FILENAMES = {
+    "xlsx": "zealot.xlsx",
+    "docx": "zealot.docx",
+    "pdf": "zealot.pdf",
+}
+
+
+def _stream_report(
+    report: BinaryIO,
+    workspace: RequestWorkspace | None,
+    media_type: str,
+    filename: str,
+) -> StreamingResponse:
+    """Отдает справку из буфера частями.
+
+    После отправки буфер закрывается, а рабочий каталог запроса удаляется.
+
+    Args:
+        report (BinaryIO): Буфер со справкой.
+        workspace (RequestWorkspace | None): Рабочий каталог запроса или
+            None, если удалять нечего.
+        media_type (str): MIME-тип справки.
+        filename (str): Имя файла для `Content-Disposition`.
+
+    Returns:
+        StreamingResponse: HTTP-ответ со справкой.
+
+    """
+    size = report.seek(0, os.SEEK_END)
+    report.seek(0)
+
+    def chunks() -> Iterator[bytes]:
+        while chunk := report.read(REPORT_CHUNK_SIZE):
+            yield chunk
+
+    background = BackgroundTasks()
+    background.add_task(report.close)
+    if workspace is not None:
+        background.add_task(workspace.cleanup)
+    return StreamingResponse(
+        chunks(),
+        media_type=media_type,
+        headers={
+            "Content-Disposition": f"attachment; filename={filename}",
+            "Content-Length": str(size),
+        },
+        background=background,
+    )
+
 
 @router.post("/{enquiry_id}/xlsx/", response_model=None)
 async def generate_excel_file(
@@ -28,7 +83,7 @@ async def generate_excel_file(
     enquiry_id: int = Path(
         ..., description="ID справки для формирования шаблона"
     ),
-) -> FileResponse:
+) -> StreamingResponse:
     """Генерирует справку формата `.xlsx` .
 
     Args:
@@ -38,22 +93,22 @@ async def generate_excel_file(
             данных во внешних запросах.
 
     Returns:
-        FileResponse: HTTP-ответ, содержащий сгенерированный файл справки.
+        StreamingResponse: HTTP-ответ, содержащий сгенерированный файл
+        справки.
 
     """
     start_time = time.perf_counter()
     templater_xlsx = TemplaterXlsx(uow, enquiry_id, templater_params)
     GLOBAL_LOGGER.debug(f"начало выполнения скрипта - {time.ctime()}\n")
-    file_path = await templater_xlsx.generate_report_from_template()
-    task = BackgroundTask(os.unlink, file_path)
+    report = await templater_xlsx.generate_report_from_template()
     GLOBAL_LOGGER.debug(
         "enquiry created in %2.f seconds" % (time.perf_counter() - start_time)
     )
-    return FileResponse(
-        path=file_path,
-        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        headers={"Content-Disposition": "attachment; filename=zealot.xlsx"},
-        background=task,
+    return _stream_report(
+        report,
+        templater_xlsx.workspace,
+        "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        "zealot.xlsx",
     )
 
 
@@ -76,7 +131,7 @@ async def generate_word_file(
     enquiry_id: int = Path(
         ..., description="ID справки для формирования шаблона"
     ),
-) -> FileResponse:
+) -> StreamingResponse:
     """Генерирует справку формата `.docx` .
 
     Args:
@@ -86,7 +141,8 @@ async def generate_word_file(
             данных во внешних запросах.
 
     Returns:
-        FileResponse: HTTP-ответ, содержащий сгенерированный файл справки.
+        StreamingResponse: HTTP-ответ, содержащий сгенерированный файл
+        справки.
 
     """
     start_time = time.perf_counter()
@@ -95,18 +151,17 @@ async def generate_word_file(
 
     GLOBAL_LOGGER.debug(f"начало выполнения скрипта - {time.ctime()}\n")
 
-    file_path = await templater_docx.generate_report_from_template()
-    task = BackgroundTask(os.unlink, file_path)
+    report = await templater_docx.generate_report_from_template()
 
     GLOBAL_LOGGER.debug(
         "enquiry created in %2.f seconds" % (time.perf_counter() - start_time)
     )
 
-    return FileResponse(
-        path=file_path,
-        media_type="application/vnd.openxmlformats-officedocument.wordprocessingml.document",
-        headers={"Content-Disposition": "attachment; filename=zealot.docx"},
-        background=task,
+    return _stream_report(
+        report,
+        templater_docx.workspace,
+        "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+        "zealot.docx",
     )
 
 
@@ -117,7 +172,7 @@ async def generate_pdf_file(
     enquiry_id: int = Path(
         ..., description="ID справки для формирования шаблона"
     ),
-) -> FileResponse:
+) -> StreamingResponse:
     """Генерирует справку формата `.pdf` .
 
     Args:
@@ -127,40 +182,148 @@ async def generate_pdf_file(
             данных во внешних запросах.
 
     Returns:
-        FileResponse: HTTP-ответ, содержащий сгенерированный файл справки.
+        StreamingResponse: HTTP-ответ, содержащий сгенерированный файл
+        справки.
 
     """
     start_time = time.perf_counter()
     templater_pdf = PdfCreation(uow, enquiry_id, templater_params)
     GLOBAL_LOGGER.debug(f"начало выполнения скрипта - {time.ctime()}\n")
-    file_path = await templater_pdf.pdf_creation()
-    task = BackgroundTask(shutil.rmtree, os.path.dirname(file_path))
+    report = await templater_pdf.pdf_creation()
     GLOBAL_LOGGER.debug(
         "enquiry created in %2.f seconds" % (time.perf_counter() - start_time)
     )
-    return FileResponse(
-        path=file_path,
-        media_type="application/pdf",
-        headers={"Content-Disposition": "attachment; filename=zealot.pdf"},
-        background=task,
+    return _stream_report(
+        report, templater_pdf.workspace, "application/pdf", "zealot.pdf"
     )
 
 
-@router.get("/{enquiry_id}/")
+def _zip_reports(reports: dict[str, BinaryIO], output: BinaryIO) -> None:
+    """Записывает справки в zip-архив и закрывает их буферы.
+
+    Args:
+        reports (dict[str, BinaryIO]): Буферы справок по именам файлов.
+        output (BinaryIO): Буфер для архива.
+
+    """
+    with zipfile.ZipFile(output, "w", zipfile.ZIP_DEFLATED) as archive:
+        for filename, report in reports.items():
+            with report, archive.open(filename, "w") as entry:
+                shutil.copyfileobj(report, entry, REPORT_CHUNK_SIZE)
+    output.seek(0)
+
+
+@router.post("/{enquiry_id}/bundle/", response_model=None)
+async def generate_bundle(
+    uow: UOWDep,
+    templater_params: TemplaterRequest,
+    enquiry_id: int = Path(
+        ..., description="ID справки для формирования шаблона"
+    ),
+    formats: list[Literal["xlsx", "docx", "pdf"]] = Query(
+        list(BUNDLE_FILENAMES), description="Форматы справки в архиве"
+    ),
+) -> StreamingResponse:
+    """Генерирует справку в нескольких форматах одним zip-архивом.
+
+    Запросы к внешним базам выполняются один раз для всех форматов,
+    справки формируются параллельно.
+
+    Args:
+        uow (UOWDep): Unit of Work для доступа к базам данных.
+        enquiry_id (int): ID справки для формирования шаблона.
+        templater_params (TemplaterRequest): Параметры для фильтрации
+            данных во внешних запросах.
+        formats (list[str]): Форматы справки в архиве.
+
+    Returns:
+        StreamingResponse: HTTP-ответ, содержащий zip-архив со справками.
+
+    Raises:
+        TemplateNotFoundError: У справки нет шаблона одного из форматов,
+            ответ `404`.
+
+    """
+    start_time = time.perf_counter()
+    formats = list(dict.fromkeys(formats))
+    workspace = RequestWorkspace()
+    templaters: dict[str, tuple[BaseTemplater, bool]] = {}
+    if "xlsx" in formats:
+        templaters["xlsx"] = (
+            TemplaterXlsx(
+                uow, enquiry_id, templater_params, workspace=workspace
+            ),
+            False,
+        )
+    if "docx" in formats:
+        templaters["docx"] = (
+            DocxTemplate(
+                uow, enquiry_id, templater_params, workspace=workspace
+            ),
+            False,
+        )
+    # Конвертер `.pdf` создается, только если формат запрошен
+    templater_pdf = None
+    if "pdf" in formats:
+        templater_pdf = PdfCreation(
+            uow, enquiry_id, templater_params, workspace=workspace
+        )
+        templaters["pdf"] = (templater_pdf.docx_templater, True)
+    GLOBAL_LOGGER.debug(f"начало выполнения скрипта - {time.ctime()}\n")
+    reports = dict(
+        zip(
+            formats,
+            await BaseTemplater.generate_reports(
+                [templaters[report_format] for report_format in formats]
+            ),
+        )
+    )
+    try:
+        if templater_pdf is not None:
+            reports["pdf"] = await templater_pdf.convert_report(
+                reports["pdf"]
+            )
+        bundle = workspace.spooled_file()
+        await RENDER_EXECUTOR.run(
+            _zip_reports,
+            {
+                BUNDLE_FILENAMES[report_format]: report
+                for report_format, report in reports.items()
+            },
+            bundle,
+        )
+    except BaseException:
+        for report in reports.values():
+            report.close()
+        workspace.cleanup()
+        raise
+    GLOBAL_LOGGER.debug(
+        "enquiry bundle created in %2.f seconds"
+        % (time.perf_counter() - start_time)
+    )
+    return _stream_report(bundle, workspace, "application/zip", "zealot.zip")
+
+
+@router.get("/{enquiry_id}/", response_model=None)
 async def get_templates_info(
     uow: UOWDep,
     enquiry_id: int = Path(
         ..., description="ID справки для сбора информации о шаблонах"
     ),
-) -> JSONResponse:
+    if_none_match: str | None = Header(default=None),
+) -> Response:
     """Получает доступные форматы шаблонов.
 
+    Ответ кэшируется и отдается с ETag: если он совпадает с
+    `If-None-Match`, возвращается `304` без тела.
+
     Args:
         uow (UOWDep): Unit of Work для доступа к базам данных.
         enquiry_id (int): ID справки для сбора информации о шаблонах.
+        if_none_match (str | None): ETag ответа, сохраненный клиентом.
 
     Returns:
-        JSONResponse: Функция возвращает список форматов шаблонов
+        Response: Функция возвращает список форматов шаблонов
         в необходимом формате.
 
     Raises:
@@ -170,13 +333,21 @@ async def get_templates_info(
     query_executor = ExternalQueryExecutor()
     async with uow:
         GLOBAL_LOGGER.debug("Пошел запрос за информацией о шаблонах")
-        enquiry_info = await query_executor.get_template_info(enquiry_id, uow)
-        if not enquiry_info:
+        templates_info = await query_executor.get_template_info(
+            enquiry_id, uow
+        )
+        if templates_info is None:
             raise HTTPException(status_code=404, detail="Enquiry not found")
-        else:
-            enquiry_info["formats"].append("pdf")
-    encoded_data = jsonable_encoder(enquiry_info)
-    return JSONResponse(content=encoded_data)
+    headers = {"ETag": templates_info.etag, "Cache-Control": "no-cache"}
+    if if_none_match is not None and templates_info.etag in (
+        tag.strip() for tag in if_none_match.split(",")
+    ):
+        return Response(status_code=304, headers=headers)
+    return Response(
+        content=templates_info.content,
+        media_type="application/json",
+        headers=headers,
+    )
 
 
 @router.delete("/input_field_value")
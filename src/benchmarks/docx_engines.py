@@ -0,0 +1,108 @@
+"""Сравнение скорости движков формирования `.docx`.
+
+Запуск из каталога `src`:
+
+    python -m benchmarks.docx_engines --rows 2000 --repeat 5
+
+Шаблон с одиночными плейсхолдерами и строкой-блоком создаётся во
+временном каталоге, затем каждая справка формируется движками
+`spire` и `ooxml` без обращения к базам данных.
+"""
+
+import argparse
+import os
+import tempfile
+import time
+from decimal import Decimal
+
+from spire.doc import Document, FileFormat
+
+from loaded_env import get_variables
+from schemas.templater import TemplaterRequest
+from services.templaterDocx import DocxTemplate
+from utils.query_rows import QueryRows
+
+ENGINES = ("spire", "ooxml")
+
+
+def build_template(path: str) -> None:
+    """Создаёт тестовый шаблон с таблицей на одну строку-блок.
+
+    Args:
+        path (str): Путь для сохранения шаблона.
+
+    """
+    document = Document()
+    section = document.AddSection()
+    section.AddParagraph().AppendText("Справка для {{title}}")
+    section.AddParagraph().AppendText("Организация {{1:0;name}}")
+    section.AddParagraph().AppendText("Итог {{SUM;1;amount}}")
+    table = section.AddTable(True)
+    table.ResetCells(2, 3)
+    cells = [["№", "Имя", "Сумма"], ["{{1;n}}", "{{1;name}}", "{{1;amount}}"]]
+    for row_index, row in enumerate(cells):
+        for cell_index, text in enumerate(row):
+            table.Rows.get_Item(row_index).Cells.get_Item(
+                cell_index
+            ).AddParagraph().AppendText(text)
+    document.SaveToFile(path, FileFormat.Docx2016)
+    document.Close()
+
+
+def build_responses(rows: int) -> dict[int, QueryRows]:
+    """Формирует ответ запроса из `rows` строк."""
+    return {
+        1: QueryRows(
+            ["n", "name", "amount"],
+            [(i, f"name {i}", Decimal(i) / 4) for i in range(rows)],
+        )
+    }
+
+
+def measure(engine: str, path: str, rows: int, repeat: int) -> float:
+    """Возвращает лучшее время формирования справки движком.
+
+    Args:
+        engine (str): Имя движка из `ENGINES`.
+        path (str): Путь к шаблону.
+        rows (int): Количество строк в ответе запроса.
+        repeat (int): Количество повторов.
+
+    Returns:
+        float: Минимальное время одного формирования в секундах.
+
+    """
+    get_variables().DOCX_ENGINE = engine
+    responses = build_responses(rows)
+    timings = []
+    # Первый прогон прогревает кэш скомпилированного шаблона
+    for _ in range(repeat + 1):
+        templater = DocxTemplate(
+            None, 0, TemplaterRequest(fields={"title": "Тест"})
+        )
+        templater.template_file_path = path
+        templater.query_responses = responses
+        started = time.perf_counter()
+        report = templater._render()
+        timings.append(time.perf_counter() - started)
+        report.close()
+        templater.workspace.cleanup()
+    return min(timings[1:])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "template.docx")
+        build_template(path)
+        for engine in ENGINES:
+            seconds = measure(engine, path, args.rows, args.repeat)
+            print(f"{engine:>6}: {seconds * 1000:9.1f} мс ({args.rows} строк)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+"""Скорость и память заполнения строк блока `.xlsx`.
+
+Запуск из каталога `src`:
+
+    python -m benchmarks.xlsx_styles --rows 50000
+
+Каждый режим выполняется в отдельном процессе, чтобы пиковый RSS не
+зависел от предыдущих прогонов:
+
+- `copy` - прежнее заполнение: копии `Font`, `Border`, `Fill` и
+  `Alignment` для каждой ячейки;
+- `style_array` - копия StyleArray шаблонной ячейки, как в
+  `TemplaterXlsx.process_data_block`;
+- `streaming` - потоковое формирование справки `TemplaterXlsx`.
+"""
+
+import argparse
+import io
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from copy import copy
+from decimal import Decimal
+
+import openpyxl
+from openpyxl.styles import Alignment, Border, Font, PatternFill, Side
+
+from loaded_env import get_variables
+from schemas.templater import TemplaterRequest
+from services.templaterXlsx import TemplaterXlsx
+from utils.query_rows import QueryRows
+
+MODES = ("copy", "style_array", "streaming")
+COLUMNS = ("n", "name", "amount", "comment")
+
+
+def build_template(path: str) -> None:
+    """Создает шаблон с заголовком и одной строкой блока.
+
+    Args:
+        path (str): Путь для сохранения шаблона.
+
+    """
+    book = openpyxl.Workbook()
+    sheet = book.active
+    sheet["A1"] = "Справка {{title}}"
+    side = Side(style="thin")
+    for column_index, column_name in enumerate(COLUMNS, 1):
+        sheet.cell(row=2, column=column_index, value=column_name)
+        cell = sheet.cell(
+            row=3, column=column_index, value=f"{{{{1;{column_name}}}}}"
+        )
+        cell.font = Font(name="Times New Roman", size=11)
+        cell.border = Border(left=side, right=side, top=side, bottom=side)
+        cell.fill = PatternFill("solid", fgColor="FFF2CC")
+        cell.alignment = Alignment(wrap_text=True, vertical="top")
+        cell.number_format = "#,##0.0"
+    sheet["A4"] = "Конец"
+    book.save(path)
+
+
+def build_responses(rows: int) -> dict[int, QueryRows]:
+    """Формирует ответ запроса из `rows` строк."""
+    return {
+        1: QueryRows(
+            COLUMNS,
+            [
+                (i, f"name {i}", Decimal(i) / 4, "x" * (i % 17))
+                for i in range(rows)
+            ],
+        )
+    }
+
+
+def fill_sheet(path: str, rows: int, mode: str) -> None:
+    """Заполняет строки блока только стилями шаблонной строки.
+
+    Args:
+        path (str): Путь к шаблону.
+        rows (int): Количество строк блока.
+        mode (str): `copy` или `style_array`.
+
+    """
+    book = openpyxl.load_workbook(path)
+    sheet = book.active
+    template_cells = list(sheet[3])
+    for row_index in range(3, rows + 3):
+        for template_cell in template_cells:
+            cell = sheet.cell(row=row_index, column=template_cell.column)
+            if mode == "copy":
+                cell.font = copy(template_cell.font)
+                cell.border = copy(template_cell.border)
+                cell.fill = copy(template_cell.fill)
+                cell.number_format = template_cell.number_format
+                cell.alignment = copy(template_cell.alignment)
+            else:
+                cell._style = copy(template_cell._style)
+            cell.value = row_index
+    book.save(io.BytesIO())
+
+
+def render_report(path: str, rows: int) -> None:
+    """Формирует справку `TemplaterXlsx` потоково, без обращения к базам.
+
+    Args:
+        path (str): Путь к шаблону.
+        rows (int): Количество строк блока.
+
+    """
+    get_variables().XLSX_STREAMING_MIN_ROWS = 0
+    templater = TemplaterXlsx(
+        None, 0, TemplaterRequest(fields={"title": "Тест"})
+    )
+    templater.template_file_path = path
+    templater.query_responses = build_responses(rows)
+    templater._render().close()
+    templater.workspace.cleanup()
+
+
+def run_mode(path: str, rows: int, mode: str) -> None:
+    """Выполняет один режим и печатает время, скорость и пиковый RSS."""
+    started = time.perf_counter()
+    if mode in ("copy", "style_array"):
+        fill_sheet(path, rows, mode)
+    else:
+        render_report(path, rows)
+    seconds = time.perf_counter() - started
+    cells = rows * len(COLUMNS)
+    # ru_maxrss в Linux измеряется в килобайтах
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(
+        f"{mode:>12}: {seconds:7.2f} с, {cells / seconds:10.0f} ячеек/с, "
+        f"пиковый RSS {peak_rss:7.1f} МБ"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=50000)
+    parser.add_argument("--mode", choices=MODES)
+    parser.add_argument("--template")
+    args = parser.parse_args()
+
+    if args.mode:
+        run_mode(args.template, args.rows, args.mode)
+        return
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "template.xlsx")
+        build_template(path)
+        for mode in MODES:
+            subprocess.run(
+                [
+                    sys.executable,
+                    "-m",
+                    "benchmarks.xlsx_styles",
+                    "--rows",
+                    str(args.rows),
+                    "--mode",
+                    mode,
+                    "--template",
+                    path,
+                ],
+                check=True,
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+import asyncio
+from dataclasses import dataclass
+from typing import Dict
+
+from sqlalchemy.engine import URL
+from sqlalchemy.ext.asyncio import (
+    AsyncEngine,
+    async_sessionmaker,
+    create_async_engine,
+)
+
+from loaded_env import get_variables
+from models.system_configuration.db import Db
+from utils.cache import VIEW_METADATA_CACHE
+from utils.logger import GLOBAL_LOGGER
+
+
+@dataclass(frozen=True)
+class _EngineEntry:
+    version: int
+    engine: AsyncEngine
+    session_maker: async_sessionmaker
+
+
+class ExternalEngineRegistry:
+    """Реестр движков внешних баз данных на время жизни приложения.
+
+    Движки и пулы соединений создаются лениво при первом обращении к базе
+    данных и пересоздаются, если изменилась версия строки
+    `system_configuration.db`. Ограничение числа одновременных запросов к
+    базе данных общее для всех справок процесса и не зависит от версии
+    движка.
+    """
+
+    def __init__(self):
+        """Инициализирует пустой реестр."""
+        self._entries: Dict[int, _EngineEntry] = {}
+        self._semaphores: Dict[int, asyncio.Semaphore] = {}
+        self._lock = asyncio.Lock()
+
+    def is_actual(self, db_id: int, version: int) -> bool:
+        """Проверяет, есть ли в реестре движок нужной версии.
+
+        Args:
+            db_id (int): ID базы данных.
+            version (int): Текущая версия строки `system_configuration.db`.
+
+        Returns:
+            bool: True, если движок есть и его версия совпадает.
+
+        """
+        entry = self._entries.get(db_id)
+        return entry is not None and entry.version == version
+
+    def get_session_maker(self, db_id: int) -> async_sessionmaker:
+        """Возвращает фабрику сессий для уже зарегистрированной базы.
+
+        Args:
+            db_id (int): ID базы данных.
+
+        Returns:
+            async_sessionmaker: Фабрика сессий.
+
+        Raises:
+            KeyError: Движок для `db_id` еще не создан.
+
+        """
+        return self._entries[db_id].session_maker
+
+    def get_query_semaphore(self, db_id: int) -> asyncio.Semaphore:
+        """Возвращает семафор одновременных запросов к базе данных.
+
+        Семафор создается при первом обращении на время жизни процесса,
+        его размер задается `EXTERNAL_DB_MAX_CONCURRENCY`.
+
+        Args:
+            db_id (int): ID базы данных.
+
+        Returns:
+            asyncio.Semaphore: Семафор запросов к базе данных.
+
+        """
+        semaphore = self._semaphores.get(db_id)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(
+                get_variables().EXTERNAL_DB_MAX_CONCURRENCY
+            )
+            self._semaphores[db_id] = semaphore
+        return semaphore
+
+    async def register(self, db: Db) -> async_sessionmaker:
+        """Создает движок для базы данных или пересоздает устаревший.
+
+        Args:
+            db (Db): Объект `Db` с информацией о подключении к базе данных.
+
+        Returns:
+            async_sessionmaker: Фабрика сессий для базы данных.
+
+        """
+        async with self._lock:
+            entry = self._entries.get(db.id)
+            if entry is not None and entry.version == db.version:
+                return entry.session_maker
+
+            settings = get_variables()
+            url = URL.create(
+                drivername=db.dbms,
+                host=db.host,
+                port=int(db.port) if db.port else None,
+                database=db.name,
+                username=db.username,
+                password=db.password,
+            )
+            engine = create_async_engine(
+                url,
+                pool_size=settings.EXTERNAL_DB_POOL_SIZE,
+                max_overflow=settings.EXTERNAL_DB_MAX_OVERFLOW,
+                pool_recycle=settings.EXTERNAL_DB_POOL_RECYCLE,
+                pool_pre_ping=True,
+            )
+            self._entries[db.id] = _EngineEntry(
+                version=db.version,
+                engine=engine,
+                session_maker=async_sessionmaker(
+                    engine, expire_on_commit=False
+                ),
+            )
+            GLOBAL_LOGGER.debug(
+                f"Создан движок для db_id={db.id}, версия {db.version}"
+            )
+
+        if entry is not None:
+            GLOBAL_LOGGER.debug(
+                f"Версия db_id={db.id} изменилась, старый пул закрывается"
+            )
+            VIEW_METADATA_CACHE.invalidate_where(lambda key: key[0] == db.id)
+            await entry.engine.dispose()
+        return self._entries[db.id].session_maker
+
+    async def dispose(self, db_id: int) -> None:
+        """Закрывает пул соединений базы данных и удаляет его из реестра.
+
+        Args:
+            db_id (int): ID базы данных.
+
+        Returns:
+            None: Функция работает с реестром.
+
+        """
+        async with self._lock:
+            entry = self._entries.pop(db_id, None)
+        if entry is not None:
+            await entry.engine.dispose()
+
+    async def dispose_all(self) -> None:
+        """Закрывает все пулы соединений, вызывается при остановке."""
+        async with self._lock:
+            entries = list(self._entries.values())
+            self._entries.clear()
+        for entry in entries:
+            await entry.engine.dispose()
+
+
+EXTERNAL_ENGINES = ExternalEngineRegistry()
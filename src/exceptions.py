@@ -2,4 +2,37 @@ class DataNotFoundError(Exception):
     """
     Исключение, если запрос к представлению не возвращает ни одной строки данных.
     """
-    pass
\ No newline at end of file
+    pass
+
+
+class ReportDeadlineError(Exception):
+    """
+    Исключение, если запросы для справки не уложились в отведенное время.
+    """
+    pass
+
+
+class PdfConversionError(Exception):
+    """
+    Исключение, если документ не удалось сконвертировать в PDF.
+    """
+    pass
+
+class UnfilteredQueryError(Exception):
+    """
+    Исключение, если к запросу не применен ни один фильтр, а выполнять его по
+    всему представлению не разрешено.
+    """
+    pass
+
+class TemplateNotFoundError(Exception):
+    """
+    Исключение, если у справки нет шаблона запрошенного формата.
+    """
+    pass
+
+class ArtefactTooLargeError(Exception):
+    """
+    Исключение, если справка задачи не помещается в хранилище результатов.
+    """
+    pass
@@ -1,4 +1,5 @@
 import os
+import tempfile
 from functools import lru_cache
 
 from pydantic_settings import BaseSettings, SettingsConfigDict
@@ -36,6 +37,83 @@ class Settings(BaseSettings):
     LOG_DATETIME_FORMAT: str
     LOG_TO_CONSOLE: bool = True
 
+    # Пул соединений системной базы данных, общий для всех запросов
+    MAIN_DB_POOL_SIZE: int = 10
+    MAIN_DB_MAX_OVERFLOW: int = 10
+    MAIN_DB_POOL_RECYCLE: int = 1800
+    MAIN_DB_POOL_TIMEOUT: float = 30.0
+
+    # Параметры выполнения запросов к внешним базам данных
+    EXTERNAL_DB_MAX_CONCURRENCY: int = 4
+    REPORT_FETCH_TIMEOUT: float = 60.0
+    EXTERNAL_DB_POOL_SIZE: int = 5
+    EXTERNAL_DB_MAX_OVERFLOW: int = 10
+    EXTERNAL_DB_POOL_RECYCLE: int = 1800
+    VIEW_METADATA_CACHE_TTL: int = 3600
+    WARM_VIEW_METADATA_CACHE: bool = False
+    RENDER_PLAN_CACHE_TTL: int = 300
+    # Ответы о шаблонах и полях справки сбрасываются при изменении
+    # значений полей, TTL ограничивает устаревание между процессами
+    TEMPLATES_INFO_CACHE_TTL: int = 60
+
+    # Кэш результатов запросов к внешним представлениям
+    RESULT_CACHE_MAX_BYTES: int = 64 * 1024 * 1024
+    RESULT_CACHE_DEFAULT_TTL: int = 300
+    RESULT_CACHE_DIR: str | None = None
+
+    # Чтение результатов через серверный курсор: ограничивает буфер
+    # драйвера, но результат запроса все равно целиком хранится в памяти
+    EXTERNAL_FETCH_STREAMING: bool = True
+    EXTERNAL_FETCH_BATCH_SIZE: int = 1000
+
+    # Число потоков для формирования документов
+    RENDER_WORKERS: int = 4
+
+    # Пул воркеров LibreOffice для конвертации в PDF
+    PDF_WORKERS: int = 2
+    PDF_CONVERSION_TIMEOUT: int = 120
+    PDF_QUEUE_TIMEOUT: int = 60
+    PDF_WORKER_BASE_PORT: int = 2002
+    PDF_PROFILES_DIR: str = os.path.join(
+        tempfile.gettempdir(), "enquiry_lo_profiles"
+    )
+
+    # Рабочие каталоги запросов на формирование справок
+    WORKSPACE_ROOT: str | None = None
+    WORKSPACE_MAX_AGE: int = 3600
+    WORKSPACE_SWEEP_INTERVAL: int = 600
+    # Размер справки, после которого буфер выгружается на диск
+    REPORT_SPOOL_MAX_BYTES: int = 16 * 1024 * 1024
+
+    # Движок формирования .docx: "spire" или "ooxml", и переопределения
+    # движка по пути к шаблону
+    DOCX_ENGINE: str = "spire"
+    DOCX_ENGINE_OVERRIDES: dict[str, str] = {}
+    # Число строк блоков, начиная с которого .xlsx пишется потоково
+    XLSX_STREAMING_MIN_ROWS: int = 10000
+
+    # Кэш сформированных справок, 0 - кэш отключен
+    REPORT_CACHE_MAX_BYTES: int = 128 * 1024 * 1024
+    REPORT_CACHE_TTL: int = 60
+
+    # Фоновые задачи формирования справок: состояние в SQLite, готовые
+    # справки в каталоге с ограничением объема и времени хранения
+    REPORT_JOB_WORKERS: int = 2
+    REPORT_JOB_DB_PATH: str = os.path.join(
+        tempfile.gettempdir(), "enquiry_report_jobs.sqlite3"
+    )
+    REPORT_JOB_ARTEFACT_DIR: str = os.path.join(
+        tempfile.gettempdir(), "enquiry_report_artefacts"
+    )
+    REPORT_JOB_ARTEFACT_MAX_BYTES: int = 512 * 1024 * 1024
+    REPORT_JOB_TTL: int = 3600
+    REPORT_JOB_SWEEP_INTERVAL: int = 300
+    # Аренда выполняемой задачи: процесс продлевает ее, пока формирует
+    # справку, задачу с истекшей арендой выполняет заново любой процесс
+    REPORT_JOB_LEASE: int = 60
+    # Максимальное время ожидания при long-poll статуса задачи
+    REPORT_JOB_MAX_WAIT: int = 30
+
     model_config = SettingsConfigDict(env_file=get_env_filename(), extra="ignore")
 
 
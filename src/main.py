@@ -1,14 +1,67 @@
+import asyncio
+from contextlib import asynccontextmanager
+
 import uvicorn
 from starlette.middleware.cors import CORSMiddleware
 from authorize import authorizeModule
 from db import querytable
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
 from authorize.authorizeModule import router as authorize_router
+from db.db import dispose_main_engine
+from db.engine_registry import EXTERNAL_ENGINES
 from db.querytable import router as querytable_router
+from exceptions import TemplateNotFoundError, UnfilteredQueryError
+from loaded_env import get_variables
+from services.pdf_converter import PDF_CONVERTER_POOL
+from services.report_jobs import REPORT_JOBS
+from utils.render_executor import RENDER_EXECUTOR
+from utils.unitofwork import UnitOfWork
+from utils.utils import ExternalQueryExecutor
+from utils.workspace import run_workspace_sweeper
 
 from flask import Flask
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if get_variables().WARM_VIEW_METADATA_CACHE:
+        uow = UnitOfWork()
+        async with uow:
+            await ExternalQueryExecutor().warm_view_metadata_cache(uow)
+    # Удаляем рабочие каталоги, брошенные прерванными запросами
+    sweeper = asyncio.create_task(run_workspace_sweeper())
+    # Воркеры LibreOffice: без них конвертация в PDF невозможна, поэтому
+    # ошибка запуска останавливает приложение
+    await PDF_CONVERTER_POOL.start()
+    # Воркеры фоновых задач и задачи, прерванные перезапуском
+    await REPORT_JOBS.start()
+    yield
+    sweeper.cancel()
+    await REPORT_JOBS.shutdown()
+    # Закрываем пулы соединений внешних и системной баз данных
+    await EXTERNAL_ENGINES.dispose_all()
+    await dispose_main_engine()
+    await PDF_CONVERTER_POOL.shutdown()
+    RENDER_EXECUTOR.shutdown()
+
+
+app = FastAPI(lifespan=lifespan)
+
+
+@app.exception_handler(UnfilteredQueryError)
+async def unfiltered_query_handler(
+    request: Request, exc: UnfilteredQueryError
+) -> JSONResponse:
+    # Без фильтров справка строилась бы по всему представлению
+    return JSONResponse(status_code=400, content={"detail": str(exc)})
+
+
+@app.exception_handler(TemplateNotFoundError)
+async def template_not_found_handler(
+    request: Request, exc: TemplateNotFoundError
+) -> JSONResponse:
+    return JSONResponse(status_code=404, content={"detail": str(exc)})
 
 # from fastapi.middleware.cors import CORSMiddleware
 #
@@ -1,6 +1,8 @@
 from .access_control.user import User
 from .access_control.user_data import UserData
 from .access_control.user_status import UserStatus
+from .diplom.pfhd import Pfhd
+from .diplom.user import DiplomUser
 from .enquiry_temp.input_field import (
     EnquiryInputField,
     InputField,
@@ -36,4 +38,6 @@ __all__ = [
     "user_user_data_association_table",
     "UserStatus",
     "Organization",
+    "DiplomUser",
+    "Pfhd",
 ]
@@ -0,0 +1,18 @@
+from sqlalchemy import Float, String
+from sqlalchemy.orm import Mapped, mapped_column
+
+from db.db import Base
+
+
+# Данные ПФХД для `querytable`
+class Pfhd(Base):
+    __tablename__ = "pfhd_spravki"
+    __table_args__ = {"schema": "diplom"}
+
+    id: Mapped[str] = mapped_column(String, primary_key=True)
+    inn: Mapped[str | None] = mapped_column(String)
+    strcode: Mapped[str | None] = mapped_column(String)
+    sumcurfinyear: Mapped[float | None] = mapped_column(Float)
+    sumfirstyearplper: Mapped[float | None] = mapped_column(Float)
+    sumsecondyearplper: Mapped[float | None] = mapped_column(Float)
+    finyear: Mapped[str | None] = mapped_column(String)
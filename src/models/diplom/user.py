@@ -0,0 +1,17 @@
+from sqlalchemy import String
+from sqlalchemy.orm import Mapped, mapped_column
+
+from db.db import Base
+
+
+# Пользователи регистрации и авторизации `authorizeModule`
+class DiplomUser(Base):
+    __tablename__ = "users"
+    __table_args__ = {"schema": "diplom"}
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    name: Mapped[str | None] = mapped_column(String)
+    lastname: Mapped[str | None] = mapped_column(String)
+    email: Mapped[str | None] = mapped_column(String)
+    login: Mapped[str | None] = mapped_column(String)
+    passw: Mapped[str | None] = mapped_column(String)
@@ -35,6 +35,12 @@ class Query(Base):
         ForeignKey("access_control.user.id"), nullable=False
     )
     code: Mapped[str]
+    # Время жизни результата в кэше, секунды. NULL - значение по умолчанию,
+    # 0 - не кэшировать
+    cache_ttl: Mapped[int | None]
+    # Запрос можно выполнять без фильтров, то есть по всему представлению.
+    # NULL - нельзя
+    allow_unfiltered: Mapped[bool | None]
 
     database: Mapped["Db"] = relationship(
         back_populates="queries", foreign_keys=[database_id], lazy="selectin"
@@ -60,5 +66,7 @@ class Query(Base):
             version=self.version,
             user_id=self.user_id,
             code=self.code,
+            cache_ttl=self.cache_ttl,
+            allow_unfiltered=bool(self.allow_unfiltered),
             database=self.database.to_read_model(),
         )
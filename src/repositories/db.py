@@ -1,6 +1,13 @@
+from sqlalchemy import select
+
 from utils.repository import AsyncSQLAlchemyRepository
 from models.system_configuration.db import Db
 
 
 class DBRepository(AsyncSQLAlchemyRepository):
     model = Db
+
+    async def get_version(self, db_id: int) -> int | None:
+        stmt = select(self.model.version).where(self.model.id == db_id)
+        res = await self._session.execute(stmt)
+        return res.scalar_one_or_none()
@@ -0,0 +1,21 @@
+from sqlalchemy import select
+
+from models import DiplomUser, Pfhd
+from utils.repository import AsyncSQLAlchemyRepository
+
+
+class DiplomUserRepository(AsyncSQLAlchemyRepository):
+    model = DiplomUser
+
+    async def get_all(self) -> list[DiplomUser]:
+        res = await self._session.execute(select(self.model))
+        return list(res.scalars().all())
+
+
+class PfhdRepository(AsyncSQLAlchemyRepository):
+    model = Pfhd
+
+    async def get_page(self, limit: int) -> list[Pfhd]:
+        stmt = select(self.model).limit(limit)
+        res = await self._session.execute(stmt)
+        return list(res.scalars().all())
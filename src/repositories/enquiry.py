@@ -1,7 +1,8 @@
+from datetime import datetime
 from typing import List
 
-from sqlalchemy import select
-from sqlalchemy.orm import selectinload
+from sqlalchemy import and_, or_, select, true
+from sqlalchemy.orm import aliased, selectinload
 
 from models import (
     Enquiry,
@@ -10,6 +11,18 @@ from models import (
     EnquiryTemplateBlock,
     InputField,
     InputFieldValue,
+    Query,
+    UserData,
+    enquiry_enquiry_template_table,
+    enquiry_template_block_association_table,
+    enquiry_template_block_query_association_table,
+    user_user_data_association_table,
+)
+from schemas.render_plan import (
+    BlockPlan,
+    QueryPlan,
+    RenderPlan,
+    TemplatePlan,
 )
 from utils.repository import AsyncSQLAlchemyRepository
 
@@ -37,6 +50,207 @@ class EnquiryRepository(AsyncSQLAlchemyRepository):
         result = result.scalars().all()
         return result
 
+    async def get_plan_stamp(
+        self, enquiry_id: int
+    ) -> tuple[int, datetime] | None:
+        stmt = select(self.model.version, self.model.updated_at).where(
+            self.model.id == enquiry_id
+        )
+        result = await self._session.execute(stmt)
+        row = result.one_or_none()
+        return None if row is None else (row.version, row.updated_at)
+
+    async def get_render_plan(self, enquiry_id: int) -> RenderPlan | None:
+        template_link = enquiry_enquiry_template_table.c
+        block_link = enquiry_template_block_association_table.c
+        query_link = enquiry_template_block_query_association_table.c
+        stmt = (
+            select(
+                self.model.version.label("enquiry_version"),
+                self.model.updated_at.label("enquiry_updated_at"),
+                EnquiryTemplate.id.label("template_id"),
+                EnquiryTemplate.template_file_path,
+                EnquiryTemplate.version.label("template_version"),
+                EnquiryTemplateBlock.id.label("block_id"),
+                Query.id.label("query_id"),
+                Query.code,
+                Query.database_id,
+                Query.version.label("query_version"),
+                Query.cache_ttl,
+                Query.allow_unfiltered,
+            )
+            .select_from(self.model)
+            .outerjoin(
+                enquiry_enquiry_template_table,
+                template_link.enquiry_id == self.model.id,
+            )
+            .outerjoin(
+                EnquiryTemplate,
+                EnquiryTemplate.id == template_link.enquiry_template_id,
+            )
+            .outerjoin(
+                enquiry_template_block_association_table,
+                block_link.enquiry_template_id == EnquiryTemplate.id,
+            )
+            .outerjoin(
+                EnquiryTemplateBlock,
+                EnquiryTemplateBlock.id
+                == block_link.enquiry_template_block_id,
+            )
+            .outerjoin(
+                enquiry_template_block_query_association_table,
+                query_link.enquiry_template_block_id
+                == EnquiryTemplateBlock.id,
+            )
+            .outerjoin(Query, Query.id == query_link.query_id)
+            .where(self.model.id == enquiry_id)
+            .order_by(EnquiryTemplate.id, EnquiryTemplateBlock.id, Query.id)
+        )
+        rows = (await self._session.execute(stmt)).all()
+        if not rows:
+            return None
+
+        templates: dict[int, dict] = {}
+        for row in rows:
+            if row.template_id is None:
+                continue
+            template = templates.setdefault(
+                row.template_id,
+                {
+                    "id": row.template_id,
+                    "template_file_path": row.template_file_path,
+                    "version": row.template_version,
+                    "blocks": {},
+                },
+            )
+            if row.block_id is None:
+                continue
+            block = template["blocks"].setdefault(
+                row.block_id, {"id": row.block_id, "queries": []}
+            )
+            if row.query_id is not None:
+                block["queries"].append(
+                    QueryPlan(
+                        id=row.query_id,
+                        code=row.code,
+                        database_id=row.database_id,
+                        version=row.query_version,
+                        cache_ttl=row.cache_ttl,
+                        allow_unfiltered=bool(row.allow_unfiltered),
+                    )
+                )
+
+        return RenderPlan(
+            enquiry_id=enquiry_id,
+            version=rows[0].enquiry_version,
+            updated_at=rows[0].enquiry_updated_at,
+            templates=tuple(
+                TemplatePlan(
+                    id=template["id"],
+                    template_file_path=template["template_file_path"],
+                    version=template["version"],
+                    blocks=tuple(
+                        BlockPlan(
+                            id=block["id"], queries=tuple(block["queries"])
+                        )
+                        for block in template["blocks"].values()
+                    ),
+                )
+                for template in templates.values()
+            ),
+        )
+
+    async def get_input_fields_info(self, enquiry_id: int) -> list[dict]:
+        # Поле со значениями только своей справки (enquiry_specific) или
+        # общими значениями всех справок с тем же input_field
+        source = aliased(EnquiryInputField)
+        user_data_link = user_user_data_association_table.c
+        # Первая запись данных пользователя, как `User.data[0]`
+        user_data = (
+            select(UserData.last_name, UserData.name, UserData.middle_name)
+            .join(
+                user_user_data_association_table,
+                user_data_link.user_data_id == UserData.id,
+            )
+            .where(user_data_link.user_id == InputFieldValue.user_id)
+            .order_by(UserData.id)
+            .limit(1)
+            .lateral("first_user_data")
+        )
+        stmt = (
+            select(
+                EnquiryInputField.id.label("enquiry_input_field_id"),
+                EnquiryInputField.input_field_id,
+                EnquiryInputField.enquiry_specific,
+                InputField.title,
+                InputField.field_key,
+                InputField.field_type,
+                InputFieldValue.id.label("value_id"),
+                InputFieldValue.input_field_value,
+                InputFieldValue.created_at,
+                user_data.c.last_name,
+                user_data.c.name,
+                user_data.c.middle_name,
+            )
+            .join(
+                InputField, InputField.id == EnquiryInputField.input_field_id
+            )
+            .outerjoin(
+                source,
+                or_(
+                    and_(
+                        EnquiryInputField.enquiry_specific,
+                        source.id == EnquiryInputField.id,
+                    ),
+                    and_(
+                        ~EnquiryInputField.enquiry_specific,
+                        source.input_field_id
+                        == EnquiryInputField.input_field_id,
+                    ),
+                ),
+            )
+            .outerjoin(
+                InputFieldValue,
+                and_(
+                    InputFieldValue.enquiry_input_field_id == source.id,
+                    InputFieldValue.is_deleted.isnot(True),
+                ),
+            )
+            .outerjoin(user_data, true())
+            .where(EnquiryInputField.enquiry_id == enquiry_id)
+            .order_by(EnquiryInputField.id, source.id, InputFieldValue.id)
+        )
+        rows = (await self._session.execute(stmt)).all()
+
+        fields: dict[int, dict] = {}
+        for row in rows:
+            field = fields.setdefault(
+                row.enquiry_input_field_id,
+                {
+                    "input_field_id": row.input_field_id,
+                    "enquiry_specific": row.enquiry_specific,
+                    "title": row.title,
+                    "field_key": row.field_key,
+                    "field_type": row.field_type,
+                    "values": [],
+                },
+            )
+            if row.value_id is None:
+                continue
+            field["values"].append(
+                {
+                    "id": row.value_id,
+                    "value": row.input_field_value,
+                    "user_fio": (
+                        f"{row.last_name} {row.name} {row.middle_name}"
+                        if row.last_name is not None
+                        else ""
+                    ),
+                    "created_at": row.created_at.strftime("%d.%m.%Y"),
+                }
+            )
+        return list(fields.values())
+
 
 class EnquiryTemplateRepository(AsyncSQLAlchemyRepository):
     model = EnquiryTemplate
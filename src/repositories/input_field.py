@@ -1,3 +1,16 @@
+from sqlalchemy import (
+    Integer,
+    String,
+    Text,
+    column,
+    exists,
+    func,
+    literal,
+    select,
+    values,
+)
+from sqlalchemy.dialects.postgresql import insert
+
 from models.enquiry_temp.input_field import (
     EnquiryInputField,
     InputField,
@@ -9,6 +22,49 @@ from utils.repository import AsyncSQLAlchemyRepository
 class InputFieldValueRepository(AsyncSQLAlchemyRepository):
     model = InputFieldValue
 
+    async def add_missing_values(
+        self, enquiry_id: int, fields: dict[str, str], user_id: int | None
+    ) -> int:
+        submitted = values(
+            column("field_key", String),
+            column("field_value", Text),
+            name="submitted",
+        ).data(list(fields.items()))
+        source = (
+            select(
+                EnquiryInputField.id,
+                submitted.c.field_value,
+                literal(user_id, Integer),
+                func.now(),
+            )
+            .join(
+                InputField, InputField.id == EnquiryInputField.input_field_id
+            )
+            .join(submitted, submitted.c.field_key == InputField.field_key)
+            .where(EnquiryInputField.enquiry_id == enquiry_id)
+            .where(
+                ~exists().where(
+                    self.model.enquiry_input_field_id == EnquiryInputField.id,
+                    self.model.input_field_value == submitted.c.field_value,
+                )
+            )
+        )
+        stmt = (
+            insert(self.model)
+            .from_select(
+                [
+                    self.model.enquiry_input_field_id,
+                    self.model.input_field_value,
+                    self.model.user_id,
+                    self.model.created_at,
+                ],
+                source,
+            )
+            .on_conflict_do_nothing()
+        )
+        res = await self._session.execute(stmt)
+        return res.rowcount
+
 
 class InputFieldRepository(AsyncSQLAlchemyRepository):
     model = InputField
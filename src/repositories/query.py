@@ -1,6 +1,13 @@
+from sqlalchemy import select
+
 from utils.repository import AsyncSQLAlchemyRepository
 from models.page_configuration.query import Query
 
 
 class QueryRepository(AsyncSQLAlchemyRepository):
     model = Query
+
+    async def get_view_codes(self):
+        stmt = select(self.model.id, self.model.code, self.model.database_id)
+        res = await self._session.execute(stmt)
+        return res.all()
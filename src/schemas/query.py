@@ -15,4 +15,6 @@ class QuerySchema(BaseModel):
     version: Optional[int] = Field(...)
     user_id: Optional[int] = Field(...)
     code: Optional[str] = Field(...)
+    cache_ttl: Optional[int] = Field(default=None)
+    allow_unfiltered: bool = Field(default=False)
     database: Optional["DbSchema"] = Field(...)
@@ -0,0 +1,41 @@
+from datetime import datetime
+from typing import Optional, Tuple
+
+from pydantic import BaseModel, ConfigDict, Field
+
+
+class QueryPlan(BaseModel):
+    model_config = ConfigDict(frozen=True)
+
+    id: int = Field(...)
+    code: Optional[str] = Field(default=None)
+    database_id: int = Field(...)
+    version: int = Field(...)
+    cache_ttl: Optional[int] = Field(default=None)
+    allow_unfiltered: bool = Field(default=False)
+
+
+class BlockPlan(BaseModel):
+    model_config = ConfigDict(frozen=True)
+
+    id: int = Field(...)
+    queries: Tuple[QueryPlan, ...] = Field(default=())
+
+
+class TemplatePlan(BaseModel):
+    model_config = ConfigDict(frozen=True)
+
+    id: int = Field(...)
+    template_file_path: str = Field(...)
+    version: int = Field(...)
+    blocks: Tuple[BlockPlan, ...] = Field(default=())
+
+
+# Все, что нужно для формирования справки: шаблоны, блоки и запросы
+class RenderPlan(BaseModel):
+    model_config = ConfigDict(frozen=True)
+
+    enquiry_id: int = Field(...)
+    version: int = Field(...)
+    updated_at: datetime = Field(...)
+    templates: Tuple[TemplatePlan, ...] = Field(default=())
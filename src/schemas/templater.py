@@ -7,6 +7,7 @@ class TemplaterRequestDump(TypedDict):
     user_id: NotRequired[int | None]
     filter_params: NotRequired[dict[str, list[str] | list[int]] | None]
     fields: dict[str, str]
+    bypass_cache: NotRequired[bool]
 
 
 class TemplaterRequest(BaseModel):
@@ -17,6 +18,9 @@ class TemplaterRequest(BaseModel):
     fields: Dict[str, str] = Field(
         default=None, description="Модификация полей"
     )
+    bypass_cache: bool = Field(
+        default=False, description="Не использовать кэш результатов запросов"
+    )
 
     @field_validator("fields", mode="before")
     @classmethod
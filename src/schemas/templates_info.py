@@ -0,0 +1,15 @@
+from typing import FrozenSet
+
+from pydantic import BaseModel, ConfigDict, Field
+
+
+# Готовый ответ `get_templates_info` для одной справки
+class TemplatesInfo(BaseModel):
+    model_config = ConfigDict(frozen=True)
+
+    content: bytes = Field(...)
+    etag: str = Field(...)
+    # input_field справки и те из них, значения которых общие для всех
+    # справок с этим полем
+    input_field_ids: FrozenSet[int] = Field(default=frozenset())
+    shared_input_field_ids: FrozenSet[int] = Field(default=frozenset())
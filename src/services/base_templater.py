@@ -1,12 +1,68 @@
-import re
+import asyncio
+import copy
+import os
 from abc import ABC, abstractmethod
-from decimal import Decimal
-from typing import cast
+from functools import lru_cache
+from typing import (
+    Awaitable,
+    BinaryIO,
+    Callable,
+    Iterable,
+    Sequence,
+    cast,
+)
 
 from schemas.templater import TemplaterRequest, TemplaterRequestDump
+from utils.cache import RENDER_PLAN_CACHE
 from utils.logger import GLOBAL_LOGGER
+from utils.placeholders import (
+    BlockPlaceholder,
+    FieldPlaceholder,
+    FormatterPlaceholder,
+    Placeholder,
+    ValuePlaceholder,
+    iter_placeholders,
+    parse_placeholders,
+)
+from utils.query_rows import QueryRows
+from utils.render_executor import RENDER_EXECUTOR
+from utils.report_cache import RENDERED_REPORT_CACHE, make_report_cache_key
 from utils.unitofwork import IUnitOfWork
 from utils.utils import ExternalQueryExecutor
+from utils.workspace import RequestWorkspace
+
+# Преобразование сформированной справки в рабочем каталоге, например
+# конвертация в `.pdf`
+ReportConverter = Callable[[BinaryIO, RequestWorkspace], Awaitable[BinaryIO]]
+
+# Плейсхолдеры, ссылающиеся на колонку запроса
+COLUMN_PLACEHOLDERS = (
+    ValuePlaceholder,
+    BlockPlaceholder,
+    FormatterPlaceholder,
+)
+
+
+@lru_cache(maxsize=64)
+def _scan_referenced_columns(
+    templater_cls: type["BaseTemplater"],
+    template_file_path: str,
+    mtime_ns: int,
+) -> dict[int, frozenset[str]]:
+    """Собирает колонки, на которые ссылается шаблон, по `query_id`.
+
+    Результат кэшируется по пути и времени изменения файла шаблона.
+    """
+    columns: dict[int, set[str]] = {}
+    for text in templater_cls._read_template_texts(template_file_path):
+        for placeholder in iter_placeholders(text):
+            if isinstance(placeholder, COLUMN_PLACEHOLDERS):
+                columns.setdefault(placeholder.query_id, set()).add(
+                    placeholder.column_name
+                )
+    return {
+        query_id: frozenset(names) for query_id, names in columns.items()
+    }
 
 
 class BaseTemplater(ABC):
@@ -18,6 +74,7 @@ class BaseTemplater(ABC):
         enquiry_id: int,
         templater_params: TemplaterRequest,
         template_type: str,
+        workspace: RequestWorkspace | None = None,
     ):
         self.uow = uow
         self.enquiry_id = enquiry_id
@@ -27,27 +84,28 @@ class BaseTemplater(ABC):
         self.fields = self.templater_params["fields"]
         self.template_type = template_type
 
-        self.raw_query_responses: dict[
-            int, list[dict[str, str | int | Decimal | None]]
-        ] = {}
-        self.query_responses: dict[
-            int, list[dict[str, str | int | Decimal]]
-        ] = {}
+        self.raw_query_responses: dict[int, QueryRows] = {}
+        self.query_responses: dict[int, QueryRows] = {}
         self.template_file_path = ""
         self.query_executor = ExternalQueryExecutor()
+        # Файлы запроса создаются только внутри его рабочего каталога
+        self._workspace = workspace
 
-        # ЕДИНЫЙ КОМБИНИРОВАННЫЙ ПАТТЕРН ДЛЯ ВСЕХ
-        self.combined_pattern = re.compile(
-            r"\{\{"
-            r"(?:"
-            r"(?P<query_id>\d+):(?P<row_index>\d+);(?P<column_name>\w+)"
-            # {{query_id:index;column}}
-            r"|"
-            r"(?P<field_name>\w+)"  # {{field}}
-            # Сюда можно будет добавлять новые типы плейсхолдеров через "|"
-            r")"
-            r"\}\}"
-        )
+    @property
+    def workspace(self) -> RequestWorkspace:
+        """Рабочий каталог запроса, создается при первом обращении."""
+        if self._workspace is None:
+            self._workspace = RequestWorkspace()
+        return self._workspace
+
+    @workspace.setter
+    def workspace(self, workspace: RequestWorkspace) -> None:
+        self._workspace = workspace
+
+    def cleanup_workspace(self) -> None:
+        """Удаляет рабочий каталог, если он был создан."""
+        if self._workspace is not None:
+            self._workspace.cleanup()
 
     async def _fetch_and_prepare_data(self, is_pdf: bool = False) -> None:
         """Общий метод для получения и подготовки данных.
@@ -68,67 +126,99 @@ class BaseTemplater(ABC):
             self.raw_query_responses,
             self.template_file_path,
             is_pdf,
+            column_resolver=self._referenced_columns,
         )
 
-        for resp_id, response in self.raw_query_responses.items():
-            self.query_responses[resp_id] = []
-            for row in response:
-                dict_row = dict(row)
-                for key, value in dict_row.items():
-                    if value is None:
-                        dict_row[key] = ""
-                processed_row = cast(dict[str, str | int | Decimal], dict_row)
-                self.query_responses[resp_id].append(processed_row)
+        self._prepare_responses()
+
+    def _prepare_responses(self) -> None:
+        """Подготавливает ответы запросов к подстановке в шаблон."""
+        # QueryRows заменяет None на "" при обращении к строке,
+        # поэтому строки не копируются
+        self.query_responses.update(self.raw_query_responses)
         GLOBAL_LOGGER.info(
             f"Finished queries for {self.template_type}, responses prepared."
         )
 
-    async def _placeholder_replacer(self, match: re.Match) -> str:
-        """ЕДИНЫЙ обработчик для всех типов плейсхолдеров.
+    async def _referenced_columns(
+        self, template_file_path: str
+    ) -> dict[int, frozenset[str]]:
+        """Получает колонки запросов, используемые в шаблоне.
+
+        Чтение шаблона выполняется в `RENDER_EXECUTOR`.
 
         Args:
-            match (re.Match): Найденные плейсхолдеры.
+            template_file_path (str): Путь к шаблону справки.
 
         Returns:
-            str: Функция возвращает значение из словаря с данными.
+            dict[int, frozenset[str]]: Колонки по `query_id`. Пустой словарь,
+            если шаблон прочитать не удалось - тогда выбираются все колонки.
 
         """
-        if match.group("query_id"):
-            query_id = int(match.group("query_id"))
-            row_index = int(match.group("row_index"))
-            column_name = match.group("column_name")
-            if (
-                query_id in self.query_responses
-                and len(self.query_responses[query_id]) > row_index
+        try:
+            mtime_ns = os.stat(template_file_path).st_mtime_ns
+            return await RENDER_EXECUTOR.run(
+                _scan_referenced_columns,
+                type(self),
+                template_file_path,
+                mtime_ns,
+            )
+        except Exception as e:
+            GLOBAL_LOGGER.warning(
+                f"Не удалось собрать колонки шаблона {template_file_path}: {e}"
+            )
+            return {}
+
+    def _resolve_placeholder(self, placeholder: Placeholder) -> str | None:
+        """ЕДИНЫЙ обработчик одиночных плейсхолдеров.
+
+        Args:
+            placeholder (Placeholder): Разобранный плейсхолдер.
+
+        Returns:
+            str | None: Значение из словаря с данными или None, если
+            плейсхолдер заменяется на другом этапе.
+
+        """
+        if isinstance(placeholder, ValuePlaceholder):
+            query_rows = self.query_responses.get(placeholder.query_id)
+            if query_rows is not None and (
+                len(query_rows) > placeholder.row_index
             ):
                 return str(
-                    self.query_responses[query_id][row_index].get(
-                        column_name, ""
+                    query_rows[placeholder.row_index].get(
+                        placeholder.column_name, ""
                     )
                 )
             return ""
 
-        elif match.group("field_name"):
-            field_name = match.group("field_name")
-            if self.fields.get(field_name, ""):
-                await self.query_executor.add_input_field_value(
-                    self.enquiry_id,
-                    self.uow,
-                    {field_name: self.templater_params["fields"][field_name]},
-                    self.templater_params["user_id"],
-                )
-                return str(self.fields.get(field_name, ""))
-            else:
-                return ""
+        elif isinstance(placeholder, FieldPlaceholder):
+            return str(self.fields.get(placeholder.field_name, ""))
 
-        return match.group(0)
+        return None
+
+    def _render_placeholders(self, text: str) -> str:
+        """Подставляет значения всех одиночных плейсхолдеров текста.
+
+        Args:
+            text (str): Текст ячейки или параграфа шаблона.
+
+        Returns:
+            str: Текст с подставленными значениями.
+
+        """
+        return parse_placeholders(text).render(self._resolve_placeholder)
 
     # Эти методы должны будут реализовать дочерние классы
+    @staticmethod
+    @abstractmethod
+    def _read_template_texts(template_file_path: str) -> Iterable[str]: ...
+
     @abstractmethod
     def _load_template(self): ...
 
     @abstractmethod
-    async def _replace_single_placeholders(self): ...
+    def _replace_single_placeholders(self): ...
 
     @abstractmethod
     def _process_dynamic_tables(self): ...
@@ -137,31 +227,260 @@ class BaseTemplater(ABC):
     def _add_footer_info(self): ...
 
     @abstractmethod
-    def _save_and_cleanup(self) -> str: ...
+    def _save_and_cleanup(self) -> BinaryIO: ...
+
+    def _render(self) -> BinaryIO:
+        """Формирует документ по подготовленным данным.
+
+        Все этапы блокирующие, поэтому метод выполняется в потоке
+        `RENDER_EXECUTOR`.
+
+        Returns:
+            BinaryIO: Буфер со сгенерированной справкой.
+
+        """
+        self._load_template()
+
+        self._replace_single_placeholders()
+        self._process_dynamic_tables()
+
+        self._add_footer_info()
+
+        return self._save_and_cleanup()
+
+    def _template_version(self) -> list:
+        """Возвращает путь и версии шаблона для ключа кэша справок.
+
+        Версии берутся из плана справки, только что проверенного в
+        `get_data`, и из времени изменения файла шаблона.
+        """
+        render_plan = RENDER_PLAN_CACHE.get(self.enquiry_id)
+        template_version = None
+        if render_plan is not None:
+            template_version = next(
+                (
+                    template.version
+                    for template in render_plan.templates
+                    if template.template_file_path == self.template_file_path
+                ),
+                None,
+            )
+        try:
+            mtime_ns = os.stat(self.template_file_path).st_mtime_ns
+        except OSError:
+            mtime_ns = None
+        return [
+            self.template_file_path,
+            render_plan.version if render_plan is not None else None,
+            template_version,
+            mtime_ns,
+        ]
+
+    async def _render_report(
+        self, convert: ReportConverter | None
+    ) -> BinaryIO:
+        report = await RENDER_EXECUTOR.run(self._render)
+        if convert is not None:
+            report = await convert(report, self.workspace)
+        return report
+
+    async def _render_shared(self, convert: ReportConverter | None) -> bytes:
+        """Формирует справку для `RENDERED_REPORT_CACHE`.
+
+        Формирование выполняется общей задачей кэша и продолжается, даже
+        если запрос, который его начал, отменен и удалил свой рабочий
+        каталог. Поэтому справка формируется копией шаблонизатора в
+        собственном рабочем каталоге, который удаляется после чтения.
+
+        Args:
+            convert (ReportConverter | None): Преобразование сформированной
+                справки, например конвертация в `.pdf`.
+
+        Returns:
+            bytes: Содержимое справки.
+
+        """
+        workspace = RequestWorkspace()
+        renderer = copy.copy(self)
+        renderer.workspace = workspace
+        try:
+            report = await RENDER_EXECUTOR.run(renderer._render)
+            if convert is not None:
+                report = await convert(report, workspace)
+            with report:
+                return await RENDER_EXECUTOR.run(report.read)
+        finally:
+            workspace.cleanup()
+
+    async def _render_cached(
+        self,
+        report_format: str,
+        convert: ReportConverter | None,
+    ) -> BinaryIO:
+        """Формирует справку или берет ее из `RENDERED_REPORT_CACHE`.
+
+        Справка берется из кэша, если совпадают версия шаблона, поля,
+        параметры фильтрации и данные запросов. Такая справка содержит
+        время формирования первой из них.
+
+        Args:
+            report_format (str): Формат итоговой справки.
+            convert (ReportConverter | None): Преобразование сформированной
+                справки, например конвертация в `.pdf`.
+
+        Returns:
+            BinaryIO: Буфер со справкой, установленный на начало.
+
+        """
+        if (
+            self.templater_params.get("bypass_cache", False)
+            or RENDERED_REPORT_CACHE.ttl <= 0
+        ):
+            return await self._render_report(convert)
+
+        # Отпечаток данных считается по всем строкам, поэтому в потоке
+        key = await RENDER_EXECUTOR.run(
+            make_report_cache_key,
+            self._template_version(),
+            report_format,
+            self.fields,
+            self.templater_params.get("filter_params"),
+            self.raw_query_responses,
+        )
+        payload = await RENDERED_REPORT_CACHE.get_or_render(
+            key, lambda: self._render_shared(convert)
+        )
+        report = self.workspace.spooled_file()
+        report.write(payload)
+        report.seek(0)
+        return report
 
     # Главный оркестрирующий метод
-    async def generate_report_from_template(self, is_pdf: bool = False) -> str:
+    async def generate_report_from_template(
+        self,
+        is_pdf: bool = False,
+        convert: ReportConverter | None = None,
+    ) -> BinaryIO:
         """Инициилизирует генерацию справки по шаблону.
 
         Основная функция модуля. Генерирует справку с помощью функций в модуле,
         предварительно обработав данные полученные из баз данных.
+        Одинаковые справки берутся из `RENDERED_REPORT_CACHE`.
 
 
         Args:
             is_pdf (bool, optional): Определяет возможный формат.
                 Defaults to False.
+            convert (ReportConverter | None, optional): Преобразование справки
+                перед кэшированием, например конвертация в `.pdf`.
+                Defaults to None.
 
         Returns:
-            str: Функция возращает путь к сгенерованной справке.
+            BinaryIO: Функция возращает буфер со сгенерованной справкой,
+            установленный на начало. Буфер выгружается в `self.workspace`
+            только при превышении `REPORT_SPOOL_MAX_BYTES`. При ошибке
+            рабочий каталог удаляется.
 
         """
-        async with self.uow:
-            await self._fetch_and_prepare_data(is_pdf)
-            self._load_template()
+        try:
+            async with self.uow:
+                await self._fetch_and_prepare_data(is_pdf)
+                report = await self._render_cached(
+                    "pdf" if convert is not None else self.template_type,
+                    convert,
+                )
 
-            await self._replace_single_placeholders()
-            self._process_dynamic_tables()
+                # Значения полей сохраняются один раз, после формирования
+                # справки
+                await self.query_executor.add_input_field_values(
+                    self.enquiry_id,
+                    self.uow,
+                    self.fields,
+                    self.templater_params["user_id"],
+                )
+                return report
+        except BaseException:
+            self.cleanup_workspace()
+            raise
+
+    @staticmethod
+    async def generate_reports(
+        templaters: Sequence[tuple["BaseTemplater", bool]],
+    ) -> list[BinaryIO]:
+        """Формирует справки нескольких форматов по одной выборке данных.
 
-            self._add_footer_info()
+        Запросы всех шаблонов выполняются один раз, после чего справки
+        формируются параллельно в `RENDER_EXECUTOR`. Шаблонизаторы должны
+        относиться к одной справке, с одними параметрами и `uow`.
+
+        Args:
+            templaters (Sequence[tuple[BaseTemplater, bool]]): Шаблонизаторы
+                и признак формирования по шаблону для `.pdf`.
 
-            return self._save_and_cleanup()
+        Returns:
+            list[BinaryIO]: Буферы со сгенерированными справками в порядке
+            `templaters`, установленные на начало. При ошибке рабочие
+            каталоги всех шаблонизаторов удаляются.
+
+        """
+        leader = templaters[0][0]
+        try:
+            async with leader.uow:
+                raw_query_responses: dict[int, QueryRows] = {}
+                selected = await leader.query_executor.get_bundle_data(
+                    leader.enquiry_id,
+                    leader.uow,
+                    leader.templater_params,
+                    [
+                        (
+                            templater.template_type,
+                            is_pdf,
+                            templater._referenced_columns,
+                        )
+                        for templater, is_pdf in templaters
+                    ],
+                    raw_query_responses,
+                )
+                for (templater, _), (template_file_path, query_ids) in zip(
+                    templaters, selected
+                ):
+                    templater.template_file_path = template_file_path
+                    templater.raw_query_responses.update(
+                        (query_id, raw_query_responses[query_id])
+                        for query_id in query_ids
+                        if query_id in raw_query_responses
+                    )
+                    templater._prepare_responses()
+
+                results = await asyncio.gather(
+                    *(
+                        RENDER_EXECUTOR.run(templater._render)
+                        for templater, _ in templaters
+                    ),
+                    return_exceptions=True,
+                )
+                reports = [
+                    result
+                    for result in results
+                    if not isinstance(result, BaseException)
+                ]
+                if len(reports) != len(results):
+                    for report in reports:
+                        report.close()
+                    raise next(
+                        result
+                        for result in results
+                        if isinstance(result, BaseException)
+                    )
+
+                await leader.query_executor.add_input_field_values(
+                    leader.enquiry_id,
+                    leader.uow,
+                    leader.fields,
+                    leader.templater_params["user_id"],
+                )
+                return reports
+        except BaseException:
+            for templater, _ in templaters:
+                templater.cleanup_workspace()
+            raise
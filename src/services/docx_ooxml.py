@@ -0,0 +1,528 @@
+import bisect
+import os
+import re
+import zipfile
+from dataclasses import dataclass, field
+from datetime import datetime
+from functools import lru_cache
+from typing import TYPE_CHECKING, BinaryIO
+from xml.parsers import expat
+from xml.sax.saxutils import escape
+
+from utils.logger import GLOBAL_LOGGER
+from utils.placeholders import ParsedText, parse_placeholders
+from utils.zip_rewriter import rewrite_zip
+
+if TYPE_CHECKING:
+    from services.templaterDocx import DocxTemplate
+
+DOCUMENT_PART = "word/document.xml"
+DOCUMENT_RELS_PART = "word/_rels/document.xml.rels"
+CONTENT_TYPES_PART = "[Content_Types].xml"
+GENERATED_FOOTER_PART = "word/footerEnquiry.xml"
+GENERATED_FOOTER_ID = "rIdEnquiryFooter"
+
+W_NAMESPACE = "http://schemas.openxmlformats.org/wordprocessingml/2006/main"
+R_NAMESPACE = (
+    "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+)
+FOOTER_RELATIONSHIP = R_NAMESPACE + "/footer"
+FOOTER_CONTENT_TYPE = (
+    "application/vnd.openxmlformats-officedocument.wordprocessingml"
+    ".footer+xml"
+)
+
+SECT_PR_PATTERN = re.compile(
+    rb"<w:sectPr\b[^>]*/>|<w:sectPr\b[^>]*>.*?</w:sectPr>", re.DOTALL
+)
+DEFAULT_FOOTER_REFERENCE_PATTERN = re.compile(
+    rb"<w:footerReference\b[^>]*w:type=\"default\"[^>]*>"
+)
+RELATIONSHIP_ID_PATTERN = re.compile(rb"r:id=\"([^\"]+)\"")
+
+
+@dataclass
+class ParagraphSpan:
+    """Параграф `w:p` в байтах `document.xml`.
+
+    Attributes:
+        start (int): Начало открывающего тега.
+        start_tag_end (int): Конец открывающего тега.
+        end (int): Конец закрывающего тега.
+        text (str): Текст всех `w:t` параграфа.
+        properties (tuple[int, int] | None): Границы `w:pPr`.
+        run_properties (tuple[int, int] | None): Границы `w:rPr` первого
+            фрагмента `w:r`.
+        has_nested (bool): Параграф содержит другие параграфы (надписи),
+            такой параграф не переписывается.
+
+    """
+
+    start: int
+    start_tag_end: int
+    end: int = 0
+    text: str = ""
+    properties: tuple[int, int] | None = None
+    run_properties: tuple[int, int] | None = None
+    has_nested: bool = False
+
+
+@dataclass(frozen=True)
+class RowSpan:
+    """Строка-шаблон таблицы `w:tr` в байтах `document.xml`.
+
+    Attributes:
+        start (int): Начало открывающего тега.
+        end (int): Конец закрывающего тега.
+        query_id (int | None): Запрос, данными которого заполняется строка.
+        placeholders (dict[int, ParsedText]): Разобранный текст первого
+            параграфа ячейки с плейсхолдером блока по началу параграфа.
+
+    """
+
+    start: int
+    end: int
+    query_id: int | None
+    placeholders: dict[int, ParsedText]
+
+
+@dataclass(frozen=True)
+class CompiledOoxmlTemplate:
+    """Разобранный шаблон для движка OOXML.
+
+    Attributes:
+        archive (bytes): Архив шаблона.
+        document_xml (bytes): Содержимое `word/document.xml`.
+        paragraphs (list[ParagraphSpan]): Параграфы с плейсхолдерами по
+            возрастанию `start`.
+        repeat_rows (list[RowSpan]): Строки-шаблоны по возрастанию `start`.
+        footer_parts (frozenset[str]): Части нижних колонтитулов по
+            умолчанию.
+        needs_footer (bool): Есть секции без нижнего колонтитула.
+
+    """
+
+    archive: bytes
+    document_xml: bytes
+    paragraphs: list[ParagraphSpan]
+    repeat_rows: list[RowSpan]
+    footer_parts: frozenset[str]
+    needs_footer: bool
+    paragraph_starts: list[int] = field(default_factory=list)
+
+    def paragraphs_between(self, start: int, end: int) -> list[ParagraphSpan]:
+        """Возвращает параграфы с плейсхолдерами внутри `[start, end)`."""
+        low = bisect.bisect_left(self.paragraph_starts, start)
+        high = bisect.bisect_left(self.paragraph_starts, end)
+        return self.paragraphs[low:high]
+
+
+class _DocumentScanner:
+    """Потоковый разбор `document.xml` с запоминанием байтовых границ."""
+
+    def __init__(self, xml: bytes):
+        self.xml = xml
+        self.paragraphs: list[ParagraphSpan] = []
+        self.rows: list[tuple[int, int, list[ParagraphSpan | None]]] = []
+        self._elements: list[str] = []
+        self._open_paragraphs: list[tuple[int, ParagraphSpan]] = []
+        self._first_run_depth: int | None = None
+        self._open_rows: list[tuple[int, int, list]] = []
+        # Открытый w:pPr параграфа или w:rPr его первого фрагмента
+        self._open_property: tuple[str, int, int] | None = None
+        # Конец тега пустого элемента `<w:x />`: для него expat сообщает
+        # о закрытии уже после тега
+        self._empty_tag_end: int | None = None
+
+        self._parser = expat.ParserCreate()
+        self._parser.buffer_text = True
+        self._parser.StartElementHandler = self._start
+        self._parser.EndElementHandler = self._end
+        self._parser.CharacterDataHandler = self._text
+
+    def scan(self) -> None:
+        self._parser.Parse(self.xml, True)
+
+    def _tag_end(self, position: int) -> int:
+        return self.xml.index(b">", position) + 1
+
+    def _start(self, name: str, attributes: dict) -> None:
+        position = self._parser.CurrentByteIndex
+        depth = len(self._elements)
+        self._elements.append(name)
+        tag_end = self._tag_end(position)
+        self._empty_tag_end = (
+            tag_end if self.xml[tag_end - 2 : tag_end] == b"/>" else None
+        )
+
+        if name == "w:p":
+            if self._open_paragraphs:
+                self._open_paragraphs[-1][1].has_nested = True
+            paragraph = ParagraphSpan(position, tag_end)
+            self._open_paragraphs.append((depth, paragraph))
+            self._first_run_depth = None
+            if self._open_rows:
+                row_depth, _, cells = self._open_rows[-1]
+                # Первый параграф непосредственно в ячейке строки
+                if (
+                    depth == row_depth + 2
+                    and self._elements[row_depth + 1] == "w:tc"
+                    and cells[-1] is None
+                ):
+                    cells[-1] = paragraph
+            return
+
+        if self._open_paragraphs:
+            paragraph_depth, paragraph = self._open_paragraphs[-1]
+            if name == "w:pPr" and depth == paragraph_depth + 1:
+                self._open_property = (name, depth, position)
+            elif (
+                name == "w:r"
+                and depth == paragraph_depth + 1
+                and self._first_run_depth is None
+                and paragraph.run_properties is None
+            ):
+                self._first_run_depth = depth
+            elif (
+                name == "w:rPr"
+                and self._first_run_depth is not None
+                and depth == self._first_run_depth + 1
+            ):
+                self._open_property = (name, depth, position)
+
+        if name == "w:tr":
+            self._open_rows.append((depth, position, []))
+        elif name == "w:tc" and self._open_rows:
+            row_depth, _, cells = self._open_rows[-1]
+            if depth == row_depth + 1:
+                cells.append(None)
+
+    def _end(self, name: str) -> None:
+        if self._empty_tag_end is not None:
+            end = self._empty_tag_end
+            self._empty_tag_end = None
+        else:
+            end = self._tag_end(self._parser.CurrentByteIndex)
+        self._elements.pop()
+        depth = len(self._elements)
+
+        if name == "w:p" and self._open_paragraphs:
+            _, paragraph = self._open_paragraphs.pop()
+            paragraph.end = end
+            self.paragraphs.append(paragraph)
+            self._first_run_depth = None
+        elif self._open_property and self._open_property[:2] == (
+            name,
+            depth,
+        ):
+            span = (self._open_property[2], end)
+            paragraph = self._open_paragraphs[-1][1]
+            if name == "w:pPr":
+                paragraph.properties = span
+            else:
+                paragraph.run_properties = span
+            self._open_property = None
+        elif name == "w:r" and depth == self._first_run_depth:
+            self._first_run_depth = -1
+        elif name == "w:tr" and self._open_rows:
+            _, start, cells = self._open_rows.pop()
+            # Вложенные таблицы не размножаются, как и в движке Spire.Doc
+            if not self._open_rows:
+                self.rows.append((start, end, cells))
+
+    def _text(self, data: str) -> None:
+        if self._open_paragraphs and self._elements[-1] == "w:t":
+            self._open_paragraphs[-1][1].text += data
+
+
+def _relationship_targets(rels_xml: bytes) -> dict[str, str]:
+    targets = {}
+    for relationship in re.finditer(rb"<Relationship\b[^>]*>", rels_xml):
+        attributes = dict(
+            re.findall(rb"(\w+)=\"([^\"]*)\"", relationship.group(0))
+        )
+        if attributes.get(b"Type", b"").decode() == FOOTER_RELATIONSHIP:
+            target = attributes[b"Target"].decode().lstrip("/")
+            if not target.startswith("word/"):
+                target = "word/" + target
+            targets[attributes[b"Id"].decode()] = target
+    return targets
+
+
+@lru_cache(maxsize=32)
+def compile_ooxml_template(
+    template_file_path: str, mtime_ns: int, size: int
+) -> CompiledOoxmlTemplate:
+    """Разбирает шаблон один раз на версию файла.
+
+    Результат кэшируется по пути, времени изменения и размеру файла.
+    """
+    with open(template_file_path, "rb") as file:
+        archive = file.read()
+    with zipfile.ZipFile(template_file_path) as zip_file:
+        document_xml = zip_file.read(DOCUMENT_PART)
+        try:
+            rels_xml = zip_file.read(DOCUMENT_RELS_PART)
+        except KeyError:
+            rels_xml = b""
+
+    scanner = _DocumentScanner(document_xml)
+    scanner.scan()
+
+    repeat_rows = []
+    for start, end, cells in scanner.rows:
+        query_id = None
+        placeholders = {}
+        for cell in cells:
+            parsed_text = parse_placeholders(cell.text if cell else "")
+            block_match = parsed_text.blocks()
+            if block_match:
+                query_id = block_match[0].query_id
+                placeholders[cell.start] = parsed_text
+        if placeholders:
+            repeat_rows.append(RowSpan(start, end, query_id, placeholders))
+
+    paragraphs = sorted(
+        (
+            paragraph
+            for paragraph in scanner.paragraphs
+            if "{{" in paragraph.text and not paragraph.has_nested
+        ),
+        key=lambda paragraph: paragraph.start,
+    )
+
+    footer_targets = _relationship_targets(rels_xml)
+    footer_parts = set()
+    needs_footer = False
+    for sect_pr in SECT_PR_PATTERN.finditer(document_xml):
+        reference = DEFAULT_FOOTER_REFERENCE_PATTERN.search(sect_pr.group(0))
+        relationship_id = (
+            RELATIONSHIP_ID_PATTERN.search(reference.group(0))
+            if reference
+            else None
+        )
+        target = (
+            footer_targets.get(relationship_id.group(1).decode())
+            if relationship_id
+            else None
+        )
+        if target:
+            footer_parts.add(target)
+        else:
+            needs_footer = True
+
+    return CompiledOoxmlTemplate(
+        archive=archive,
+        document_xml=document_xml,
+        paragraphs=paragraphs,
+        repeat_rows=sorted(repeat_rows, key=lambda row: row.start),
+        footer_parts=frozenset(footer_parts),
+        needs_footer=needs_footer,
+        paragraph_starts=[paragraph.start for paragraph in paragraphs],
+    )
+
+
+class OoxmlDocxRenderer:
+    """Движок формирования `.docx` напрямую по `word/document.xml`.
+
+    Документ не загружается в объектную модель: байты `document.xml`
+    копируются как есть, а переписываются только параграфы с
+    плейсхолдерами и строки-шаблоны таблиц. Синтаксис плейсхолдеров и
+    форматирование значений совпадают с движком Spire.Doc. Остальные части
+    архива копируются без повторного сжатия.
+    """
+
+    def __init__(self, templater: "DocxTemplate"):
+        """Инициализирует движок.
+
+        Args:
+            templater (DocxTemplate): Шаблонизатор с подготовленными
+                данными запросов и рабочим каталогом.
+
+        """
+        self.templater = templater
+        stat = os.stat(templater.template_file_path)
+        self.compiled = compile_ooxml_template(
+            templater.template_file_path, stat.st_mtime_ns, stat.st_size
+        )
+
+    def render(self) -> BinaryIO:
+        """Формирует справку.
+
+        Returns:
+            BinaryIO: Буфер со сгенерированной справкой.
+
+        """
+        document_xml = self._render_document()
+        footer_paragraph = self._footer_paragraph()
+        patched_parts = {DOCUMENT_PART: document_xml}
+        for footer_part in self.compiled.footer_parts:
+            patched_parts[footer_part] = None
+        extra_members = {}
+        if self.compiled.needs_footer:
+            patched_parts[DOCUMENT_PART] = self._add_footer_references(
+                document_xml
+            )
+            patched_parts[DOCUMENT_RELS_PART] = None
+            patched_parts[CONTENT_TYPES_PART] = None
+            extra_members[GENERATED_FOOTER_PART] = (
+                '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                f'<w:ftr xmlns:w="{W_NAMESPACE}" xmlns:r="{R_NAMESPACE}">'
+            ).encode("utf-8") + footer_paragraph + b"</w:ftr>"
+
+        def patch(name: str, content: bytes) -> bytes:
+            replacement = patched_parts[name]
+            if replacement is not None:
+                return replacement
+            if name in self.compiled.footer_parts:
+                start_tag = re.search(rb"<w:ftr\b[^>]*>", content)
+                position = start_tag.end()
+                return content[:position] + footer_paragraph + content[
+                    position:
+                ]
+            if name == DOCUMENT_RELS_PART:
+                return content.replace(
+                    b"</Relationships>",
+                    (
+                        f'<Relationship Id="{GENERATED_FOOTER_ID}" '
+                        f'Type="{FOOTER_RELATIONSHIP}" '
+                        'Target="footerEnquiry.xml"/></Relationships>'
+                    ).encode("utf-8"),
+                )
+            return content.replace(
+                b"</Types>",
+                (
+                    '<Override PartName="/word/footerEnquiry.xml" '
+                    f'ContentType="{FOOTER_CONTENT_TYPE}"/></Types>'
+                ).encode("utf-8"),
+            )
+
+        output = self.templater.workspace.spooled_file()
+        rewrite_zip(
+            self.compiled.archive,
+            output,
+            re.compile("|".join(re.escape(name) for name in patched_parts)),
+            patch,
+            extra_members,
+        )
+        output.seek(0)
+        return output
+
+    def _render_document(self) -> bytes:
+        xml = self.compiled.document_xml
+        chunks: list[bytes] = []
+        position = 0
+        for row in self.compiled.repeat_rows:
+            chunks.extend(self._render_region(position, row.start, {}))
+            chunks.extend(self._render_row(row))
+            position = row.end
+        chunks.extend(self._render_region(position, len(xml), {}))
+        return b"".join(chunks)
+
+    def _render_row(self, row: RowSpan) -> list[bytes]:
+        query_responses = self.templater.query_responses
+        if not row.query_id or row.query_id not in query_responses:
+            GLOBAL_LOGGER.debug(
+                f"  -> Данных нет, строка-шаблон {row.start} удалена."
+            )
+            return []
+        chunks = []
+        for data_row in query_responses[row.query_id]:
+            values = {
+                paragraph_start: self.templater._render_row_cell(
+                    parsed_text, row.query_id, data_row
+                )
+                for paragraph_start, parsed_text in row.placeholders.items()
+            }
+            chunks.extend(self._render_region(row.start, row.end, values))
+        return chunks
+
+    def _render_region(
+        self, start: int, end: int, values: dict[int, str]
+    ) -> list[bytes]:
+        xml = self.compiled.document_xml
+        chunks = []
+        position = start
+        for paragraph in self.compiled.paragraphs_between(start, end):
+            text = values.get(paragraph.start)
+            if text is None:
+                text = self._replace_placeholders(paragraph.text)
+            if text is None:
+                continue
+            chunks.append(xml[position : paragraph.start])
+            chunks.append(self._paragraph_xml(paragraph, text))
+            position = paragraph.end
+        chunks.append(xml[position:end])
+        return chunks
+
+    def _replace_placeholders(self, text: str) -> str | None:
+        """Подставляет значения одиночных плейсхолдеров и форматтеров.
+
+        Returns:
+            str | None: Новый текст или None, если текст не изменился.
+
+        """
+        updated_text = self.templater._render_placeholders(text)
+        return None if updated_text == text else updated_text
+
+    def _paragraph_xml(self, paragraph: ParagraphSpan, text: str) -> bytes:
+        """Собирает параграф из одного фрагмента с форматированием первого.
+
+        Так же поступает движок Spire.Doc: содержимое параграфа очищается,
+        а текст вставляется с форматированием первого фрагмента.
+        """
+        xml = self.compiled.document_xml
+        properties = (
+            xml[slice(*paragraph.properties)] if paragraph.properties else b""
+        )
+        run_properties = (
+            xml[slice(*paragraph.run_properties)]
+            if paragraph.run_properties
+            else b""
+        )
+        return b"".join(
+            (
+                xml[paragraph.start : paragraph.start_tag_end],
+                properties,
+                b"<w:r>",
+                run_properties,
+                _text_xml(text),
+                b"</w:r></w:p>",
+            )
+        )
+
+    def _footer_paragraph(self) -> bytes:
+        current_time = datetime.now().strftime("%d.%m.%Y %H:%M:%S")
+        return (
+            '<w:p><w:pPr><w:spacing w:after="0"/><w:jc w:val="right"/>'
+            '</w:pPr><w:r><w:rPr><w:rFonts w:ascii="Times New Roman" '
+            'w:hAnsi="Times New Roman" w:cs="Times New Roman"/>'
+            '<w:sz w:val="18"/></w:rPr>'
+        ).encode("utf-8") + _text_xml(
+            f"Справка сформирована\n{current_time}"
+        ) + b"</w:r></w:p>"
+
+    def _add_footer_references(self, document_xml: bytes) -> bytes:
+        reference = (
+            f'<w:footerReference xmlns:r="{R_NAMESPACE}" w:type="default" '
+            f'r:id="{GENERATED_FOOTER_ID}"/>'
+        ).encode("utf-8")
+
+        def add_reference(match: re.Match) -> bytes:
+            sect_pr = match.group(0)
+            if DEFAULT_FOOTER_REFERENCE_PATTERN.search(sect_pr):
+                return sect_pr
+            if sect_pr.endswith(b"/>"):
+                return sect_pr[:-2] + b">" + reference + b"</w:sectPr>"
+            position = sect_pr.index(b">") + 1
+            return sect_pr[:position] + reference + sect_pr[position:]
+
+        return SECT_PR_PATTERN.sub(add_reference, document_xml)
+
+
+def _text_xml(text: str) -> bytes:
+    """Возвращает `w:t`, разделенные `w:br` по переводам строки."""
+    return b"<w:br/>".join(
+        f'<w:t xml:space="preserve">{escape(line)}</w:t>'.encode("utf-8")
+        for line in text.split("\n")
+    )
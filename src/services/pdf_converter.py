@@ -0,0 +1,336 @@
+import asyncio
+import os
+import shutil
+import time
+from pathlib import Path
+
+from exceptions import PdfConversionError
+from loaded_env import get_variables
+from utils.logger import GLOBAL_LOGGER
+from utils.render_executor import RenderExecutor
+
+try:
+    import uno
+    from com.sun.star.beans import PropertyValue
+except ImportError:
+    uno = None
+
+SOFFICE_COMMAND = "soffice" if os.name != "nt" else "soffice.exe"
+# Файл блокировки профиля, остающийся после принудительного завершения
+PROFILE_LOCK_FILE = ".lock"
+
+
+def _property(name: str, value) -> "PropertyValue":
+    prop = PropertyValue()
+    prop.Name = name
+    prop.Value = value
+    return prop
+
+
+class LibreOfficeWorker:
+    """Конвертер в PDF с собственным профилем LibreOffice.
+
+    Воркер держит запущенный headless-процесс и конвертирует документы
+    через UNO, поэтому запуск LibreOffice не повторяется на каждую
+    конвертацию. Нужен модуль `uno` (системный пакет python3-uno).
+    """
+
+    def __init__(
+        self,
+        index: int,
+        profile_dir: str,
+        port: int,
+        executor: RenderExecutor,
+    ):
+        """Инициализирует воркер.
+
+        Args:
+            index (int): Номер воркера в пуле.
+            profile_dir (str): Директория профиля LibreOffice.
+            port (int): Порт UNO-соединения.
+            executor (RenderExecutor): Пул потоков для блокирующих
+                UNO-вызовов.
+
+        """
+        self.index = index
+        self.profile_dir = profile_dir
+        self.port = port
+        self.executor = executor
+        self._process: asyncio.subprocess.Process | None = None
+        self._desktop = None
+
+    @property
+    def _profile_url(self) -> str:
+        return Path(self.profile_dir).absolute().as_uri()
+
+    async def start(self) -> None:
+        """Запускает процесс LibreOffice воркера.
+
+        Raises:
+            PdfConversionError: К запущенному процессу не удалось
+                подключиться, например из-за поврежденного профиля.
+
+        """
+        os.makedirs(self.profile_dir, exist_ok=True)
+        self._process = await asyncio.create_subprocess_exec(
+            SOFFICE_COMMAND,
+            f"-env:UserInstallation={self._profile_url}",
+            "--headless",
+            "--invisible",
+            "--nologo",
+            "--norestore",
+            "--nodefault",
+            f"--accept=socket,host=127.0.0.1,port={self.port};urp;",
+            stdout=asyncio.subprocess.DEVNULL,
+            stderr=asyncio.subprocess.DEVNULL,
+        )
+        try:
+            await self.executor.run(self._connect)
+        except Exception as e:
+            await self.stop()
+            raise PdfConversionError(
+                f"Воркер LibreOffice {self.index} не запустился: {e}"
+            ) from e
+        GLOBAL_LOGGER.debug(
+            f"Воркер LibreOffice {self.index} запущен на порту {self.port}"
+        )
+
+    async def stop(self) -> None:
+        """Останавливает процесс LibreOffice воркера."""
+        self._desktop = None
+        if self._process is not None and self._process.returncode is None:
+            self._process.kill()
+            await self._process.wait()
+            # Процесс завершен принудительно и не снял блокировку профиля
+            try:
+                os.unlink(os.path.join(self.profile_dir, PROFILE_LOCK_FILE))
+            except OSError:
+                pass
+        self._process = None
+
+    async def restart(self) -> None:
+        """Перезапускает воркер после сбоя или зависания.
+
+        Профиль удаляется, только если LibreOffice не запускается с ним:
+        профиль заблокирован или поврежден. Ошибки конвертации отдельных
+        документов профиль не затрагивают.
+        """
+        GLOBAL_LOGGER.warning(f"Перезапуск воркера LibreOffice {self.index}")
+        await self.stop()
+        try:
+            await self.start()
+        except PdfConversionError as e:
+            GLOBAL_LOGGER.warning(
+                f"Профиль воркера LibreOffice {self.index} сбрасывается: {e}"
+            )
+            shutil.rmtree(self.profile_dir, ignore_errors=True)
+            await self.start()
+
+    async def convert(self, source_path: str, output_dir: str) -> str:
+        """Конвертирует документ в PDF.
+
+        Args:
+            source_path (str): Путь к исходному документу.
+            output_dir (str): Директория для PDF.
+
+        Returns:
+            str: Путь к PDF.
+
+        Raises:
+            PdfConversionError: Конвертация завершилась ошибкой или не
+                уложилась в `PDF_CONVERSION_TIMEOUT`. При превышении
+                времени процесс LibreOffice завершается, чтобы освободить
+                поток пула.
+
+        """
+        timeout = get_variables().PDF_CONVERSION_TIMEOUT
+        pdf_path = os.path.join(
+            output_dir, f"{Path(source_path).stem}.pdf"
+        )
+        if self._process is None or self._process.returncode is not None:
+            await self.restart()
+        try:
+            await asyncio.wait_for(
+                self.executor.run(
+                    self._convert_with_uno, source_path, pdf_path
+                ),
+                timeout,
+            )
+        except TimeoutError as e:
+            # wait_for только перестает ждать поток пула, сам UNO-вызов
+            # разблокируется, когда процесс LibreOffice будет завершен
+            await self.stop()
+            raise PdfConversionError(
+                f"Конвертация {source_path} не завершилась за {timeout} с"
+            ) from e
+        except asyncio.CancelledError:
+            await self.stop()
+            raise
+        except Exception as e:
+            raise PdfConversionError(
+                f"Ошибка конвертации {source_path}: {e}"
+            ) from e
+        return pdf_path
+
+    def _connect(self) -> None:
+        local_context = uno.getComponentContext()
+        resolver = local_context.ServiceManager.createInstanceWithContext(
+            "com.sun.star.bridge.UnoUrlResolver", local_context
+        )
+        deadline = time.monotonic() + 30
+        while True:
+            try:
+                context = resolver.resolve(
+                    f"uno:socket,host=127.0.0.1,port={self.port};urp;"
+                    "StarOffice.ComponentContext"
+                )
+                break
+            except Exception:
+                if time.monotonic() > deadline:
+                    raise
+                time.sleep(0.5)
+        self._desktop = context.ServiceManager.createInstanceWithContext(
+            "com.sun.star.frame.Desktop", context
+        )
+
+    def _convert_with_uno(self, source_path: str, pdf_path: str) -> None:
+        document = self._desktop.loadComponentFromURL(
+            uno.systemPathToFileUrl(os.path.abspath(source_path)),
+            "_blank",
+            0,
+            (_property("Hidden", True),),
+        )
+        try:
+            document.storeToURL(
+                uno.systemPathToFileUrl(os.path.abspath(pdf_path)),
+                (_property("FilterName", "writer_pdf_Export"),),
+            )
+        finally:
+            document.close(True)
+
+
+class LibreOfficePool:
+    """Пул долгоживущих воркеров конвертации в PDF.
+
+    Воркеры запускаются при старте приложения или при первой конвертации.
+    Запрос ждет свободного воркера не дольше `PDF_QUEUE_TIMEOUT`, упавший
+    или зависший воркер перезапускается. Блокирующие UNO-вызовы выполняются
+    в собственном пуле потоков по одному на воркер, поэтому долгие
+    конвертации не занимают `RENDER_EXECUTOR`.
+    """
+
+    def __init__(self, size: int, profiles_dir: str, base_port: int):
+        """Инициализирует пул.
+
+        Args:
+            size (int): Число воркеров.
+            profiles_dir (str): Корневая директория профилей воркеров.
+            base_port (int): Порт UNO первого воркера.
+
+        """
+        self.size = size
+        self.profiles_dir = profiles_dir
+        self.base_port = base_port
+        self._workers: list[LibreOfficeWorker] = []
+        self._executor: RenderExecutor | None = None
+        self._idle: asyncio.Queue[LibreOfficeWorker] | None = None
+        self._start_lock = asyncio.Lock()
+
+    async def start(self) -> None:
+        """Запускает воркеры пула.
+
+        Raises:
+            PdfConversionError: Модуль `uno` недоступен или воркер не
+                запустился.
+
+        """
+        await self._ensure_started()
+
+    async def _ensure_started(self) -> asyncio.Queue:
+        if uno is None:
+            raise PdfConversionError(
+                "Модуль uno недоступен: для конвертации в PDF нужен пакет "
+                "python3-uno, виртуальное окружение должно видеть системные "
+                "пакеты (--system-site-packages)"
+            )
+        async with self._start_lock:
+            if self._idle is None:
+                idle: asyncio.Queue[LibreOfficeWorker] = asyncio.Queue()
+                workers: list[LibreOfficeWorker] = []
+                executor = RenderExecutor(self.size, thread_name_prefix="pdf")
+                try:
+                    for index in range(self.size):
+                        worker = LibreOfficeWorker(
+                            index,
+                            os.path.join(self.profiles_dir, f"worker_{index}"),
+                            self.base_port + index,
+                            executor,
+                        )
+                        workers.append(worker)
+                        await worker.start()
+                        idle.put_nowait(worker)
+                except BaseException:
+                    # Пул запускается целиком, иначе следующий вызов
+                    # запустит новые процессы рядом с уже запущенными
+                    for worker in workers:
+                        await worker.stop()
+                    executor.shutdown()
+                    raise
+                self._executor = executor
+                self._workers = workers
+                self._idle = idle
+        return self._idle
+
+    async def convert(self, source_path: str, output_dir: str) -> str:
+        """Конвертирует документ в PDF на свободном воркере.
+
+        Args:
+            source_path (str): Путь к исходному документу.
+            output_dir (str): Директория для PDF.
+
+        Returns:
+            str: Путь к PDF.
+
+        Raises:
+            PdfConversionError: Нет свободного воркера или конвертация
+                завершилась ошибкой.
+
+        """
+        idle = await self._ensure_started()
+        try:
+            worker = await asyncio.wait_for(
+                idle.get(), get_variables().PDF_QUEUE_TIMEOUT
+            )
+        except TimeoutError as e:
+            raise PdfConversionError(
+                "Нет свободного воркера для конвертации в PDF"
+            ) from e
+        try:
+            return await worker.convert(source_path, output_dir)
+        except PdfConversionError:
+            await worker.restart()
+            raise
+        finally:
+            idle.put_nowait(worker)
+
+    async def shutdown(self) -> None:
+        """Останавливает все воркеры."""
+        for worker in self._workers:
+            await worker.stop()
+        self._workers.clear()
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+        self._idle = None
+
+
+def _build_pdf_converter_pool() -> LibreOfficePool:
+    settings = get_variables()
+    return LibreOfficePool(
+        settings.PDF_WORKERS,
+        settings.PDF_PROFILES_DIR,
+        settings.PDF_WORKER_BASE_PORT,
+    )
+
+
+PDF_CONVERTER_POOL = _build_pdf_converter_pool()
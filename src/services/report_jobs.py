@@ -0,0 +1,292 @@
+import asyncio
+import json
+import sqlite3
+import time
+from typing import Any, BinaryIO, Dict
+
+from loaded_env import get_variables
+from schemas.templater import TemplaterRequest
+from services.templaterDocx import DocxTemplate
+from services.templaterPdf import PdfCreation
+from services.templaterXlsx import TemplaterXlsx
+from utils.job_store import (
+    FINISHED_STATUSES,
+    ArtefactStore,
+    ReportJobStore,
+)
+from utils.logger import GLOBAL_LOGGER
+from utils.render_executor import RENDER_EXECUTOR
+from utils.unitofwork import UnitOfWork
+from utils.workspace import RequestWorkspace
+
+
+class ReportJobQueue:
+    """Очередь фоновых задач формирования справок.
+
+    Задачи выполняются пулом воркеров в цикле событий процесса, каждый
+    воркер формирует одну справку за раз. Состояние задач хранится в
+    `ReportJobStore`, готовые справки - в `ArtefactStore`. Пока задача
+    выполняется, очередь продлевает ее аренду и периодически забирает
+    задачи с истекшей арендой. Завершение задачи будит ожидающие ее
+    long-poll запросы этого процесса.
+    """
+
+    def __init__(
+        self, store: ReportJobStore, artefacts: ArtefactStore, workers: int
+    ):
+        """Инициализирует очередь.
+
+        Args:
+            store (ReportJobStore): Состояние задач.
+            artefacts (ArtefactStore): Хранилище готовых справок.
+            workers (int): Число воркеров.
+
+        """
+        self.store = store
+        self.artefacts = artefacts
+        self.workers = workers
+        self._queue: asyncio.Queue[str] | None = None
+        self._tasks: list[asyncio.Task] = []
+        # Задачи, выполняемые воркерами этого процесса
+        self._running: set[str] = set()
+        # События завершения задач в очереди этого процесса
+        self._finished: Dict[str, asyncio.Event] = {}
+        self._start_lock = asyncio.Lock()
+
+    async def start(self) -> None:
+        """Открывает базу задач и запускает воркеры.
+
+        Ожидающие задачи ставятся в очередь. Задачи, прерванные
+        остановкой процесса, выполняются заново после истечения их аренды.
+        """
+        await self._ensure_started()
+
+    async def _ensure_started(self) -> asyncio.Queue:
+        async with self._start_lock:
+            if self._queue is None:
+                queue: asyncio.Queue[str] = asyncio.Queue()
+                await asyncio.to_thread(self.store.open)
+                await asyncio.to_thread(self.store.requeue_expired)
+                for job_id in await asyncio.to_thread(self.store.list_queued):
+                    self._enqueue(queue, job_id)
+                self._tasks = [
+                    asyncio.create_task(self._worker(queue))
+                    for _ in range(self.workers)
+                ]
+                self._tasks.append(asyncio.create_task(self._sweeper()))
+                self._tasks.append(asyncio.create_task(self._heartbeat(queue)))
+                self._queue = queue
+        return self._queue
+
+    async def shutdown(self) -> None:
+        """Останавливает воркеры и закрывает базу задач.
+
+        Выполняемые задачи прерываются и будут выполнены заново при
+        следующем запуске.
+        """
+        async with self._start_lock:
+            for task in self._tasks:
+                task.cancel()
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+            self._tasks.clear()
+            self._running.clear()
+            self._queue = None
+            await asyncio.to_thread(self.store.close)
+
+    def _enqueue(self, queue: asyncio.Queue, job_id: str) -> None:
+        # Задача может одновременно оказаться в очередях нескольких
+        # процессов, выполнит ее тот, чей `mark_running` сработает первым
+        self._finished.setdefault(job_id, asyncio.Event())
+        queue.put_nowait(job_id)
+
+    async def submit(
+        self,
+        enquiry_id: int,
+        report_format: str,
+        templater_params: TemplaterRequest,
+    ) -> Dict[str, Any]:
+        """Ставит задачу формирования справки в очередь.
+
+        Args:
+            enquiry_id (int): ID справки.
+            report_format (str): Формат справки: xlsx, docx или pdf.
+            templater_params (TemplaterRequest): Параметры для фильтрации
+                данных во внешних запросах.
+
+        Returns:
+            Dict[str, Any]: Созданная задача.
+
+        """
+        queue = await self._ensure_started()
+        job = await asyncio.to_thread(
+            self.store.create,
+            enquiry_id,
+            report_format,
+            templater_params.model_dump(),
+        )
+        self._enqueue(queue, job["id"])
+        return job
+
+    async def get(self, job_id: str) -> Dict[str, Any] | None:
+        """Возвращает задачу по ID или None, если ее нет."""
+        return await asyncio.to_thread(self.store.get, job_id)
+
+    async def wait(self, job_id: str, timeout: float) -> Dict[str, Any] | None:
+        """Ожидает завершения задачи не дольше `timeout` секунд.
+
+        Args:
+            job_id (str): ID задачи.
+            timeout (float): Время ожидания в секундах.
+
+        Returns:
+            Dict[str, Any] | None: Задача в текущем статусе или None, если
+            ее нет.
+
+        """
+        # Событие берется до чтения статуса: оно устанавливается уже после
+        # записи итогового статуса, поэтому завершение не будет пропущено
+        finished = self._finished.get(job_id)
+        job = await self.get(job_id)
+        if (
+            job is None
+            or job["status"] in FINISHED_STATUSES
+            or finished is None
+            or timeout <= 0
+        ):
+            return job
+        try:
+            await asyncio.wait_for(finished.wait(), timeout)
+        except TimeoutError:
+            pass
+        return await self.get(job_id)
+
+    async def _worker(self, queue: asyncio.Queue) -> None:
+        while True:
+            job_id = await queue.get()
+            try:
+                await self._run(job_id)
+            except Exception:
+                # Ошибка одной задачи, например недоступность базы задач,
+                # не должна останавливать воркер
+                GLOBAL_LOGGER.exception(f"Ошибка выполнения задачи {job_id}")
+            finally:
+                queue.task_done()
+
+    async def _run(self, job_id: str) -> None:
+        try:
+            if await asyncio.to_thread(self.store.mark_running, job_id):
+                self._running.add(job_id)
+                try:
+                    await self._execute(job_id)
+                finally:
+                    self._running.discard(job_id)
+        finally:
+            finished = self._finished.pop(job_id, None)
+            if finished is not None:
+                finished.set()
+
+    async def _execute(self, job_id: str) -> None:
+        job = await self.get(job_id)
+        started_at = time.perf_counter()
+        try:
+            report, workspace = await self._render(job)
+            try:
+                size = await RENDER_EXECUTOR.run(
+                    self.artefacts.put, job_id, report
+                )
+            finally:
+                report.close()
+                workspace.cleanup()
+            await asyncio.to_thread(self.store.mark_done, job_id, size)
+            GLOBAL_LOGGER.info(
+                f"Задача {job_id} ({job['format']}) выполнена за "
+                f"{time.perf_counter() - started_at:.2f} с"
+            )
+        except Exception as e:
+            GLOBAL_LOGGER.error(f"Задача {job_id} завершилась ошибкой: {e}")
+            await asyncio.to_thread(
+                self.store.mark_failed, job_id, f"{type(e).__name__}: {e}"
+            )
+
+    @staticmethod
+    async def _render(
+        job: Dict[str, Any],
+    ) -> tuple[BinaryIO, RequestWorkspace]:
+        """Формирует справку задачи.
+
+        Returns:
+            tuple[BinaryIO, RequestWorkspace]: Справка и рабочий каталог,
+            который нужно удалить после ее сохранения.
+
+        """
+        uow = UnitOfWork()
+        enquiry_id = job["enquiry_id"]
+        templater_params = TemplaterRequest.model_validate(
+            json.loads(job["params"])
+        )
+        if job["format"] == "pdf":
+            templater_pdf = PdfCreation(uow, enquiry_id, templater_params)
+            return await templater_pdf.pdf_creation(), templater_pdf.workspace
+        templater_cls = (
+            TemplaterXlsx if job["format"] == "xlsx" else DocxTemplate
+        )
+        templater = templater_cls(uow, enquiry_id, templater_params)
+        report = await templater.generate_report_from_template()
+        return report, templater.workspace
+
+    async def _heartbeat(self, queue: asyncio.Queue) -> None:
+        """Продлевает аренду своих задач и забирает задачи с истекшей."""
+        interval = self.store.lease / 3
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                if self._running:
+                    await asyncio.to_thread(
+                        self.store.heartbeat, list(self._running)
+                    )
+                expired = await asyncio.to_thread(self.store.requeue_expired)
+            except sqlite3.Error as e:
+                GLOBAL_LOGGER.error(f"Ошибка продления аренды задач: {e}")
+                continue
+            for job_id in expired:
+                GLOBAL_LOGGER.warning(
+                    f"Аренда задачи {job_id} истекла, задача выполняется "
+                    "заново"
+                )
+                self._enqueue(queue, job_id)
+
+    async def _sweeper(self) -> None:
+        """Периодически удаляет устаревшие справки и задачи."""
+        settings = get_variables()
+        while True:
+            await asyncio.sleep(settings.REPORT_JOB_SWEEP_INTERVAL)
+            try:
+                removed = await asyncio.to_thread(self.artefacts.sweep)
+                purged = await asyncio.to_thread(
+                    self.store.purge, time.time() - self.artefacts.ttl
+                )
+            except (OSError, sqlite3.Error) as e:
+                GLOBAL_LOGGER.error(f"Ошибка очистки задач справок: {e}")
+                continue
+            if removed or purged:
+                GLOBAL_LOGGER.info(
+                    f"Удалено справок задач: {removed}, задач: {purged}"
+                )
+
+
+def _build_report_job_queue() -> ReportJobQueue:
+    settings = get_variables()
+    return ReportJobQueue(
+        ReportJobStore(
+            settings.REPORT_JOB_DB_PATH, settings.REPORT_JOB_LEASE
+        ),
+        ArtefactStore(
+            settings.REPORT_JOB_ARTEFACT_DIR,
+            settings.REPORT_JOB_ARTEFACT_MAX_BYTES,
+            settings.REPORT_JOB_TTL,
+        ),
+        settings.REPORT_JOB_WORKERS,
+    )
+
+
+REPORT_JOBS = _build_report_job_queue()
@@ -1,10 +1,12 @@
 import os
 import re
-import shutil
+import threading
 import zipfile
+from dataclasses import dataclass, field
 from datetime import datetime
 from decimal import Decimal
-from typing import Match, Union
+from functools import lru_cache
+from typing import BinaryIO, Iterator, Mapping, Union
 
 import spire.doc
 from spire.doc import (
@@ -14,15 +16,174 @@ from spire.doc import (
     Paragraph,
     TextRange,
 )
-from spire.doc.common import Regex
+from spire.doc.common import Stream
 
+from loaded_env import get_variables
 from schemas.templater import TemplaterRequest
+from services.docx_ooxml import OoxmlDocxRenderer
 from utils.logger import GLOBAL_LOGGER
+from utils.placeholders import (
+    BlockPlaceholder,
+    FormatterPlaceholder,
+    ParsedText,
+    Placeholder,
+    parse_placeholders,
+)
 from utils.unitofwork import IUnitOfWork
 from utils.utils import ExternalQueryExecutor
+from utils.workspace import RequestWorkspace
+from utils.zip_rewriter import rewrite_zip
 
 from .base_templater import BaseTemplater
 
+WATERMARK_XML = (
+    '<w:p><w:r><w:rPr><w:color w:val="FF0000" /><w:sz w:'
+    'val="24" /></w:rPr><w:t xml:space="preserve">Evaluation Warning: '
+    "The document was created with Spire.Doc"
+    " for Python.</w:t></w:r></w:p>"
+).encode("utf-8")
+# Части документа, в которые Spire.Doc вставляет водяной знак
+WATERMARK_PARTS_PATTERN = re.compile(
+    r"word/(?:document|header\d*|footer\d*)\.xml"
+)
+
+
+@dataclass(frozen=True)
+class ParagraphLocation:
+    """Положение параграфа с плейсхолдером в документе.
+
+    Для параграфа вне таблицы `paragraph` - индекс в `Body.ChildObjects`,
+    для параграфа в ячейке - индекс в `Cell.Paragraphs`.
+    """
+
+    section: int
+    paragraph: int
+    table: int | None = None
+    row: int | None = None
+    cell: int | None = None
+
+
+@dataclass(frozen=True)
+class RepeatRow:
+    """Строка-шаблон таблицы, размножаемая по строкам результата запроса.
+
+    Attributes:
+        section (int): Индекс секции.
+        table (int): Индекс таблицы в секции.
+        row (int): Индекс строки в таблице.
+        query_id (int | None): Запрос, данными которого заполняется строка.
+        placeholders (dict[int, ParsedText]): Разобранный текст первого
+            параграфа по индексу ячейки с плейсхолдером блока.
+
+    """
+
+    section: int
+    table: int
+    row: int
+    query_id: int | None
+    placeholders: dict[int, ParsedText]
+
+
+@dataclass(frozen=True)
+class CompiledDocxTemplate:
+    """Разобранный шаблон, не зависящий от данных запроса.
+
+    Attributes:
+        document (Document): Нетронутый документ шаблона, используется
+            только для клонирования.
+        paragraphs (tuple[ParagraphLocation, ...]): Параграфы, которые
+            могут содержать одиночные плейсхолдеры.
+        repeat_rows (tuple[RepeatRow, ...]): Строки-шаблоны в порядке
+            обработки - с конца каждой таблицы.
+
+    """
+
+    document: Document
+    paragraphs: tuple[ParagraphLocation, ...]
+    repeat_rows: tuple[RepeatRow, ...]
+    _clone_lock: threading.Lock = field(default_factory=threading.Lock)
+
+    def new_document(self) -> Document:
+        """Возвращает независимую копию документа шаблона."""
+        with self._clone_lock:
+            return self.document.Clone()
+
+
+@lru_cache(maxsize=32)
+def _compile_docx_template(
+    template_file_path: str, mtime_ns: int, size: int
+) -> CompiledDocxTemplate:
+    """Разбирает шаблон один раз на версию файла.
+
+    Результат кэшируется по пути, времени изменения и размеру файла.
+    """
+    document = Document()
+    document.LoadFromFile(template_file_path)
+    paragraphs = []
+    repeat_rows = []
+
+    def register(text: str, location: ParagraphLocation) -> None:
+        if parse_placeholders(text).placeholders:
+            paragraphs.append(location)
+
+    for section_index in range(document.Sections.Count):
+        section = document.Sections.get_Item(section_index)
+
+        for paragraph_index in range(section.Body.ChildObjects.Count):
+            paragraph = section.Body.ChildObjects.get_Item(paragraph_index)
+            if isinstance(paragraph, Paragraph):
+                register(
+                    paragraph.Text,
+                    ParagraphLocation(section_index, paragraph_index),
+                )
+
+        for table_index in range(section.Tables.Count):
+            table = section.Tables.get_Item(table_index)
+
+            for row_index in range(table.Rows.Count - 1, -1, -1):
+                row = table.Rows.get_Item(row_index)
+                placeholders_in_row = {}
+                query_id_for_this_row = None
+
+                for cell_index in range(row.Cells.Count):
+                    cell = row.Cells.get_Item(cell_index)
+                    for paragraph_index in range(cell.Paragraphs.Count):
+                        register(
+                            cell.Paragraphs.get_Item(paragraph_index).Text,
+                            ParagraphLocation(
+                                section_index,
+                                paragraph_index,
+                                table_index,
+                                row_index,
+                                cell_index,
+                            ),
+                        )
+                    if cell.Paragraphs.Count > 0:
+                        parsed_text = parse_placeholders(
+                            cell.Paragraphs.get_Item(0).Text
+                        )
+                        block_match = parsed_text.blocks()
+                        if block_match:
+                            query_id_for_this_row = block_match[0].query_id
+                            placeholders_in_row[cell_index] = parsed_text
+
+                if placeholders_in_row:
+                    repeat_rows.append(
+                        RepeatRow(
+                            section_index,
+                            table_index,
+                            row_index,
+                            query_id_for_this_row,
+                            placeholders_in_row,
+                        )
+                    )
+
+    return CompiledDocxTemplate(
+        document=document,
+        paragraphs=tuple(paragraphs),
+        repeat_rows=tuple(repeat_rows),
+    )
+
 
 class DocxTemplate(BaseTemplater):
     """Класс для автоматической генерации справки по формату ".docx" ."""
@@ -32,6 +193,7 @@ class DocxTemplate(BaseTemplater):
         uow: IUnitOfWork,
         enquiry_id: int,
         templater_params: TemplaterRequest,
+        workspace: RequestWorkspace | None = None,
     ):
         """Инициализирует генератор справки.
 
@@ -40,10 +202,16 @@ class DocxTemplate(BaseTemplater):
             enquiry_id (int): ID справки для получения шаблонов.
             templater_params (TemplaterRequest): Параметры для фильтрации
                 данных во внешних запросах.
+            workspace (RequestWorkspace | None, optional): Рабочий каталог
+                запроса. Defaults to None.
 
         """
         super().__init__(
-            uow, enquiry_id, templater_params, template_type="docx"
+            uow,
+            enquiry_id,
+            templater_params,
+            template_type="docx",
+            workspace=workspace,
         )
         self._SAMPLE_RESPONSES = {
             "5": [
@@ -117,17 +285,75 @@ class DocxTemplate(BaseTemplater):
         }
 
     def _load_template(self):
-        """Загружает шаблон Word документа."""
-        self.document = Document()
-        self.document.LoadFromFile(self.template_file_path)
+        """Получает копию документа из кэша разобранных шаблонов."""
+        stat = os.stat(self.template_file_path)
+        self.compiled_template = _compile_docx_template(
+            self.template_file_path, stat.st_mtime_ns, stat.st_size
+        )
+        self.document = self.compiled_template.new_document()
+
+    def _paragraph_at(self, location: ParagraphLocation) -> Paragraph:
+        """Возвращает параграф документа по его положению в шаблоне."""
+        section = self.document.Sections.get_Item(location.section)
+        if location.table is None:
+            return section.Body.ChildObjects.get_Item(location.paragraph)
+        cell = (
+            section.Tables.get_Item(location.table)
+            .Rows.get_Item(location.row)
+            .Cells.get_Item(location.cell)
+        )
+        return cell.Paragraphs.get_Item(location.paragraph)
+
+    @property
+    def engine(self) -> str:
+        """Движок формирования справки для текущего шаблона."""
+        settings = get_variables()
+        return settings.DOCX_ENGINE_OVERRIDES.get(
+            self.template_file_path, settings.DOCX_ENGINE
+        )
+
+    def _render(self) -> BinaryIO:
+        """Формирует документ выбранным движком.
+
+        Движок OOXML работает с XML шаблона напрямую. Если он не справился
+        с шаблоном, справка формируется движком Spire.Doc.
+
+        Returns:
+            BinaryIO: Буфер со сгенерированной справкой.
+
+        """
+        if self.engine == "ooxml":
+            try:
+                return OoxmlDocxRenderer(self).render()
+            except Exception as e:
+                GLOBAL_LOGGER.warning(
+                    f"Движок OOXML не сформировал {self.template_file_path},"
+                    f" используется Spire.Doc: {e}"
+                )
+        return super()._render()
+
+    @staticmethod
+    def _read_template_texts(template_file_path: str) -> Iterator[str]:
+        """Возвращает текст XML-частей шаблона без разметки.
 
-    def _save_and_cleanup(self) -> str:
-        """Сохраняет итоговый документ, удаляя вотермарки."""
-        self.document.SaveToFile("tmp.docx", FileFormat.Docx2016)
+        Разметка удаляется, чтобы плейсхолдеры, разбитые Word на несколько
+        фрагментов `<w:r>`, снова стали цельными.
+        """
+        with zipfile.ZipFile(template_file_path) as archive:
+            for name in archive.namelist():
+                if name.startswith("word/") and name.endswith(".xml"):
+                    xml = archive.read(name).decode("utf-8")
+                    yield re.sub(r"<[^>]+>", "", xml)
+
+    def _save_and_cleanup(self) -> BinaryIO:
+        """Сохраняет итоговый документ в буфер, удаляя вотермарки."""
+        stream = Stream()
+        self.document.SaveToStream(stream, FileFormat.Docx2016)
         self.document.Close()
-        self.removing_watermarks("tmp.docx", "final.docx")
-        os.unlink("tmp.docx")
-        return "final.docx"
+        output = self.workspace.spooled_file()
+        self.removing_watermarks(stream.ToArray(), output)
+        output.seek(0)
+        return output
 
     def _add_footer_info(self) -> None:
         """Добавляет нижний колонтитул с датой и временем генерации.
@@ -161,6 +387,29 @@ class DocxTemplate(BaseTemplater):
             # Добавляем новый параграф в начало колонтитула
             footer.Paragraphs.Insert(0, credentials_in_footer)
 
+    @staticmethod
+    def _format_value(value: Union[Decimal, str, int, None]) -> str:
+        """Приводит значение к тексту для вставки в документ.
+
+        `Decimal` выводится с пробелом между разрядами и одним знаком после
+        запятой, остальные значения - через `str`.
+
+        Args:
+            value (Union[Decimal, str, int, None]): Значение для вставки.
+
+        Returns:
+            str: Текст значения.
+
+        """
+        if isinstance(value, Decimal):
+            integer_part = int(value)
+            decimal_part = round((value - integer_part) * 10)
+            if "-" in str(decimal_part):
+                decimal_part = decimal_part * -1
+            formatted_integer = f"{integer_part:,}".replace(",", " ")
+            return f"{formatted_integer},{decimal_part}"
+        return str(value)
+
     def _insert_value_with_formatting(
         self,
         paragraph: Paragraph,
@@ -183,404 +432,279 @@ class DocxTemplate(BaseTemplater):
             None: Объект `paragraph` редактируется напрямую.
 
         """
-        if isinstance(value, Decimal):
-            integer_part = int(value)
-            decimal_part = round((value - integer_part) * 10)
-            if "-" in str(decimal_part):
-                decimal_part = decimal_part * -1
-            formatted_integer = f"{integer_part:,}".replace(",", " ")
-            text_to_insert = f"{formatted_integer},{decimal_part}"
-        else:
-            text_to_insert = str(value)
+        text_to_insert = self._format_value(value)
         paragraph.AppendText(text_to_insert).ApplyCharacterFormat(formatting)
 
-    def process_formatters(self, document: Document) -> None:
-        """Обрабатывает форматоры в документе.
+    def _evaluate_formatter(
+        self,
+        formatter_operations: tuple[str, ...],
+        query_id: int,
+        column_name: str,
+    ) -> Union[Decimal, str]:
+        """Вычисляет значение форматтера `{{OPS;query_id;column_name}}`.
 
-        Функция обрабатывает плейсхолдеры составленные для форматоров.
+        Операции применяются справа налево.
 
         Args:
-            document (Document): Обрабатывающийся документ.
+            formatter_operations (tuple[str, ...]): Операции форматтера.
+            query_id (int): ID запроса с данными.
+            column_name (str): Колонка запроса.
 
         Returns:
-            None: Функция модифицирует объект `document` напрямую.
+            Union[Decimal, str]: Результат или "0", если данных нет.
 
         """
-        pattern_string = r"\{\{([a-zA-Z_][\w;]*);(\d+;[a-zA-Z_]\w*)\}\}"
-        spire_regex = Regex(pattern_string)
-        pattern_compiled = re.compile(pattern_string)
-
-        selections = document.FindAllPattern(spire_regex)
+        current_result = 0.0
 
-        if not selections:
+        if (
+            query_id not in self.query_responses
+            or not self.query_responses[query_id]
+        ):
             GLOBAL_LOGGER.debug(
-                "Плейсхолдеров-форматтеров в docx шаблоне не найдено."
+                f"Предупреждение: нет данных для query_id {query_id}\
+                      для колонки {column_name}"
             )
-            return
+            return "0"
 
-        for selection in list(selections):
-            placeholder_range = selection.GetAsOneRange()
-            placeholder_text = placeholder_range.Text
+        rows = self.query_responses[query_id]
+        for operation in reversed(formatter_operations):
+            operation = operation.strip().upper()
 
-            match = pattern_compiled.search(placeholder_text)
-            if not match:
-                continue
+            if operation == "SUM":
+                current_result = float(rows.column_sum(column_name))
+
+            elif operation == "ROUND":
+                if current_result != 0.0:
+                    current_result = round(current_result)
+                else:
+                    int_values = [
+                        value
+                        for value in rows.column(column_name)
+                        if isinstance(value, int)
+                    ]
+                    if int_values:
+                        current_result = round(int_values[-1])
+
+        return Decimal(str(current_result))
+
+    def _resolve_placeholder(self, placeholder: Placeholder) -> str | None:
+        """Дополняет обработчик плейсхолдеров форматтерами.
+
+        Args:
+            placeholder (Placeholder): Разобранный плейсхолдер.
+
+        Returns:
+            str | None: Значение плейсхолдера или None, если он заменяется
+            на другом этапе.
 
-            operations_str, data_source_str = match.groups()
+        """
+        if isinstance(placeholder, FormatterPlaceholder):
+            return self._format_value(
+                self._evaluate_formatter(
+                    placeholder.operations,
+                    placeholder.query_id,
+                    placeholder.column_name,
+                )
+            )
+        return super()._resolve_placeholder(placeholder)
+
+    def _render_row_cell(
+        self,
+        parsed_text: ParsedText,
+        query_id: int,
+        data_row: Mapping[str, Union[Decimal, str, int]],
+    ) -> str:
+        """Формирует текст ячейки строки-шаблона по строке данных.
+
+        Args:
+            parsed_text (ParsedText): Разобранный текст ячейки шаблона.
+            query_id (int): ID запроса, по которому строится строка.
+            data_row (Mapping[str, Union[Decimal, str, int]]): Строка
+                ответа запроса.
 
-            formatter_operations = operations_str.split(";")
-            query_id_str, column_name = data_source_str.split(";")
-            query_id = int(query_id_str)
+        Returns:
+            str: Текст ячейки со всеми подставленными значениями.
 
-            current_result = 0.0
-            value_to_insert: Union[Decimal, str]
+        """
 
+        def resolve(placeholder: Placeholder) -> str | None:
             if (
-                query_id not in self.query_responses
-                or not self.query_responses[query_id]
+                isinstance(placeholder, BlockPlaceholder)
+                and placeholder.query_id == query_id
             ):
-                GLOBAL_LOGGER.debug(
-                    f"Предупреждение: нет данных для query_id {query_id}\
-                          в плейсхолдере {placeholder_text}"
+                return self._format_value(
+                    data_row.get(placeholder.column_name, "")
                 )
-                value_to_insert = "0"
-            else:
-                for operation in reversed(formatter_operations):
-                    operation = operation.strip().upper()
-
-                    if operation == "SUM":
-                        GLOBAL_LOGGER.debug("Ima kinda useless...")
-
-                    elif operation == "ROUND":
-                        if current_result != 0.0:
-                            current_result = round(current_result)
-                        else:
-                            for dataset in self.query_responses[query_id]:
-                                for key in dataset.keys():
-                                    current_value = dataset[key]
-                                    if key == column_name and isinstance(
-                                        current_value, int
-                                    ):
-                                        current_result = round(current_value)
-
-                value_to_insert = Decimal(str(current_result))
-
-            paragraph = placeholder_range.OwnerParagraph
-            pseudo_formatting = paragraph.ChildObjects.get_Item(
-                0
-            ).CharacterFormat
-            paragraph.ChildObjects.Remove(placeholder_range)
-            self._insert_value_with_formatting(
-                paragraph, value_to_insert, pseudo_formatting
-            )
+            return self._resolve_placeholder(placeholder)
+
+        return parsed_text.render(resolve)
 
-    async def swapping_placeholder_to_value(
-        self, match: Match[str], paragraph: Paragraph, paragraph_text: str
+    def swapping_placeholder_to_value(
+        self, paragraph: Paragraph, updated_value: str
     ) -> None:
-        """Заменяет плейсхолдер значением.
+        """Заменяет текст параграфа текстом с подставленными значениями.
 
         Args:
-            match (re.match): _description_.
-            paragraph (Paragraph): _description_.
-            paragraph_text (str): _description_.
+            paragraph (Paragraph): Параграф с плейсхолдерами.
+            updated_value (str): Новый текст параграфа.
 
         Returns:
-            None: _description_.
+            None: Объект `paragraph` редактируется напрямую.
 
         """
-        # Получаем значение из наших данных
-        value_to_insert = await self._placeholder_replacer(match)
         # Получение форматирования ячейки и замена текста внутри
         formatting = paragraph.ChildObjects.get_Item(0).CharacterFormat
-        updated_value = paragraph_text.replace(match.group(0), value_to_insert)
         paragraph.ChildObjects.Clear()
         text_range = paragraph.AppendText(updated_value)
         text_range.ApplyCharacterFormat(formatting)
 
-    async def _replace_single_placeholders(self) -> None:
+    def _replace_single_placeholders(self) -> None:
         """Заменяет одиночные плейсхолдеры в параграфах документа.
 
-        Функция итерируется по параграфам найденным с помощью `spire_regex`
-        и заменяет найденные плейсхолдеры, формата
-        `{{query_id:response_index;column_name}}`. Найденные плейсхолдеры
-        заменяются на соответствующие данные из `self.query_responses`
+        Функция проходит по параграфам с плейсхолдерами, найденным при
+        разборе шаблона, и заменяет все плейсхолдеры, формата
+        `{{query_id:response_index;column_name}}`, `{{field}}` и
+        форматтеры `{{OPS;query_id;column_name}}`. Плейсхолдеры заменяются
+        на соответствующие данные из `self.query_responses`
 
         Args:
-            document (Document): Обрабатывающийся документ.
+            No arguments.
 
         Returns:
-            None: Функция обрабатывает объект `document` напрямую.
+            None: Функция обрабатывает объект `self.document` напрямую.
 
         """
-        # Паттерн для поиска одиночных плейсхолдеров: {{id:index;column}}
-        # Spire.Doc позволяет искать по всему документу
-        # с помощью регулярных выражений
+        for location in self.compiled_template.paragraphs:
+            paragraph = self._paragraph_at(location)
+            paragraph_text = paragraph.Text
 
-        for section_index in range(self.document.Sections.Count):
-            section = self.document.Sections.get_Item(section_index)
-
-            for paragraph_index in range(section.Body.ChildObjects.Count):
-                paragraph = section.Body.ChildObjects.get_Item(paragraph_index)
-                if not isinstance(paragraph, Paragraph):
-                    continue
-
-                paragraph_text = paragraph.Text
-
-                if "{{" not in paragraph_text:
-                    continue
-
-                match = self.combined_pattern.search(paragraph_text)
-                if match:
-                    await self.swapping_placeholder_to_value(
-                        match, paragraph, paragraph_text
-                    )
-
-            for table_index in range(section.Tables.Count):
-                table = section.Tables.get_Item(table_index)
-
-                for row_index in range(table.Rows.Count - 1, -1, -1):
-                    row = table.Rows.get_Item(row_index)
-
-                    for cell_index in range(row.Cells.Count):
-                        cell = row.Cells.get_Item(cell_index)
-
-                        if cell.Paragraphs.Count > 0:
-                            for paragraph_index in range(
-                                cell.Paragraphs.Count
-                            ):
-                                paragraph = cell.Paragraphs.get_Item(
-                                    paragraph_index
-                                )
-                                paragraph_text = paragraph.Text
-
-                                match = self.combined_pattern.search(
-                                    paragraph_text
-                                )
-                                if match:
-                                    await self.swapping_placeholder_to_value(
-                                        match, paragraph, paragraph_text
-                                    )
+            updated_value = self._render_placeholders(paragraph_text)
+            if updated_value != paragraph_text:
+                self.swapping_placeholder_to_value(paragraph, updated_value)
 
     def _process_dynamic_tables(self) -> None:
         """Обрабатывает (динамические) блоки документа.
 
-        Функция итерируется по секциям, затем по таблицам и , в заключение,
-        по рядам, ищет плейсхолдеры, формата
-        `{{query_id:response_index;column_name}}`. Найденные плейсхолдеры
-        заменяются на соответствующие данные из `self.query_responses` либо
-        строка с отсутствующими данными удаляется.
+        Функция проходит по строкам-шаблонам таблиц, найденным при разборе
+        шаблона, с конца каждой таблицы. Плейсхолдеры строк, формата
+        `{{query_id;column_name}}`, заменяются на соответствующие данные из
+        `self.query_responses` либо строка с отсутствующими данными
+        удаляется.
 
         Args:
-            document (Document): Обрабатываемый документ.
+            No arguments.
 
         Returns:
-            None: Функция модифицирует объект `document` напрямую.
+            None: Функция модифицирует объект `self.document` напрямую.
 
         """
-        for section_index in range(self.document.Sections.Count):
-            section = self.document.Sections.get_Item(section_index)
-
-            for table_index in range(section.Tables.Count):
-                table = section.Tables.get_Item(table_index)
-
-                for row_index in range(table.Rows.Count - 1, -1, -1):
-                    row = table.Rows.get_Item(row_index)
-
-                    row_text_parts = []
-                    for cell_index in range(row.Cells.Count):
-                        cell = row.Cells.get_Item(cell_index)
-
-                        if cell.Paragraphs.Count > 0:
-                            paragraph = cell.Paragraphs.get_Item(0)
-                            row_text_parts.append(paragraph.Text)
+        for repeat_row in self.compiled_template.repeat_rows:
+            row_index = repeat_row.row
+            table = (
+                self.document.Sections.get_Item(repeat_row.section)
+                .Tables.get_Item(repeat_row.table)
+            )
+            row = table.Rows.get_Item(row_index)
+            GLOBAL_LOGGER.debug(
+                f"В docx шаблоне найдена строка-шаблон в таблице\
+                    {repeat_row.table} на строке {row_index}..."
+            )
 
-                    row_text = "".join(row_text_parts)
+            placeholders_in_row = repeat_row.placeholders
+            query_id_for_this_row = repeat_row.query_id
 
-                    if re.search(r"\{\{\d+;.+?\}\}", row_text):
-                        GLOBAL_LOGGER.debug(
-                            f"В docx шаблоне найдена строка-шаблон в таблице\
-                                {table_index} на строке {row_index}..."
-                        )
+            if (
+                not query_id_for_this_row
+                or query_id_for_this_row not in self.query_responses
+            ):
+                table.Rows.RemoveAt(row_index)
+                GLOBAL_LOGGER.debug(
+                    f"  -> Данных нет, строка-шаблон {row_index}\
+                        удалена."
+                )
+                continue
 
-                        placeholders_in_row = {}
-                        query_id_for_this_row = None
-
-                        for cell_index in range(row.Cells.Count):
-                            cell = row.Cells.get_Item(cell_index)
-                            if cell.Paragraphs.Count > 0:
-                                cell_text = cell.Paragraphs.get_Item(0).Text
-                                match = re.search(
-                                    r"\{\{(\d+);(.+?)\}\}", cell_text
-                                )
-                                if match:
-                                    query_id_str, column_name = match.groups()
-                                    query_id_for_this_row = int(query_id_str)
-                                    placeholders_in_row[cell_index] = (
-                                        query_id_for_this_row,
-                                        column_name,
-                                    )
-
-                        if (
-                            not query_id_for_this_row
-                            or query_id_for_this_row
-                            not in self.query_responses
+            data_to_insert = self.query_responses[query_id_for_this_row]
+
+            if len(data_to_insert) == 1:
+                last_data_row = data_to_insert[-1]
+                for cell_index, parsed_text in placeholders_in_row.items():
+                    cell = row.Cells.get_Item(cell_index)
+                    paragraph = cell.Paragraphs.get_Item(0)
+                    if paragraph.ChildObjects.Count > 0 and isinstance(
+                        paragraph.ChildObjects.get_Item(0),
+                        TextRange,
+                    ):
+                        first_text_range = paragraph.ChildObjects.get_Item(0)
+                        template_formatting = first_text_range.CharacterFormat
+                    paragraph.ChildObjects.Clear()
+                    text_to_append = self._render_row_cell(
+                        parsed_text, query_id_for_this_row, last_data_row
+                    )
+                    self._insert_value_with_formatting(
+                        paragraph,
+                        text_to_append,
+                        template_formatting,
+                    )
+            else:
+                for i in range(len(data_to_insert) - 1, -1, -1):
+                    data_row = data_to_insert[i]
+                    new_row = row.Clone()
+
+                    for cell_index, parsed_text in placeholders_in_row.items():
+                        cell = new_row.Cells.get_Item(cell_index)
+                        paragraph = cell.Paragraphs.get_Item(0)
+                        if paragraph.ChildObjects.Count > 0 and isinstance(
+                            paragraph.ChildObjects.get_Item(0),
+                            TextRange,
                         ):
-                            table.Rows.RemoveAt(row_index)
-                            GLOBAL_LOGGER.debug(
-                                f"  -> Данных нет, строка-шаблон {row_index}\
-                                    удалена."
+                            first_text_range = (
+                                paragraph.ChildObjects.get_Item(0)
                             )
-                            continue
-
-                        data_to_insert = self.query_responses[
-                            query_id_for_this_row
-                        ]
-
-                        if len(data_to_insert) == 1:
-                            last_data_row = data_to_insert[-1]
-                            for cell_index, (
-                                query_id,
-                                column_name,
-                            ) in placeholders_in_row.items():
-                                cell = row.Cells.get_Item(cell_index)
-                                paragraph = cell.Paragraphs.get_Item(0)
-                                if (
-                                    paragraph.ChildObjects.Count > 0
-                                    and isinstance(
-                                        paragraph.ChildObjects.get_Item(0),
-                                        TextRange,
-                                    )
-                                ):
-                                    first_text_range = (
-                                        paragraph.ChildObjects.get_Item(0)
-                                    )
-                                    template_formatting = (
-                                        first_text_range.CharacterFormat
-                                    )
-                                paragraph.ChildObjects.Clear()
-                                text_to_append = last_data_row.get(
-                                    column_name, ""
-                                )
-                                self._insert_value_with_formatting(
-                                    paragraph,
-                                    text_to_append,
-                                    template_formatting,
-                                )
-                        else:
-                            for i in range(len(data_to_insert) - 1, -1, -1):
-                                data_row = data_to_insert[i]
-                                new_row = row.Clone()
-
-                                for cell_index, (
-                                    query_id,
-                                    column_name,
-                                ) in placeholders_in_row.items():
-                                    cell = new_row.Cells.get_Item(cell_index)
-                                    paragraph = cell.Paragraphs.get_Item(0)
-                                    if (
-                                        paragraph.ChildObjects.Count > 0
-                                        and isinstance(
-                                            paragraph.ChildObjects.get_Item(0),
-                                            TextRange,
-                                        )
-                                    ):
-                                        first_text_range = (
-                                            paragraph.ChildObjects.get_Item(0)
-                                        )
-                                        template_formatting = (
-                                            first_text_range.CharacterFormat
-                                        )
-                                    paragraph.ChildObjects.Clear()
-                                    text_to_append = data_row.get(
-                                        column_name, ""
-                                    )
-                                    self._insert_value_with_formatting(
-                                        paragraph,
-                                        text_to_append,
-                                        template_formatting,
-                                    )
-
-                                table.Rows.Insert(row_index, new_row)
-                            template_row_new_index = row_index + len(
-                                data_to_insert
+                            template_formatting = (
+                                first_text_range.CharacterFormat
                             )
-                            table.Rows.RemoveAt(template_row_new_index)
+                        paragraph.ChildObjects.Clear()
+                        text_to_append = self._render_row_cell(
+                            parsed_text, query_id_for_this_row, data_row
+                        )
+                        self._insert_value_with_formatting(
+                            paragraph,
+                            text_to_append,
+                            template_formatting,
+                        )
+
+                    table.Rows.Insert(row_index, new_row)
+                template_row_new_index = row_index + len(data_to_insert)
+                table.Rows.RemoveAt(template_row_new_index)
 
     def removing_watermarks(
-        self, file_to_cleanse: str, cleaned_file_path: str
+        self, document_bytes: bytes, output: BinaryIO
     ) -> None:
         """Удаляет водяной знак, оставленную триальной версией библиотеки.
 
-        Ищет и удаляет параграф с водяным знаком `spire.doc` из документа
-        `file_to_cleanse`, после сохраняет полученный документ как
-        `cleaned_file_path` и удаляет директорию с промежуточными файлами,
-        созданными в предыдущих функциях.
+        Архив переписывается за один проход в памяти: параграф с водяным
+        знаком `spire.doc` удаляется только из основной части документа и
+        колонтитулов, остальные части копируются без повторного сжатия.
 
         Args:
-            file_to_cleanse (str): Обрабатываемый файл.
-            cleaned_file_path (str): Очищенный от вотермарки файл.
+            document_bytes (bytes): Документ, сохраненный `SaveToStream`.
+            output (BinaryIO): Буфер для очищенного документа.
 
         Returns:
-            None: Создает новый файл по пути `cleaned_file_path`
-        без водяного знака.
+            None: Записывает в `output` документ без водяного знака.
 
         """
-        GLOBAL_LOGGER.debug(
-            f"Применяем метод 'грубой силы' (XML)\
-                  к файлу {file_to_cleanse}..."
-        )
-
-        watermark_text = (
-            '<w:p><w:r><w:rPr><w:color w:val="FF0000" /><w:sz w:'
-            'val="24" /></w:rPr><w:t xml:space="preserve">Evaluation Warning: '
-            "The document was created with Spire.Doc"
-            " for Python.</w:t></w:r></w:p>"
+        changed = rewrite_zip(
+            document_bytes,
+            output,
+            WATERMARK_PARTS_PATTERN,
+            lambda name, content: content.replace(WATERMARK_XML, b""),
         )
-
-        temp_dir = "temp_docx_unpacked"
-
-        with zipfile.ZipFile(file_to_cleanse, "r") as zip_ref:
-            zip_ref.extractall(temp_dir)
-
-        xml_changed = False
-        for dirpath, _, filenames in os.walk(temp_dir):
-            for filename in filenames:
-                if filename.endswith(".xml"):
-                    xml_path = os.path.join(dirpath, filename)
-
-                    with open(xml_path, "r", encoding="utf-8") as f:
-                        content = f.read()
-
-                    if watermark_text in content:
-                        GLOBAL_LOGGER.debug(
-                            f"Найден водяной знак в файле: {filename}"
-                        )
-                        new_content = content.replace(
-                            watermark_text,
-                            "",
-                        )
-
-                        with open(xml_path, "w", encoding="utf-8") as f:
-                            f.write(new_content)
-                        xml_changed = True
-
-        if not xml_changed:
+        if changed:
+            GLOBAL_LOGGER.debug(f"Водяной знак удален из частей: {changed}")
+        else:
             GLOBAL_LOGGER.debug(
                 "Водяной знак не найден на уровне XML. Возможно,"
                 " он является изображением."
             )
-            shutil.copy(file_to_cleanse, cleaned_file_path)
-            shutil.rmtree(temp_dir)
-            return
-
-        with zipfile.ZipFile(
-            cleaned_file_path, "w", zipfile.ZIP_DEFLATED
-        ) as zip_out:
-            for dirpath, _, filenames in os.walk(temp_dir):
-                for filename in filenames:
-                    file_path = os.path.join(dirpath, filename)
-                    arcname = os.path.relpath(file_path, temp_dir)
-                    zip_out.write(file_path, arcname)
-
-        shutil.rmtree(temp_dir)
-        GLOBAL_LOGGER.debug(f"Очищенный файл сохранен как {cleaned_file_path}")
@@ -1,13 +1,15 @@
-import os
 import shutil
-import subprocess
+from typing import BinaryIO
 
 from schemas.templater import TemplaterRequest
+from services.pdf_converter import PDF_CONVERTER_POOL
 from services.templaterDocx import DocxTemplate
 from services.templaterXlsx import TemplaterXlsx
 from utils.logger import GLOBAL_LOGGER
+from utils.render_executor import RENDER_EXECUTOR
 from utils.unitofwork import IUnitOfWork
 from utils.utils import ExternalQueryExecutor
+from utils.workspace import RequestWorkspace
 
 
 class PdfCreation:
@@ -18,6 +20,7 @@ class PdfCreation:
         uow: IUnitOfWork,
         enquiry_id: int,
         templater_params: TemplaterRequest,
+        workspace: RequestWorkspace | None = None,
     ):
         """Инициилизирует генератор справки.
 
@@ -26,16 +29,23 @@ class PdfCreation:
             enquiry_id (int): ID запроса для получения шаблонов.
             templater_params (TemplaterRequest): Параметры для фильтрации
                 данных во внешних запросах.
+            workspace (RequestWorkspace | None, optional): Рабочий каталог
+                запроса. Defaults to None - создается новый.
 
         """
         self.uow = uow
         self.enquiry_id = enquiry_id
         self.templater_params = templater_params
-        self.docx_templater = DocxTemplate(uow, enquiry_id, templater_params)
-        self.xlsx_templater = TemplaterXlsx(uow, enquiry_id, templater_params)
+        self.workspace = workspace or RequestWorkspace()
+        self.docx_templater = DocxTemplate(
+            uow, enquiry_id, templater_params, workspace=self.workspace
+        )
+        self.xlsx_templater = TemplaterXlsx(
+            uow, enquiry_id, templater_params, workspace=self.workspace
+        )
         self.query_executor = ExternalQueryExecutor()
 
-    async def pdf_creation(self) -> str:
+    async def pdf_creation(self) -> BinaryIO:
         """Конвертирует файл в PDF с помощью Воли Небес.
 
         Основная функция генерации справки в формате `.pdf`,
@@ -46,7 +56,9 @@ class PdfCreation:
             No arguments.
 
         Returns:
-            str: Путь к сгенерированной справке.
+            BinaryIO: Открытый PDF-файл в `self.workspace` или буфер с PDF
+            из кэша справок. LibreOffice работает только с файлами,
+            поэтому PDF проходит через диск.
         """
         # async with self.uow:
         #     theTypes = await self.query_executor.getTemplateTypes
@@ -59,36 +71,45 @@ class PdfCreation:
         #     path_to_file = await self.docx_templater.
         # generate_report_from_template()
         # else:
-        path_to_file = await self.docx_templater.generate_report_from_template(
-            is_pdf=True
-        )
         # path_to_file1 = (
         #     await self.xlsx_templater.generate_report_from_template()
         # )
-        os.makedirs("pdfOlder", exist_ok=True)
-        full_path = os.path.join(os.getcwd(), path_to_file)
-        destination_path = os.path.join("pdfOlder", path_to_file)
-        shutil.move(full_path, destination_path)
-        pdf_output_path = os.path.splitext(destination_path)[0] + ".pdf"
-        pdf_output_dir = os.path.dirname(destination_path)
-
-        command = "soffice" if os.name != "nt" else "soffice.exe"
-        args = [
-            command,
-            "--headless",
-            "--convert-to",
-            "pdf",
-            "--outdir",
-            pdf_output_dir,
-            destination_path,
-        ]
-
-        conversion = subprocess.run(
-            args, check=True, timeout=120, capture_output=True, text=True
+        # Конвертация выполняется внутри шаблонизатора, чтобы в кэш
+        # справок попадал уже PDF
+        return await self.docx_templater.generate_report_from_template(
+            is_pdf=True, convert=self.convert_report
         )
-        GLOBAL_LOGGER.debug("STDOUT:", conversion.stdout)
-        if conversion.stderr:
-            GLOBAL_LOGGER.error("STDERR:", conversion.stderr)
+
+    async def convert_report(
+        self, report: BinaryIO, workspace: RequestWorkspace | None = None
+    ) -> BinaryIO:
+        """Конвертирует сформированную справку `.docx` в `.pdf`.
+
+        Args:
+            report (BinaryIO): Буфер со справкой `.docx` по шаблону для
+                `.pdf`. Закрывается после записи на диск.
+            workspace (RequestWorkspace | None, optional): Рабочий каталог
+                конвертации. Defaults to `self.workspace`.
+
+        Returns:
+            BinaryIO: Открытый PDF-файл в рабочем каталоге.
+
+        """
+        workspace = workspace or self.workspace
+        try:
+            docx_path = workspace.file("final.docx")
+            await RENDER_EXECUTOR.run(self._dump_report, report, docx_path)
+            pdf_output_path = await PDF_CONVERTER_POOL.convert(
+                docx_path, workspace.path
+            )
+        except BaseException:
+            workspace.cleanup()
+            raise
 
         GLOBAL_LOGGER.debug(f"Файл успешно сконвертирован: {pdf_output_path}")
-        return pdf_output_path
+        return open(pdf_output_path, "rb")
+
+    @staticmethod
+    def _dump_report(report: BinaryIO, path: str) -> None:
+        with report, open(path, "wb") as file:
+            shutil.copyfileobj(report, file)
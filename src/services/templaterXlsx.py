@@ -1,22 +1,124 @@
-import re
+import os
+import pickle
 from copy import copy
+from dataclasses import dataclass
 from datetime import datetime
-from typing import Any, Dict, List, Union
+from functools import lru_cache
+from typing import (
+    Any,
+    BinaryIO,
+    Dict,
+    Iterator,
+    Mapping,
+    Sequence,
+    Union,
+)
 
 import openpyxl
 from openpyxl.cell import MergedCell
-from openpyxl.styles.fonts import Font
+from openpyxl.styles.cell_style import StyleArray
 from openpyxl.utils import get_column_letter
 from openpyxl.worksheet.header_footer import HeaderFooterItem
 from openpyxl.worksheet.merge import MergedCellRange
 
+from loaded_env import get_variables
 from schemas.templater import TemplaterRequest
+from services.xlsx_streaming import XlsxStreamWriter, is_streamable
 from utils.logger import GLOBAL_LOGGER
+from utils.placeholders import (
+    BlockPlaceholder,
+    ParsedText,
+    Placeholder,
+    parse_placeholders,
+)
 from utils.unitofwork import IUnitOfWork
+from utils.workspace import RequestWorkspace
 
 from .base_templater import BaseTemplater
 
 
+@dataclass(frozen=True)
+class CompiledXlsxTemplate:
+    """Разобранный шаблон, не зависящий от данных запроса.
+
+    Attributes:
+        workbook_pickle (bytes): Нетронутая книга шаблона. Распаковка из
+            pickle в несколько раз быстрее повторного разбора XML.
+        placeholder_cells (tuple[tuple[int, int], ...]): Координаты ячеек
+            активного листа, содержащих плейсхолдеры.
+        block_matches (dict[int, list[tuple[BlockPlaceholder, ...]]]):
+            Плейсхолдеры блоков по номеру строки, по одному кортежу на
+            ячейку.
+        row_styles (dict[int, dict]): Высота и StyleArray ячеек строк до
+            последней строки с блоком включительно.
+        streamable (bool): Шаблон поддерживает потоковую запись.
+
+    """
+
+    workbook_pickle: bytes
+    placeholder_cells: tuple[tuple[int, int], ...]
+    block_matches: dict[int, list[tuple[BlockPlaceholder, ...]]]
+    row_styles: dict[int, dict]
+    streamable: bool
+
+    def new_workbook(self) -> openpyxl.Workbook:
+        """Возвращает независимую копию книги шаблона."""
+        book = pickle.loads(self.workbook_pickle)
+        # DimensionHolder - наследник defaultdict и теряет default_factory
+        # при распаковке
+        for sheet in book.worksheets:
+            sheet.row_dimensions.default_factory = sheet._add_row
+            sheet.column_dimensions.default_factory = sheet._add_column
+        return book
+
+
+@lru_cache(maxsize=32)
+def _compile_xlsx_template(
+    template_file_path: str, mtime_ns: int, size: int
+) -> CompiledXlsxTemplate:
+    """Разбирает шаблон один раз на версию файла.
+
+    Результат кэшируется по пути, времени изменения и размеру файла.
+    """
+    book = openpyxl.load_workbook(template_file_path)
+    sheet = book.active
+    placeholder_cells = []
+    block_matches: dict[int, list[tuple[BlockPlaceholder, ...]]] = {}
+    for row in sheet.iter_rows():
+        for cell in row:
+            if not isinstance(cell.value, str):
+                continue
+            parsed = parse_placeholders(cell.value)
+            if parsed.placeholders:
+                placeholder_cells.append((cell.row, cell.column))
+            block_match = parsed.blocks()
+            if block_match:
+                block_matches.setdefault(cell.row, []).append(
+                    tuple(block_match)
+                )
+
+    row_styles = {}
+    for row_index in range(1, max(block_matches, default=0) + 1):
+        # get не создает пустые размеры строк в нетронутой книге
+        row_dimension = sheet.row_dimensions.get(row_index)
+        row_styles[row_index] = {
+            "height": row_dimension.height if row_dimension else None,
+            # Индексы стилей в таблицах книги совпадают у всех копий
+            # шаблона, поэтому ячейкам достаточно копии StyleArray
+            "cells": [
+                {"style": copy(cell._style)} for cell in sheet[row_index]
+            ],
+        }
+
+    return CompiledXlsxTemplate(
+        workbook_pickle=pickle.dumps(book, pickle.HIGHEST_PROTOCOL),
+        placeholder_cells=tuple(placeholder_cells),
+        block_matches=block_matches,
+        row_styles=row_styles,
+        streamable=is_streamable(book, block_matches),
+    )
+
+
 class TemplaterXlsx(BaseTemplater):
     """Класс для автоматической генерации справки по формату ".xlsx" ."""
 
@@ -25,6 +127,7 @@ class TemplaterXlsx(BaseTemplater):
         uow: IUnitOfWork,
         enquiry_id: int,
         templater_params: TemplaterRequest,
+        workspace: RequestWorkspace | None = None,
     ):
         """Инициализирует генератор справки.
 
@@ -33,17 +136,152 @@ class TemplaterXlsx(BaseTemplater):
             enquiry_id (int): ID справки для получения шаблонов.
             templater_params (TemplaterRequest): Параметры для фильтрации
                 данных во внешних запросах.
+            workspace (RequestWorkspace | None, optional): Рабочий каталог
+                запроса. Defaults to None.
 
         """
         super().__init__(
-            uow, enquiry_id, templater_params, template_type="xlsx"
+            uow,
+            enquiry_id,
+            templater_params,
+            template_type="xlsx",
+            workspace=workspace,
+        )
+
+    def _get_compiled_template(self) -> CompiledXlsxTemplate:
+        """Возвращает разобранный шаблон из кэша."""
+        stat = os.stat(self.template_file_path)
+        return _compile_xlsx_template(
+            self.template_file_path, stat.st_mtime_ns, stat.st_size
         )
-        self.outputFile = "final.xlsx"
 
     def _load_template(self):
-        self.book = openpyxl.load_workbook(self.template_file_path)
+        """Получает копию книги из кэша разобранных шаблонов."""
+        self.compiled_template = self._get_compiled_template()
+        self.book = self.compiled_template.new_workbook()
         self.sheet = self.book.active
 
+    def _render(self) -> BinaryIO:
+        """Формирует книгу обычным или потоковым способом.
+
+        Потоковая запись используется, если шаблон ее поддерживает, а
+        строки блоков дают не меньше `XLSX_STREAMING_MIN_ROWS` строк.
+
+        Returns:
+            BinaryIO: Буфер со сгенерированной справкой.
+
+        """
+        compiled_template = self._get_compiled_template()
+        streaming_min_rows = get_variables().XLSX_STREAMING_MIN_ROWS
+        if (
+            not compiled_template.streamable
+            or self._block_rows_count(compiled_template) < streaming_min_rows
+        ):
+            return super()._render()
+
+        self._load_template()
+        self._replace_single_placeholders()
+        self._add_footer_info()
+        return XlsxStreamWriter(self).render()
+
+    def _block_rows_count(
+        self, compiled_template: CompiledXlsxTemplate
+    ) -> int:
+        """Оценивает число строк, которые дадут строки блоков."""
+        rows_count = 0
+        for block_matches in compiled_template.block_matches.values():
+            rows_count += max(
+                (
+                    len(self.query_responses[placeholder.query_id])
+                    for block_match in block_matches
+                    for placeholder in block_match
+                    if placeholder.query_id in self.query_responses
+                ),
+                default=0,
+            )
+        return rows_count
+
+    def _render_block_cell(
+        self,
+        parsed_text: ParsedText,
+        query_id: int,
+        data_item: Mapping[str, Any],
+    ) -> Any:
+        """Формирует значение ячейки строки блока по строке данных.
+
+        Ячейка из одного плейсхолдера получает значение колонки как есть,
+        в остальных подставляются все плейсхолдеры запроса `query_id`.
+
+        Args:
+            parsed_text (ParsedText): Разобранный текст шаблонной ячейки.
+            query_id (int): ID запроса, по которому строится блок.
+            data_item (Mapping[str, Any]): Строка ответа запроса.
+
+        Returns:
+            Any: Значение для записи в ячейку.
+
+        """
+        single = parsed_text.single
+        if isinstance(single, BlockPlaceholder):
+            return self._block_cell_value(
+                data_item.get(single.column_name, "")
+            )
+
+        def resolve(placeholder: Placeholder) -> str | None:
+            if (
+                isinstance(placeholder, BlockPlaceholder)
+                and placeholder.query_id == query_id
+            ):
+                return str(
+                    self._block_cell_value(
+                        data_item.get(placeholder.column_name, "")
+                    )
+                )
+            return None
+
+        return parsed_text.render(resolve)
+
+    @staticmethod
+    def _block_cell_value(value: Any) -> Any:
+        """Приводит значение ответа запроса к значению ячейки блока.
+
+        Строки вставляются как есть, остальные значения - числом, если их
+        текст разбирается как `int` или `float`, иначе текстом. `None`
+        заменяется пустой строкой.
+
+        Args:
+            value (Any): Значение колонки ответа запроса.
+
+        Returns:
+            Any: Значение для записи в ячейку.
+
+        """
+        if value is None:
+            return ""
+        if isinstance(value, str):
+            return value
+        text = str(value)
+        try:
+            return int(text)
+        except ValueError:
+            try:
+                return float(text)
+            except ValueError:
+                return text
+
+    @staticmethod
+    def _read_template_texts(template_file_path: str) -> Iterator[str]:
+        """Возвращает строковые значения всех ячеек шаблона."""
+        book = openpyxl.load_workbook(template_file_path, read_only=True)
+        try:
+            for sheet in book.worksheets:
+                for row in sheet.iter_rows(values_only=True):
+                    for value in row:
+                        if isinstance(value, str):
+                            yield value
+        finally:
+            book.close()
+
     _SAMPLE_RESPONSES = {
         "5": [
             {"inn": 777777, "chinases": "МБОУ СОШ 13579"},
@@ -135,12 +373,13 @@ class TemplaterXlsx(BaseTemplater):
         footer.right.size = 9
         footer.right.font = "Times New Roman"
 
-    async def _replace_single_placeholders(self) -> None:
+    def _replace_single_placeholders(self) -> None:
         """Замещает одиночные плейсхолдеры в ячейках листа.
 
-        Фунция итерируется по ячейкам листа и ищет плейсхолдеры, формата
-        `{{query_id:response_index;column_name}}`. Найденные плейсхолдеры
-        заменяются на соответствующие данные из `self.query_responses`.
+        Фунция проходит по ячейкам с плейсхолдерами, найденным при разборе
+        шаблона, и заменяет все плейсхолдеры формата
+        `{{query_id:response_index;column_name}}` и `{{field}}` на
+        соответствующие данные из `self.query_responses` и полей ввода.
 
         Args:
             No arguments.
@@ -148,15 +387,13 @@ class TemplaterXlsx(BaseTemplater):
         Returns:
             None: Функция модифицирует объект `self.sheet` напрямую.
         """
-        for row in self.sheet.iter_rows():
-            for cell in row:
-                if cell.value and isinstance(cell.value, str):
-                    match = self.combined_pattern.search(cell.value)
-                    if match:
-                        updated_value = await self._placeholder_replacer(match)
-                        cell.value = cell.value.replace(
-                            match.group(0), updated_value
-                        )
+        placeholder_cells = self.compiled_template.placeholder_cells
+        for row_index, column_index in placeholder_cells:
+            cell = self.sheet.cell(row=row_index, column=column_index)
+            if cell.value and isinstance(cell.value, str):
+                updated_value = self._render_placeholders(cell.value)
+                if updated_value != cell.value:
+                    cell.value = updated_value
 
     def _process_dynamic_tables(self) -> None:
         """Заполняет лист данными.
@@ -236,17 +473,19 @@ class TemplaterXlsx(BaseTemplater):
                             cell.row
                         ].height = row_layouts[cell.row]["layout"]["height"]
 
-    def _save_and_cleanup(self) -> str:
-        """Сохраняет итоговый файл."""
-        self.book.save(self.outputFile)
-        GLOBAL_LOGGER.info(f"File saved to: {self.outputFile}")
-        return self.outputFile
+    def _save_and_cleanup(self) -> BinaryIO:
+        """Сохраняет итоговую книгу в буфер."""
+        output = self.workspace.spooled_file()
+        self.book.save(output)
+        output.seek(0)
+        GLOBAL_LOGGER.info("Итоговая книга сформирована")
+        return output
 
     def process_data_block(
         self,
         cell: openpyxl.cell.cell.Cell,
         row_layouts: dict,
-        data_block: List[Dict[str, Any]],
+        data_block: Sequence[Mapping[str, Any]],
         query_id: int,
     ) -> None:
         """Обрабатывает блок таблицы данными.
@@ -281,11 +520,9 @@ class TemplaterXlsx(BaseTemplater):
                 new_cell = self.sheet.cell(
                     row=target_row_index, column=column_index
                 )
-                new_cell.font = copy(cell_properties["font"])
-                new_cell.border = copy(cell_properties["border"])
-                new_cell.fill = copy(cell_properties["fill"])
-                new_cell.number_format = cell_properties["number_format"]
-                new_cell.alignment = copy(cell_properties["alignment"])
+                # Копия StyleArray - девять индексов, объекты стилей не
+                # создаются и не ищутся заново в таблицах книги
+                new_cell._style = copy(cell_properties["style"])
 
                 placeholder_text = cell_properties["value"]
 
@@ -294,33 +531,15 @@ class TemplaterXlsx(BaseTemplater):
                     and isinstance(placeholder_text, str)
                     and not isinstance(new_cell, MergedCell)
                 ):
-                    placeholder_match = re.findall(
-                        r"\{\{(\d+);(\w+)\}\}", placeholder_text
-                    )
+                    parsed_text = cell_properties["placeholders"]
+                    placeholder_match = parsed_text.blocks()
                     if (
                         placeholder_match
-                        and int(placeholder_match[0][0]) == query_id
+                        and placeholder_match[0].query_id == query_id
                     ):
-                        value_to_insert = data_item.get(
-                            placeholder_match[0][1], ""
+                        new_cell.value = self._render_block_cell(
+                            parsed_text, query_id, data_item
                         )
-                        if isinstance(value_to_insert, str):
-                            placeholder_text = placeholder_text.replace(
-                                placeholder_text, value_to_insert
-                            )
-                        else:
-                            placeholder_text = placeholder_text.replace(
-                                placeholder_text, str(value_to_insert)
-                            )
-                            try:
-                                placeholder_text = int(placeholder_text)
-                            except ValueError:
-                                try:
-                                    placeholder_text = float(placeholder_text)
-                                except ValueError:
-                                    pass
-
-                        new_cell.value = placeholder_text
                     elif not placeholder_match and not isinstance(
                         new_cell, MergedCell
                     ):
@@ -350,22 +569,25 @@ class TemplaterXlsx(BaseTemplater):
             форматировании ряда.
 
         """
+        row_style = self.compiled_template.row_styles[row_index]
         row_properties = {
-            "height": self.sheet.row_dimensions[row_index].height,
+            "height": row_style["height"],
             "cells": [],
             "merges": [],
         }
 
-        # Получаем свойства клетки
-        for cell in self.sheet[row_index]:
+        # Стили клеток берутся из разобранного шаблона, значения - из листа
+        for cell, cell_style in zip(
+            self.sheet[row_index], row_style["cells"]
+        ):
+            value = cell.value
             row_properties["cells"].append(
                 {
-                    "value": cell.value,
-                    "font": copy(cell.font),
-                    "border": copy(cell.border),
-                    "fill": copy(cell.fill),
-                    "number_format": cell.number_format,
-                    "alignment": copy(cell.alignment),
+                    "value": value,
+                    "placeholders": parse_placeholders(
+                        value if isinstance(value, str) else ""
+                    ),
+                    **cell_style,
                 }
             )
 
@@ -379,8 +601,9 @@ class TemplaterXlsx(BaseTemplater):
     def collect_layout(self) -> dict:
         """Собирает форматирвание листа.
 
-        Функция итерируется по листу и собирает информацию о высоте, стилях
-        и прочих параметрах ячеек. Сбор форматирования собирается вокруг
+        Функция проходит по строкам с плейсхолдерами блоков, найденным при
+        разборе шаблона, и собирает информацию о высоте, стилях и прочих
+        параметрах ячеек. Сбор форматирования собирается вокруг
         плейсхолдеров блоков - `{{query_id;column_name}}`.
 
         Args:
@@ -390,14 +613,15 @@ class TemplaterXlsx(BaseTemplater):
            dict: Словарь с информацией о форматировании строк,
           индексированный по номеру строки в итоговом документе.
         """
-        block_pattern = r"\{\{(\d+);(\w+)\}\}"
-        formatter_pattern = r"\{\{([a-zA-Z_][\w;]*);(\d+;[a-zA-Z_]\w*)\}\}"
         row_offset = 0
         row_layouts: dict[
             int,
             dict[
                 str,
-                dict[str, int | list[MergedCellRange | dict[str, str | Font]]]
+                dict[
+                    str,
+                    int | list[MergedCellRange | dict[str, str | StyleArray]],
+                ]
                 | list[str]
                 | int,
             ],
@@ -405,138 +629,86 @@ class TemplaterXlsx(BaseTemplater):
         rows_to_delete = list()
         all_block_matches = list()
         last_placeholder_row_index = 0
-        for row in self.sheet.iter_rows():
-            for cell in row:
-                if cell.value and isinstance(cell.value, str):
-                    block_match = re.findall(block_pattern, cell.value)
-                    # formatter_match = re.findall(formatter_pattern, cell.value)
-
-                    # if formatter_match:
-                    #     current_result = 0
-                    #     formatter_operations =
-                    #     formatter_match[0][0].split(";")
-                    #     response_idx, response_key = formatter_match[0][
-                    #         1
-                    #     ].split(";")
-                    #     for operation_name in reversed(formatter_operations):
-                    #         operation_name = operation_name.lower()
-                    #         match operation_name:
-                    #             case "sum":
-                    #                 for values in self.query_responses[
-                    #                     int(response_idx)
-                    #                 ]:
-                    #                     current_result +=
-                    #     values[response_key]
-                    #             case "round":
-                    #                 if not current_result:
-                    #                     for values in self.query_responses[
-                    #                         int(response_idx)
-                    #                     ]:
-                    #                         current_result = round(
-                    #                             values[response_key]
-                    #                         )
-                    #                 else:
-                    #                     current_result =
-                    #      round(current_result)
-                    #             case "SEPNUM":
-                    #                 pass
-                    #     cell.value = current_result
-
-                    if block_match:
-                        all_block_matches.append(block_match)
-                        if (
-                            int(block_match[0][0]) not in self.query_responses
-                            and (cell.row, cell.row + row_offset)
-                            not in rows_to_delete
-                        ):
-                            rows_to_delete.append(
-                                (cell.row, cell.row + row_offset)
-                            )
-                        if last_placeholder_row_index and (
-                            cell.row - last_placeholder_row_index != 1
-                        ):
-                            for header_row in self.sheet.iter_rows(
-                                min_row=last_placeholder_row_index + 1,
-                                max_row=cell.row - 1,
-                            ):
-                                if not row_layouts.get(
-                                    header_row[0].row + row_offset
-                                ):
-                                    row_layouts[
-                                        header_row[0].row + row_offset
-                                    ] = {
-                                        "layout": self.capture_row_layout(
-                                            header_row[0].row
-                                        )
-                                    }
-                        for query_id_str, placeholder_key in block_match:
-                            if not row_layouts.get(cell.row + row_offset):
-                                row_layouts[cell.row + row_offset] = dict()
-                                row_layouts[cell.row + row_offset][
-                                    "layout"
-                                ] = self.capture_row_layout(cell.row)
-                            if not row_layouts[cell.row + row_offset].get(
-                                query_id_str
-                            ):
-                                row_layouts[cell.row + row_offset][
-                                    query_id_str
-                                ] = list()
-                            layout_value = row_layouts[cell.row + row_offset][
-                                query_id_str
-                            ]
-                            if isinstance(
-                                layout_value,
-                                list,
-                            ):
-                                layout_value.append(placeholder_key)
-
-                if cell.column == len(row) and row_layouts.get(
-                    cell.row + row_offset
+        for row_index in sorted(self.compiled_template.block_matches):
+            for block_match in self.compiled_template.block_matches[row_index]:
+                all_block_matches.append(block_match)
+                if (
+                    block_match[0].query_id not in self.query_responses
+                    and (row_index, row_index + row_offset)
+                    not in rows_to_delete
                 ):
-                    last_placeholder_row_index = cell.row
-                    requests_used = len(
-                        [
-                            key
-                            for key in row_layouts[cell.row + row_offset]
-                            if key.isdigit()
-                            and int(key) in self.query_responses
-                        ]
-                    )
-                    rows_to_insert = 0
-                    if requests_used > 1:
-                        max_rows = 0
-                        for key in row_layouts[cell.row + row_offset]:
-                            if (
-                                key.isdigit()
-                                and int(key) in self.query_responses
-                            ):
-                                if max_rows:
-                                    if (
-                                        len(self.query_responses[int(key)])
-                                        > max_rows
-                                    ):
-                                        max_rows = len(
-                                            self.query_responses[int(key)]
-                                        )
-                                else:
+                    rows_to_delete.append((row_index, row_index + row_offset))
+                if last_placeholder_row_index and (
+                    row_index - last_placeholder_row_index != 1
+                ):
+                    for header_row_index in range(
+                        last_placeholder_row_index + 1, row_index
+                    ):
+                        if not row_layouts.get(header_row_index + row_offset):
+                            row_layouts[header_row_index + row_offset] = {
+                                "layout": self.capture_row_layout(
+                                    header_row_index
+                                )
+                            }
+                for placeholder in block_match:
+                    query_id_str = str(placeholder.query_id)
+                    placeholder_key = placeholder.column_name
+                    if not row_layouts.get(row_index + row_offset):
+                        row_layouts[row_index + row_offset] = dict()
+                        row_layouts[row_index + row_offset]["layout"] = (
+                            self.capture_row_layout(row_index)
+                        )
+                    if not row_layouts[row_index + row_offset].get(
+                        query_id_str
+                    ):
+                        row_layouts[row_index + row_offset][
+                            query_id_str
+                        ] = list()
+                    layout_value = row_layouts[row_index + row_offset][
+                        query_id_str
+                    ]
+                    if isinstance(
+                        layout_value,
+                        list,
+                    ):
+                        layout_value.append(placeholder_key)
+
+            if row_layouts.get(row_index + row_offset):
+                last_placeholder_row_index = row_index
+                requests_used = len(
+                    [
+                        key
+                        for key in row_layouts[row_index + row_offset]
+                        if key.isdigit() and int(key) in self.query_responses
+                    ]
+                )
+                rows_to_insert = 0
+                if requests_used > 1:
+                    max_rows = 0
+                    for key in row_layouts[row_index + row_offset]:
+                        if key.isdigit() and int(key) in self.query_responses:
+                            if max_rows:
+                                if (
+                                    len(self.query_responses[int(key)])
+                                    > max_rows
+                                ):
                                     max_rows = len(
                                         self.query_responses[int(key)]
                                     )
-                        rows_to_insert = max_rows - 1
-                        row_offset += rows_to_insert
-                    else:
-                        for key in row_layouts[cell.row + row_offset]:
-                            if (
-                                key.isdigit()
-                                and int(key) in self.query_responses
-                            ):
-                                rows_to_insert = (
-                                    len(self.query_responses[int(key)]) - 1
-                                )
-                                row_offset += rows_to_insert
-                    row_layouts[list(row_layouts.keys())[-1]]["moveRange"] = (
-                        rows_to_insert
-                    )
+                            else:
+                                max_rows = len(self.query_responses[int(key)])
+                    rows_to_insert = max_rows - 1
+                    row_offset += rows_to_insert
+                else:
+                    for key in row_layouts[row_index + row_offset]:
+                        if key.isdigit() and int(key) in self.query_responses:
+                            rows_to_insert = (
+                                len(self.query_responses[int(key)]) - 1
+                            )
+                            row_offset += rows_to_insert
+                row_layouts[list(row_layouts.keys())[-1]]["moveRange"] = (
+                    rows_to_insert
+                )
 
         for template_row_num, final_row_num in reversed(rows_to_delete):
             for merged in list(self.sheet.merged_cells.ranges):
@@ -0,0 +1,320 @@
+from collections import defaultdict
+from copy import copy
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    BinaryIO,
+    Collection,
+    Iterator,
+    Sequence,
+)
+
+from openpyxl import Workbook
+from openpyxl.cell import Cell, MergedCell, WriteOnlyCell
+from openpyxl.worksheet._writer import ALL_TEMP_FILES, WorksheetWriter
+from openpyxl.worksheet.cell_range import CellRange
+from openpyxl.worksheet.worksheet import Worksheet
+
+from utils.logger import GLOBAL_LOGGER
+from utils.placeholders import (
+    BlockPlaceholder,
+    ParsedText,
+    parse_placeholders,
+)
+
+if TYPE_CHECKING:
+    from services.templaterXlsx import TemplaterXlsx
+
+# Таблицы стилей книги, на которые ссылаются индексы StyleArray ячеек
+SHARED_STYLE_ATTRIBUTES = (
+    "_fonts",
+    "_borders",
+    "_fills",
+    "_alignments",
+    "_protections",
+    "_number_formats",
+    "_date_formats",
+    "_timedelta_formats",
+    "_cell_styles",
+    "_named_styles",
+    "_differential_styles",
+    "_table_styles",
+    "_colors",
+    "loaded_theme",
+    "epoch",
+)
+# Настройки листа, переносимые без изменений
+SHEET_SETTINGS_ATTRIBUTES = (
+    "sheet_properties",
+    "sheet_format",
+    "views",
+    "protection",
+    "page_setup",
+    "print_options",
+    "page_margins",
+    "HeaderFooter",
+    "row_breaks",
+    "col_breaks",
+    "_print_rows",
+    "_print_cols",
+    "_print_area",
+)
+
+
+def is_streamable(book: Workbook, block_rows: Collection[int]) -> bool:
+    """Проверяет, может ли шаблон формироваться потоковой записью.
+
+    Потоковая запись переносит только ячейки, объединения и настройки
+    активного листа. Шаблоны с другими листами, рисунками, таблицами,
+    условным форматированием, проверкой данных, гиперссылками или
+    комментариями формируются обычным способом. Так же формируются
+    шаблоны с объединениями в несколько строк, начинающимися в строке
+    блока: их копии для соседних итоговых строк пересекались бы.
+
+    Args:
+        book (Workbook): Книга шаблона.
+        block_rows (Collection[int]): Номера строк шаблона с блоками.
+
+    Returns:
+        bool: True, если шаблон поддерживается.
+
+    """
+    if len(book._sheets) != 1:
+        return False
+    sheet = book.active
+    return not (
+        sheet._images
+        or sheet._charts
+        or sheet._tables
+        or sheet.conditional_formatting
+        or sheet.data_validations.dataValidation
+        or sheet._hyperlinks
+        or sheet.auto_filter.ref
+        or sheet.legacy_drawing is not None
+        or any(cell.comment for cell in sheet._cells.values())
+        or any(
+            merged.min_row in block_rows and merged.max_row > merged.min_row
+            for merged in sheet.merged_cells.ranges
+        )
+    )
+
+
+class XlsxStreamWriter:
+    """Потоковое формирование справки `.xlsx` по разобранному шаблону.
+
+    Строки шаблона выводятся по порядку в книгу `write_only`: строки
+    блоков разворачиваются по данным сразу на своем итоговом месте, без
+    сдвига диапазонов. Ячейки получают StyleArray шаблонных ячеек по
+    ссылке, таблицы стилей книги шаблона используются напрямую.
+    """
+
+    def __init__(self, templater: "TemplaterXlsx"):
+        self.templater = templater
+        self.sheet: Worksheet = templater.sheet
+        self.block_matches = templater.compiled_template.block_matches
+        self.query_responses = templater.query_responses
+        # Первая итоговая строка и число итоговых строк по строке шаблона
+        self.row_starts: dict[int, int] = {}
+        self.row_counts: dict[int, int] = {}
+
+    def render(self) -> BinaryIO:
+        """Записывает справку в буфер рабочего каталога.
+
+        Returns:
+            BinaryIO: Буфер со сгенерированной справкой, установленный на
+            начало.
+
+        """
+        book = Workbook(write_only=True)
+        for attribute in SHARED_STYLE_ATTRIBUTES:
+            setattr(book, attribute, getattr(self.templater.book, attribute))
+        target = book.create_sheet(self.sheet.title)
+        for attribute in SHEET_SETTINGS_ATTRIBUTES:
+            setattr(target, attribute, getattr(self.sheet, attribute))
+        for key, dimension in self.sheet.column_dimensions.items():
+            target.column_dimensions[key] = dimension
+
+        # Разметка листа пишется во временный файл рабочего каталога,
+        # openpyxl удаляет его после сохранения книги
+        sheet_path = self.templater.workspace.file("sheet.xml")
+        ALL_TEMP_FILES.append(sheet_path)
+        target._writer = WorksheetWriter(target, out=sheet_path)
+        target._writer.write_top()
+
+        self._write_rows(target)
+        self._add_merges(target)
+
+        output = self.templater.workspace.spooled_file()
+        book.save(output)
+        output.seek(0)
+        GLOBAL_LOGGER.info(
+            f"Итоговая книга сформирована потоково, строк: "
+            f"{sum(self.row_counts.values())}"
+        )
+        return output
+
+    def _write_rows(self, target) -> None:
+        cells_by_row: dict[int, list] = defaultdict(list)
+        for (row_index, _), cell in sorted(self.sheet._cells.items()):
+            cells_by_row[row_index].append(cell)
+        last_row = max(
+            [self.sheet.max_row, *self.sheet.row_dimensions.keys()]
+        )
+
+        output_row = 1
+        for row_index in range(1, last_row + 1):
+            cells = cells_by_row.get(row_index, [])
+            dimension = self.sheet.row_dimensions.get(row_index)
+            if row_index in self.block_matches:
+                rows = self._block_rows(target, row_index, cells)
+            else:
+                rows = iter(
+                    [
+                        [
+                            self._new_cell(target, cell, cell.value)
+                            for cell in cells
+                        ]
+                    ]
+                )
+
+            self.row_starts[row_index] = output_row
+            for row in rows:
+                if dimension is not None:
+                    row_dimension = copy(dimension)
+                    row_dimension.index = output_row
+                    target.row_dimensions[output_row] = row_dimension
+                target.append(self._dense_row(row))
+                # Строка уже записана, ее размеры больше не нужны
+                target.row_dimensions.pop(output_row, None)
+                output_row += 1
+            self.row_counts[row_index] = output_row - self.row_starts[
+                row_index
+            ]
+
+    def _block_rows(
+        self, target, row_index: int, cells: list
+    ) -> Iterator[list[Cell]]:
+        """Разворачивает строку блока по данным запросов.
+
+        Строка удаляется, если для плейсхолдера ячейки нет ответа запроса
+        или ответы пусты. Иначе выводится столько строк, сколько строк в
+        самом длинном ответе, как и при обычном формировании.
+        """
+        block_matches = self.block_matches[row_index]
+        if any(
+            block_match[0].query_id not in self.query_responses
+            for block_match in block_matches
+        ):
+            return
+        row_count = max(
+            len(self.query_responses[placeholder.query_id])
+            for block_match in block_matches
+            for placeholder in block_match
+            if placeholder.query_id in self.query_responses
+        )
+
+        # Для ячейки из одного плейсхолдера запоминается колонка ответа
+        # запроса, для ячейки с текстом - ее разбор и ответ запроса
+        columns: list[
+            tuple[Any, ParsedText | None, int | None, Sequence]
+        ] = []
+        for cell in cells:
+            parsed_text = (
+                parse_placeholders(cell.value)
+                if isinstance(cell.value, str)
+                else None
+            )
+            block_match = parsed_text.blocks() if parsed_text else []
+            if not block_match or isinstance(cell, MergedCell):
+                columns.append((cell, None, None, ()))
+                continue
+            query_id = block_match[0].query_id
+            query_rows = self.query_responses[query_id]
+            single = parsed_text.single
+            if isinstance(single, BlockPlaceholder):
+                column_values = query_rows.column(single.column_name)
+                columns.append((cell, None, query_id, column_values))
+            else:
+                columns.append((cell, parsed_text, query_id, query_rows))
+
+        for data_index in range(row_count):
+            row = []
+            for cell, parsed_text, query_id, source in columns:
+                if query_id is None:
+                    value = (
+                        cell.value
+                        if data_index == 0 or isinstance(cell.value, str)
+                        else None
+                    )
+                elif data_index >= len(source):
+                    value = None
+                elif parsed_text is None:
+                    value = self.templater._block_cell_value(
+                        source[data_index]
+                    )
+                else:
+                    value = self.templater._render_block_cell(
+                        parsed_text, query_id, source[data_index]
+                    )
+                row.append(self._new_cell(target, cell, value))
+            yield row
+
+    def _add_merges(self, target) -> None:
+        """Переносит объединения ячеек на итоговые строки.
+
+        Объединения, начинающиеся в строке блока, повторяются для каждой
+        выведенной строки. Остальные растягиваются на итоговые строки
+        своих первой и последней строк шаблона.
+
+        Объединения шаблона не пересекаются, а объединения строк блока
+        занимают одну строку (см. `is_streamable`), поэтому итоговые
+        объединения тоже не пересекаются.
+        """
+        ranges = target.merged_cells.ranges
+        for merged in self.sheet.merged_cells.ranges:
+            start = self.row_starts[merged.min_row]
+            if merged.min_row in self.block_matches:
+                for offset in range(self.row_counts[merged.min_row]):
+                    ranges.add(
+                        CellRange(
+                            min_col=merged.min_col,
+                            min_row=start + offset,
+                            max_col=merged.max_col,
+                            max_row=start + offset,
+                        )
+                    )
+                continue
+            end = (
+                self.row_starts[merged.max_row]
+                + self.row_counts[merged.max_row]
+                - 1
+            )
+            if end >= start:
+                ranges.add(
+                    CellRange(
+                        min_col=merged.min_col,
+                        min_row=start,
+                        max_col=merged.max_col,
+                        max_row=end,
+                    )
+                )
+
+    @staticmethod
+    def _new_cell(target, cell, value: Any) -> Cell:
+        """Создает ячейку со стилем шаблонной ячейки по ссылке."""
+        new_cell = WriteOnlyCell(target)
+        new_cell._style = cell._style
+        new_cell.column = cell.column
+        if not isinstance(cell, MergedCell):
+            new_cell.value = value
+        return new_cell
+
+    @staticmethod
+    def _dense_row(row: list[Cell]) -> list[Cell | None]:
+        """Расставляет ячейки по номерам колонок для `append`."""
+        dense: list[Cell | None] = [None] * (
+            row[-1].column if row else 0
+        )
+        for cell in row:
+            dense[cell.column - 1] = cell
+        return dense
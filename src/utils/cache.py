@@ -0,0 +1,78 @@
+import threading
+import time
+from typing import Any, Callable, Dict, Hashable, Tuple
+
+from loaded_env import get_variables
+
+
+class TTLCache:
+    """Потокобезопасный кэш с ограничением времени жизни записей."""
+
+    def __init__(self, ttl: float):
+        """Инициализирует кэш.
+
+        Args:
+            ttl (float): Время жизни записи по умолчанию в секундах.
+
+        """
+        self.ttl = ttl
+        self._entries: Dict[Hashable, Tuple[float, Any]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Any | None:
+        """Возвращает значение по ключу или None, если его нет или оно
+        устарело."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl: float | None = None) -> None:
+        """Сохраняет значение с временем жизни `ttl` или значением
+        по умолчанию."""
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+
+    def invalidate(self, key: Hashable) -> None:
+        """Удаляет запись по ключу."""
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def invalidate_where(self, predicate: Callable[[Hashable], bool]) -> None:
+        """Удаляет все записи, ключи которых удовлетворяют `predicate`."""
+        with self._lock:
+            for key in [key for key in self._entries if predicate(key)]:
+                del self._entries[key]
+
+    def invalidate_values_where(
+        self, predicate: Callable[[Any], bool]
+    ) -> None:
+        """Удаляет все записи, значения которых удовлетворяют `predicate`."""
+        with self._lock:
+            for key in [
+                key
+                for key, (_, value) in self._entries.items()
+                if predicate(value)
+            ]:
+                del self._entries[key]
+
+    def clear(self) -> None:
+        """Очищает кэш."""
+        with self._lock:
+            self._entries.clear()
+
+
+# Отраженные представления внешних БД, ключ - (database_id, view_name)
+VIEW_METADATA_CACHE = TTLCache(ttl=get_variables().VIEW_METADATA_CACHE_TTL)
+
+# Планы формирования справок, ключ - enquiry_id
+RENDER_PLAN_CACHE = TTLCache(ttl=get_variables().RENDER_PLAN_CACHE_TTL)
+
+# Ответы `get_templates_info`, ключ - enquiry_id
+TEMPLATES_INFO_CACHE = TTLCache(ttl=get_variables().TEMPLATES_INFO_CACHE_TTL)
@@ -0,0 +1,373 @@
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, BinaryIO, Dict, List
+
+from exceptions import ArtefactTooLargeError
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+# Статусы, после которых задача больше не выполняется
+FINISHED_STATUSES = (JOB_DONE, JOB_FAILED)
+
+
+class ReportJobStore:
+    """Состояние задач формирования справок в локальной базе SQLite.
+
+    База не зависит от внешних сервисов, поэтому задачи переживают
+    перезапуск процесса. Базу могут разделять несколько процессов:
+    выполняемая задача арендована процессом-владельцем, который продлевает
+    аренду, и выполняется заново только после ее истечения. База
+    открывается методом `open`. Все методы блокирующие и потокобезопасные.
+    """
+
+    def __init__(self, path: str, lease: float):
+        """Инициализирует хранилище без открытия базы.
+
+        Args:
+            path (str): Путь к файлу базы или `:memory:`.
+            lease (float): Срок аренды выполняемой задачи в секундах.
+
+        """
+        self.path = path
+        self.lease = lease
+        # PID может повториться после перезапуска, поэтому владелец
+        # дополнительно отличается случайным суффиксом
+        self.owner = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._lock = threading.Lock()
+        self._connection: sqlite3.Connection | None = None
+
+    def open(self) -> None:
+        """Открывает базу и создает таблицу задач, если база закрыта."""
+        with self._lock:
+            if self._connection is not None:
+                return
+            if self.path != ":memory:":
+                os.makedirs(
+                    os.path.dirname(os.path.abspath(self.path)), exist_ok=True
+                )
+            self._connection = sqlite3.connect(
+                self.path, check_same_thread=False, isolation_level=None
+            )
+            self._connection.row_factory = sqlite3.Row
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS report_jobs (
+                    id TEXT PRIMARY KEY,
+                    enquiry_id INTEGER NOT NULL,
+                    format TEXT NOT NULL,
+                    params TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    error TEXT,
+                    size INTEGER,
+                    created_at REAL NOT NULL,
+                    started_at REAL,
+                    finished_at REAL,
+                    owner TEXT,
+                    heartbeat_at REAL
+                )
+                """
+            )
+            columns = {
+                row["name"]
+                for row in self._connection.execute(
+                    "PRAGMA table_info(report_jobs)"
+                )
+            }
+            for column, column_type in (
+                ("owner", "TEXT"),
+                ("heartbeat_at", "REAL"),
+            ):
+                if column not in columns:
+                    self._connection.execute(
+                        f"ALTER TABLE report_jobs "
+                        f"ADD COLUMN {column} {column_type}"
+                    )
+
+    def create(
+        self, enquiry_id: int, report_format: str, params: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        """Создает задачу в статусе `queued`.
+
+        Args:
+            enquiry_id (int): ID справки.
+            report_format (str): Формат справки.
+            params (Dict[str, Any]): Параметры `TemplaterRequest`.
+
+        Returns:
+            Dict[str, Any]: Созданная задача.
+
+        """
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            self._connection.execute(
+                "INSERT INTO report_jobs "
+                "(id, enquiry_id, format, params, status, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    job_id,
+                    enquiry_id,
+                    report_format,
+                    json.dumps(params, ensure_ascii=False),
+                    JOB_QUEUED,
+                    time.time(),
+                ),
+            )
+        return self.get(job_id)
+
+    def get(self, job_id: str) -> Dict[str, Any] | None:
+        """Возвращает задачу по ID или None, если ее нет."""
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT * FROM report_jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        return dict(row) if row is not None else None
+
+    def mark_running(self, job_id: str) -> bool:
+        """Переводит задачу из очереди в работу и арендует ее.
+
+        Returns:
+            bool: False, если задача уже не в очереди.
+
+        """
+        now = time.time()
+        with self._lock:
+            cursor = self._connection.execute(
+                "UPDATE report_jobs "
+                "SET status = ?, started_at = ?, owner = ?, heartbeat_at = ? "
+                "WHERE id = ? AND status = ?",
+                (JOB_RUNNING, now, self.owner, now, job_id, JOB_QUEUED),
+            )
+        return cursor.rowcount == 1
+
+    def heartbeat(self, job_ids: List[str]) -> None:
+        """Продлевает аренду задач, выполняемых этим процессом."""
+        with self._lock:
+            self._connection.executemany(
+                "UPDATE report_jobs SET heartbeat_at = ? "
+                "WHERE id = ? AND status = ? AND owner = ?",
+                [
+                    (time.time(), job_id, JOB_RUNNING, self.owner)
+                    for job_id in job_ids
+                ],
+            )
+
+    def mark_done(self, job_id: str, size: int) -> None:
+        """Отмечает задачу выполненной, `size` - размер справки в байтах."""
+        self._finish(job_id, JOB_DONE, None, size)
+
+    def mark_failed(self, job_id: str, error: str) -> None:
+        """Отмечает задачу завершенной с ошибкой `error`."""
+        self._finish(job_id, JOB_FAILED, error, None)
+
+    def _finish(
+        self, job_id: str, status: str, error: str | None, size: int | None
+    ) -> None:
+        # Задачу, аренду которой перехватил другой процесс, завершает он
+        with self._lock:
+            self._connection.execute(
+                "UPDATE report_jobs "
+                "SET status = ?, error = ?, size = ?, finished_at = ? "
+                "WHERE id = ? AND status = ? AND owner = ?",
+                (
+                    status,
+                    error,
+                    size,
+                    time.time(),
+                    job_id,
+                    JOB_RUNNING,
+                    self.owner,
+                ),
+            )
+
+    def requeue_expired(self) -> List[str]:
+        """Возвращает в очередь задачи с истекшей арендой.
+
+        Аренда истекает, если процесс-владелец остановлен или завис и не
+        продлевал ее дольше `lease` секунд.
+
+        Returns:
+            List[str]: ID возвращенных в очередь задач.
+
+        """
+        with self._lock:
+            self._connection.execute("BEGIN IMMEDIATE")
+            try:
+                rows = self._connection.execute(
+                    "SELECT id FROM report_jobs "
+                    "WHERE status = ? "
+                    "AND (heartbeat_at IS NULL OR heartbeat_at < ?) "
+                    "ORDER BY created_at",
+                    (JOB_RUNNING, time.time() - self.lease),
+                ).fetchall()
+                self._connection.executemany(
+                    "UPDATE report_jobs SET status = ?, started_at = NULL, "
+                    "owner = NULL, heartbeat_at = NULL WHERE id = ?",
+                    [(JOB_QUEUED, row["id"]) for row in rows],
+                )
+            except BaseException:
+                self._connection.execute("ROLLBACK")
+                raise
+            self._connection.execute("COMMIT")
+        return [row["id"] for row in rows]
+
+    def list_queued(self) -> List[str]:
+        """Возвращает ID задач в очереди в порядке создания."""
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT id FROM report_jobs WHERE status = ? "
+                "ORDER BY created_at",
+                (JOB_QUEUED,),
+            ).fetchall()
+        return [row["id"] for row in rows]
+
+    def purge(self, finished_before: float) -> int:
+        """Удаляет задачи, завершенные раньше `finished_before`.
+
+        Returns:
+            int: Число удаленных задач.
+
+        """
+        with self._lock:
+            cursor = self._connection.execute(
+                "DELETE FROM report_jobs WHERE finished_at < ?",
+                (finished_before,),
+            )
+        return cursor.rowcount
+
+    def close(self) -> None:
+        """Закрывает соединение с базой, если она открыта."""
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+
+class ArtefactStore:
+    """Готовые справки задач на диске, один файл на задачу.
+
+    Файл хранится не дольше `ttl` секунд, а общий объем хранилища не
+    превышает `max_bytes`: при переполнении удаляются самые старые файлы.
+    """
+
+    def __init__(self, directory: str, max_bytes: int, ttl: float):
+        """Создает каталог хранилища.
+
+        Args:
+            directory (str): Каталог для файлов справок.
+            max_bytes (int): Максимальный общий объем файлов.
+            ttl (float): Время хранения файла в секундах.
+
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, job_id: str) -> str:
+        # ID приходит из URL, поэтому в путь попадают только hex-символы
+        if not job_id.isalnum():
+            raise ValueError(f"Некорректный ID задачи: {job_id}")
+        return os.path.join(self.directory, job_id)
+
+    def put(self, job_id: str, report: BinaryIO) -> int:
+        """Сохраняет справку задачи.
+
+        Args:
+            job_id (str): ID задачи.
+            report (BinaryIO): Буфер со справкой, установленный на начало.
+
+        Returns:
+            int: Размер сохраненной справки в байтах.
+
+        Raises:
+            ArtefactTooLargeError: Справка больше всего хранилища.
+
+        """
+        path = self._path(job_id)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as file:
+            shutil.copyfileobj(report, file)
+            size = file.tell()
+        if size > self.max_bytes:
+            self._remove(tmp_path)
+            raise ArtefactTooLargeError(
+                f"Справка {size} Б больше хранилища {self.max_bytes} Б"
+            )
+        os.replace(tmp_path, path)
+        self.sweep(keep=job_id)
+        return size
+
+    def open(self, job_id: str) -> BinaryIO | None:
+        """Открывает справку задачи на чтение.
+
+        Returns:
+            BinaryIO | None: Открытый файл или None, если справки нет или
+            срок ее хранения истек.
+
+        """
+        path = self._path(job_id)
+        try:
+            file = open(path, "rb")
+        except FileNotFoundError:
+            return None
+        if os.fstat(file.fileno()).st_mtime + self.ttl < time.time():
+            file.close()
+            self._remove(path)
+            return None
+        return file
+
+    def sweep(self, keep: str | None = None) -> int:
+        """Удаляет устаревшие справки и освобождает место до `max_bytes`.
+
+        Args:
+            keep (str | None, optional): ID задачи, справку которой нельзя
+                вытеснять. Defaults to None.
+
+        Returns:
+            int: Число удаленных файлов.
+
+        """
+        deadline = time.time() - self.ttl
+        removed = 0
+        with self._lock:
+            entries = []
+            with os.scandir(self.directory) as scanned:
+                for entry in scanned:
+                    if not entry.name.isalnum():
+                        continue
+                    try:
+                        stat = entry.stat()
+                    except FileNotFoundError:
+                        continue
+                    if stat.st_mtime < deadline:
+                        self._remove(entry.path)
+                        removed += 1
+                    else:
+                        entries.append((stat.st_mtime, stat.st_size, entry))
+
+            used_bytes = sum(size for _, size, _ in entries)
+            for _, size, entry in sorted(entries, key=lambda item: item[0]):
+                if used_bytes <= self.max_bytes:
+                    break
+                if entry.name == keep:
+                    continue
+                self._remove(entry.path)
+                used_bytes -= size
+                removed += 1
+        return removed
+
+    @staticmethod
+    def _remove(path: str) -> None:
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
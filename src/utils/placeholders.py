@@ -0,0 +1,184 @@
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Callable, Iterator
+
+# Все виды плейсхолдеров шаблонов справок в одном выражении:
+# {{query_id:row_index;column}} | {{query_id;column}} |
+# {{OPS;query_id;column}} | {{field}}
+PLACEHOLDER_PATTERN = re.compile(
+    r"\{\{(?:"
+    r"(?P<value_query>\d+):(?P<row_index>\d+);(?P<value_column>\w+)"
+    r"|(?P<block_query>\d+);(?P<block_column>\w+)"
+    r"|(?P<operations>[a-zA-Z_][\w;]*);"
+    r"(?P<formatter_query>\d+);(?P<formatter_column>[a-zA-Z_]\w*)"
+    r"|(?P<field_name>\w+)"
+    r")\}\}"
+)
+
+
+@dataclass(frozen=True)
+class Placeholder:
+    """Плейсхолдер шаблона.
+
+    Attributes:
+        source (str): Исходный текст плейсхолдера вместе со скобками.
+
+    """
+
+    source: str
+
+
+@dataclass(frozen=True)
+class ValuePlaceholder(Placeholder):
+    """Одиночное значение ответа запроса: `{{query_id:row_index;column}}`."""
+
+    query_id: int
+    row_index: int
+    column_name: str
+
+
+@dataclass(frozen=True)
+class BlockPlaceholder(Placeholder):
+    """Колонка строки блока, размножаемой по данным: `{{query_id;column}}`."""
+
+    query_id: int
+    column_name: str
+
+
+@dataclass(frozen=True)
+class FormatterPlaceholder(Placeholder):
+    """Вычисляемое значение колонки: `{{OPS;query_id;column}}`.
+
+    Attributes:
+        operations (tuple[str, ...]): Операции в порядке записи, применяются
+            справа налево.
+
+    """
+
+    operations: tuple[str, ...]
+    query_id: int
+    column_name: str
+
+
+@dataclass(frozen=True)
+class FieldPlaceholder(Placeholder):
+    """Поле ввода пользователя: `{{field}}`."""
+
+    field_name: str
+
+
+@dataclass(frozen=True)
+class ParsedText:
+    """Текст шаблона, разобранный на литералы и плейсхолдеры.
+
+    Attributes:
+        parts (tuple[str | Placeholder, ...]): Части текста по порядку.
+        placeholders (tuple[Placeholder, ...]): Только плейсхолдеры.
+
+    """
+
+    parts: tuple[str | Placeholder, ...]
+    placeholders: tuple[Placeholder, ...]
+
+    @property
+    def single(self) -> Placeholder | None:
+        """Плейсхолдер, если текст состоит только из него."""
+        if len(self.parts) == 1 and self.placeholders:
+            return self.placeholders[0]
+        return None
+
+    def blocks(self) -> list[BlockPlaceholder]:
+        """Возвращает плейсхолдеры блоков текста."""
+        return [
+            placeholder
+            for placeholder in self.placeholders
+            if isinstance(placeholder, BlockPlaceholder)
+        ]
+
+    def render(self, resolve: Callable[[Placeholder], str | None]) -> str:
+        """Собирает текст, подставляя значения всех плейсхолдеров.
+
+        Args:
+            resolve (Callable[[Placeholder], str | None]): Возвращает
+                значение плейсхолдера или None, если его надо оставить как
+                есть.
+
+        Returns:
+            str: Текст с подставленными значениями.
+
+        """
+        chunks = []
+        for part in self.parts:
+            if isinstance(part, Placeholder):
+                value = resolve(part)
+                chunks.append(part.source if value is None else value)
+            else:
+                chunks.append(part)
+        return "".join(chunks)
+
+
+def _placeholder_from_match(match: re.Match) -> Placeholder:
+    source = match.group(0)
+    if match.group("value_query"):
+        return ValuePlaceholder(
+            source,
+            int(match.group("value_query")),
+            int(match.group("row_index")),
+            match.group("value_column"),
+        )
+    if match.group("block_query"):
+        return BlockPlaceholder(
+            source,
+            int(match.group("block_query")),
+            match.group("block_column"),
+        )
+    if match.group("operations"):
+        return FormatterPlaceholder(
+            source,
+            tuple(match.group("operations").split(";")),
+            int(match.group("formatter_query")),
+            match.group("formatter_column"),
+        )
+    return FieldPlaceholder(source, match.group("field_name"))
+
+
+def iter_placeholders(text: str) -> Iterator[Placeholder]:
+    """Перечисляет плейсхолдеры текста без кэширования.
+
+    Подходит для больших текстов, например всего содержимого шаблона.
+    """
+    for match in PLACEHOLDER_PATTERN.finditer(text):
+        yield _placeholder_from_match(match)
+
+
+@lru_cache(maxsize=8192)
+def parse_placeholders(text: str) -> ParsedText:
+    """Разбирает текст ячейки или параграфа шаблона за один проход.
+
+    Результат кэшируется по тексту: строки шаблона повторяются от справки
+    к справке.
+
+    Args:
+        text (str): Текст шаблона.
+
+    Returns:
+        ParsedText: Литералы и плейсхолдеры текста.
+
+    """
+    if "{{" not in text:
+        return ParsedText((text,) if text else (), ())
+
+    parts: list[str | Placeholder] = []
+    placeholders = []
+    position = 0
+    for match in PLACEHOLDER_PATTERN.finditer(text):
+        if match.start() > position:
+            parts.append(text[position : match.start()])
+        placeholder = _placeholder_from_match(match)
+        parts.append(placeholder)
+        placeholders.append(placeholder)
+        position = match.end()
+    if position < len(text):
+        parts.append(text[position:])
+    return ParsedText(tuple(parts), tuple(placeholders))
@@ -0,0 +1,103 @@
+from collections.abc import Mapping, Sequence
+from decimal import Decimal
+from typing import Any, Iterable, Iterator, List, Tuple, overload
+
+RowValue = str | int | Decimal
+
+
+class RowView(Mapping):
+    """Строка `QueryRows` с интерфейсом словаря только для чтения.
+
+    Значения `None` возвращаются как пустая строка.
+    """
+
+    __slots__ = ("_rows", "_position")
+
+    def __init__(self, rows: "QueryRows", position: int) -> None:
+        self._rows = rows
+        self._position = position
+
+    def __getitem__(self, key: str) -> RowValue:
+        value = self._rows._data[self._rows._index[key]][self._position]
+        return "" if value is None else value
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._rows.columns)
+
+    def __len__(self) -> int:
+        return len(self._rows.columns)
+
+    def __repr__(self) -> str:
+        return f"RowView({dict(self)!r})"
+
+
+class QueryRows(Sequence):
+    """Результат запроса к внешнему представлению.
+
+    Данные хранятся по колонкам: общий индекс имен колонок и по одному
+    списку значений на колонку. Строки доступны через `RowView`, а
+    колонки целиком - через `column` для форматтеров.
+    """
+
+    __slots__ = ("columns", "_index", "_data")
+
+    def __init__(
+        self, columns: Iterable[str], rows: Iterable[Tuple] = ()
+    ) -> None:
+        """Инициализирует результат запроса.
+
+        Args:
+            columns (Iterable[str]): Имена колонок в порядке значений строки.
+            rows (Iterable[Tuple], optional): Строки результата.
+                Defaults to ().
+
+        """
+        self.columns: Tuple[str, ...] = tuple(columns)
+        self._index = {name: i for i, name in enumerate(self.columns)}
+        self._data: List[List[Any]] = [[] for _ in self.columns]
+        self.extend(rows)
+
+    def extend(self, rows: Iterable[Tuple]) -> None:
+        """Добавляет пачку строк, полученную из курсора."""
+        for column_values, new_values in zip(self._data, zip(*rows)):
+            column_values.extend(new_values)
+
+    def column(self, name: str) -> List[Any]:
+        """Возвращает значения колонки как есть, включая `None`.
+
+        Args:
+            name (str): Имя колонки.
+
+        Returns:
+            List[Any]: Значения колонки или пустой список, если ее нет.
+
+        """
+        position = self._index.get(name)
+        return [] if position is None else self._data[position]
+
+    def column_sum(self, name: str) -> int | float | Decimal:
+        """Суммирует числовые значения колонки, пропуская остальные."""
+        return sum(
+            value
+            for value in self.column(name)
+            if isinstance(value, (int, float, Decimal))
+            and not isinstance(value, bool)
+        )
+
+    def __len__(self) -> int:
+        return len(self._data[0]) if self._data else 0
+
+    @overload
+    def __getitem__(self, index: int) -> RowView: ...
+
+    @overload
+    def __getitem__(self, index: slice) -> List[RowView]: ...
+
+    def __getitem__(self, index):
+        positions = range(len(self))
+        if isinstance(index, slice):
+            return [RowView(self, position) for position in positions[index]]
+        return RowView(self, positions[index])
+
+    def __repr__(self) -> str:
+        return f"QueryRows(columns={self.columns!r}, rows={len(self)})"
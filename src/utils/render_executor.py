@@ -0,0 +1,96 @@
+import asyncio
+import functools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, TypeVar
+
+from loaded_env import get_variables
+
+T = TypeVar("T")
+
+
+class RenderExecutor:
+    """Ограниченный пул потоков для блокирующей работы с документами.
+
+    Загрузка шаблонов, заполнение и сохранение документов выполняются
+    здесь, чтобы не блокировать цикл событий. Пул собирает метрики
+    очереди: глубину и время ожидания задач.
+    """
+
+    def __init__(self, max_workers: int, thread_name_prefix: str = "render"):
+        """Инициализирует пул.
+
+        Args:
+            max_workers (int): Максимальное число потоков.
+            thread_name_prefix (str, optional): Префикс имен потоков.
+                Defaults to "render".
+
+        """
+        self.max_workers = max_workers
+        self._pool = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix=thread_name_prefix
+        )
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._running = 0
+        self._completed = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+
+    async def run(
+        self, func: Callable[..., T], *args: Any, **kwargs: Any
+    ) -> T:
+        """Выполняет `func` в пуле и ожидает результат.
+
+        Args:
+            func (Callable[..., T]): Блокирующая функция.
+            *args (Any): Позиционные аргументы `func`.
+            **kwargs (Any): Именованные аргументы `func`.
+
+        Returns:
+            T: Результат `func`.
+
+        """
+        submitted_at = time.perf_counter()
+        with self._lock:
+            self._queued += 1
+
+        def task() -> T:
+            wait = time.perf_counter() - submitted_at
+            with self._lock:
+                self._queued -= 1
+                self._running += 1
+                self._total_wait += wait
+                self._max_wait = max(self._max_wait, wait)
+            try:
+                return func(*args, **kwargs)
+            finally:
+                with self._lock:
+                    self._running -= 1
+                    self._completed += 1
+
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._pool, functools.partial(task))
+
+    def stats(self) -> Dict[str, int | float]:
+        """Возвращает метрики очереди пула."""
+        with self._lock:
+            started = self._completed + self._running
+            return {
+                "workers": self.max_workers,
+                "queue_depth": self._queued,
+                "running": self._running,
+                "completed": self._completed,
+                "avg_wait_seconds": (
+                    self._total_wait / started if started else 0.0
+                ),
+                "max_wait_seconds": self._max_wait,
+            }
+
+    def shutdown(self) -> None:
+        """Останавливает пул, отменяя задачи из очереди."""
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+RENDER_EXECUTOR = RenderExecutor(get_variables().RENDER_WORKERS)
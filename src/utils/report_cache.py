@@ -0,0 +1,159 @@
+import asyncio
+import hashlib
+import json
+import pickle
+from typing import Any, Awaitable, Callable, Dict, Mapping
+
+from loaded_env import get_variables
+from utils.query_rows import QueryRows
+from utils.result_cache import MemoryResultCache, normalize_filter_params
+
+
+def make_report_cache_key(
+    template_version: Any,
+    report_format: str,
+    fields: Mapping[str, str],
+    filter_params: Dict | None,
+    query_responses: Mapping[int, QueryRows],
+) -> str:
+    """Формирует ключ кэша сформированной справки.
+
+    Ключ - хэш версии шаблона, нормализованного запроса и отпечатка
+    данных: одинаковые данные по одному шаблону дают одинаковую справку,
+    как бы они ни были получены.
+
+    Args:
+        template_version (Any): Путь и версии шаблона, сериализуемые в JSON.
+        report_format (str): Формат итоговой справки.
+        fields (Mapping[str, str]): Значения полей справки.
+        filter_params (Dict | None): Параметры фильтрации.
+        query_responses (Mapping[int, QueryRows]): Ответы запросов.
+
+    Returns:
+        str: Ключ кэша.
+
+    """
+    hasher = hashlib.blake2b(digest_size=32)
+    hasher.update(
+        json.dumps(
+            [
+                template_version,
+                report_format,
+                sorted(fields.items()),
+                normalize_filter_params(filter_params),
+            ],
+            ensure_ascii=False,
+            separators=(",", ":"),
+        ).encode("utf-8")
+    )
+    for query_id in sorted(query_responses):
+        hasher.update(query_id.to_bytes(8, "little", signed=True))
+        hasher.update(
+            pickle.dumps(
+                query_responses[query_id], protocol=pickle.HIGHEST_PROTOCOL
+            )
+        )
+    return hasher.hexdigest()
+
+
+class RenderedReportCache:
+    """Кэш сформированных справок с объединением одинаковых запросов.
+
+    Справки хранятся в LRU-кэше в памяти с ограничением по объему. Пока
+    справка по ключу формируется, одинаковые запросы не запускают свое
+    формирование, а ждут результата первого. Формирование выполняется
+    отдельной задачей, поэтому отмена первого запроса не прерывает его
+    для остальных.
+    """
+
+    def __init__(self, memory: MemoryResultCache, ttl: float):
+        """Инициализирует кэш.
+
+        Args:
+            memory (MemoryResultCache): Хранилище справок.
+            ttl (float): Время жизни справки в секундах.
+
+        """
+        self.memory = memory
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self._inflight: Dict[str, asyncio.Task] = {}
+
+    async def get_or_render(
+        self, key: str, render: Callable[[], Awaitable[bytes]]
+    ) -> bytes:
+        """Возвращает справку из кэша или формирует ее один раз.
+
+        Args:
+            key (str): Ключ `make_report_cache_key`.
+            render (Callable[[], Awaitable[bytes]]): Формирует справку.
+
+        Returns:
+            bytes: Содержимое справки.
+
+        """
+        payload = self.memory.get(key)
+        if payload is not None:
+            self.hits += 1
+            return payload
+
+        task = self._inflight.get(key)
+        if task is None:
+            self.misses += 1
+            task = asyncio.ensure_future(self._render_and_store(key, render))
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    async def _render_and_store(
+        self, key: str, render: Callable[[], Awaitable[bytes]]
+    ) -> bytes:
+        payload = await render()
+        self.memory.set(key, payload, self.ttl)
+        return payload
+
+    def _forget(self, key: str, task: asyncio.Task) -> None:
+        self._inflight.pop(key, None)
+        # Ошибку получают ожидающие запросы, здесь она только помечается
+        # полученной, чтобы не попасть в лог как необработанная
+        if not task.cancelled():
+            task.exception()
+
+    def clear(self) -> None:
+        """Очищает кэш."""
+        self.memory.clear()
+
+    def stats(self) -> Dict[str, int | float]:
+        """Возвращает счетчики кэша и его заполненность.
+
+        `hit_ratio` - доля запросов, получивших справку без собственного
+        формирования: из кэша или от одинакового параллельного запроса.
+        """
+        total = self.hits + self.misses + self.coalesced
+        served = self.hits + self.coalesced
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "hit_ratio": served / total if total else 0.0,
+            "in_flight": len(self._inflight),
+            "entries": len(self.memory),
+            "memory_bytes": self.memory.used_bytes,
+            "max_bytes": self.memory.max_bytes,
+            "evictions": self.memory.evictions,
+        }
+
+
+def _build_rendered_report_cache() -> RenderedReportCache:
+    settings = get_variables()
+    return RenderedReportCache(
+        MemoryResultCache(settings.REPORT_CACHE_MAX_BYTES),
+        settings.REPORT_CACHE_TTL,
+    )
+
+
+RENDERED_REPORT_CACHE = _build_rendered_report_cache()
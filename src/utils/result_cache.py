@@ -0,0 +1,250 @@
+import hashlib
+import json
+import os
+import pickle
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Tuple
+
+from loaded_env import get_variables
+from utils.logger import GLOBAL_LOGGER
+
+
+def normalize_filter_params(
+    filter_params: Dict | None,
+) -> Dict[str, List[str]]:
+    """Нормализует параметры фильтрации для ключей кэшей.
+
+    Ключи и значения сортируются, повторяющиеся значения удаляются,
+    поэтому `{"inn": ["1", "1"]}` и `{"inn": ["1"]}` совпадают.
+
+    Args:
+        filter_params (Dict | None): Параметры фильтрации.
+
+    Returns:
+        Dict[str, List[str]]: Нормализованные параметры.
+
+    """
+    return {
+        key: sorted({str(value) for value in values})
+        for key, values in sorted((filter_params or {}).items())
+    }
+
+
+def make_result_cache_key(
+    query_id: int,
+    query_version: int,
+    filter_params: Dict | None,
+    columns: Iterable[str] | None = None,
+) -> str:
+    """Формирует ключ кэша результата запроса.
+
+    Параметры фильтрации нормализуются `normalize_filter_params`.
+
+    Args:
+        query_id (int): ID запроса.
+        query_version (int): Версия запроса.
+        filter_params (Dict | None): Параметры фильтрации.
+        columns (Iterable[str] | None, optional): Выбираемые колонки.
+            Defaults to None.
+
+    Returns:
+        str: Ключ кэша.
+
+    """
+    return json.dumps(
+        [
+            query_id,
+            query_version,
+            normalize_filter_params(filter_params),
+            sorted(columns or ()),
+        ],
+        ensure_ascii=False,
+        separators=(",", ":"),
+    )
+
+
+class AbstractResultCache(ABC):
+    """Интерфейс хранилища результатов запросов."""
+
+    @abstractmethod
+    def get(self, key: str) -> bytes | None: ...
+
+    @abstractmethod
+    def set(self, key: str, payload: bytes, ttl: float) -> None: ...
+
+    @abstractmethod
+    def clear(self) -> None: ...
+
+
+class MemoryResultCache(AbstractResultCache):
+    """LRU-кэш в памяти процесса с ограничением по объему в байтах."""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.used_bytes = 0
+        self.evictions = 0
+        self._entries: OrderedDict[str, Tuple[float, bytes]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> bytes | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, payload = entry
+            if expires_at < time.monotonic():
+                self._pop(key)
+                return None
+            self._entries.move_to_end(key)
+            return payload
+
+    def set(self, key: str, payload: bytes, ttl: float) -> None:
+        if len(payload) > self.max_bytes:
+            return
+        with self._lock:
+            self._pop(key)
+            self._entries[key] = (time.monotonic() + ttl, payload)
+            self.used_bytes += len(payload)
+            while self.used_bytes > self.max_bytes:
+                self._pop(next(iter(self._entries)))
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.used_bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _pop(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.used_bytes -= len(entry[1])
+
+
+class DiskResultCache(AbstractResultCache):
+    """Кэш на диске, один файл на запись.
+
+    `get` возвращает запись вместе со сроком ее жизни, чтобы при переносе
+    в память запись не жила дольше, чем на диске.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        digest = hashlib.sha256(key.encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, f"{digest}.pkl")
+
+    def get(self, key: str) -> Tuple[float, bytes] | None:
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                expires_at, payload = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError, ValueError):
+            return None
+        if expires_at < time.time():
+            self._remove(path)
+            return None
+        return expires_at, payload
+
+    def set(self, key: str, payload: bytes, ttl: float) -> None:
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                pickle.dump((time.time() + ttl, payload), f)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            GLOBAL_LOGGER.warning(f"Не удалось записать кэш на диск: {e}")
+            self._remove(tmp_path)
+
+    def clear(self) -> None:
+        for filename in os.listdir(self.directory):
+            if filename.endswith(".pkl"):
+                self._remove(os.path.join(self.directory, filename))
+
+    @staticmethod
+    def _remove(path: str) -> None:
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+
+
+class QueryResultCache:
+    """Кэш результатов запросов к внешним представлениям.
+
+    Состоит из LRU-кэша в памяти и необязательного дискового уровня.
+    Значения хранятся в сериализованном виде, поэтому изменение полученных
+    строк не затрагивает кэш.
+    """
+
+    def __init__(
+        self,
+        memory: AbstractResultCache,
+        disk: DiskResultCache | None = None,
+    ):
+        self.memory = memory
+        self.disk = disk
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Any | None:
+        """Возвращает закэшированный результат или None."""
+        payload = self.memory.get(key)
+        if payload is None and self.disk is not None:
+            entry = self.disk.get(key)
+            if entry is not None:
+                expires_at, payload = entry
+                self.memory.set(key, payload, expires_at - time.time())
+        if payload is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return pickle.loads(payload)
+
+    def set(self, key: str, value: Any, ttl: float) -> None:
+        """Сохраняет результат на `ttl` секунд во все уровни кэша."""
+        if ttl <= 0:
+            return
+        payload = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        self.memory.set(key, payload, ttl)
+        if self.disk is not None:
+            self.disk.set(key, payload, ttl)
+
+    def clear(self) -> None:
+        """Очищает все уровни кэша."""
+        self.memory.clear()
+        if self.disk is not None:
+            self.disk.clear()
+
+    def stats(self) -> Dict[str, int | float]:
+        """Возвращает счетчики попаданий и промахов."""
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / total if total else 0.0,
+            "memory_bytes": getattr(self.memory, "used_bytes", 0),
+        }
+
+
+def _build_query_result_cache() -> QueryResultCache:
+    settings = get_variables()
+    disk = (
+        DiskResultCache(settings.RESULT_CACHE_DIR)
+        if settings.RESULT_CACHE_DIR
+        else None
+    )
+    return QueryResultCache(
+        MemoryResultCache(settings.RESULT_CACHE_MAX_BYTES), disk
+    )
+
+
+QUERY_RESULT_CACHE = _build_query_result_cache()
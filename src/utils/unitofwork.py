@@ -2,6 +2,7 @@ from abc import ABC, abstractmethod
 
 from db.db import get_main_session_maker
 from repositories.db import DBRepository
+from repositories.diplom import DiplomUserRepository, PfhdRepository
 from repositories.enquiry import (
     EnquiryRepository,
     EnquiryTemplateBlockRepository,
@@ -22,6 +23,8 @@ class IUnitOfWork(ABC):
     enquiry_templates: EnquiryTemplateRepository
     enquiry_template_blocks: EnquiryTemplateBlockRepository
     input_field_values: InputFieldValueRepository
+    diplom_users: DiplomUserRepository
+    pfhd: PfhdRepository
 
     @abstractmethod
     def __init__(self): ...
@@ -61,6 +64,8 @@ class UnitOfWork:
             self._session
         )
         self.input_field_values = InputFieldValueRepository(self._session)
+        self.diplom_users = DiplomUserRepository(self._session)
+        self.pfhd = PfhdRepository(self._session)
 
     async def __aexit__(self, *args):
         await self.rollback()
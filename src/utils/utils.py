@@ -1,33 +1,55 @@
+import asyncio
+import hashlib
+import json
 import time
-from datetime import datetime
-from typing import Any, Dict, List
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Dict,
+    FrozenSet,
+    List,
+    Tuple,
+)
 
 from more_itertools import always_iterable
-from sqlalchemy import MetaData, Table, and_, select
-from sqlalchemy.ext.asyncio import async_sessionmaker
-
-from db.db import get_session_maker
-from exceptions import DataNotFoundError
-from models import Db, InputFieldValue, Query
+from sqlalchemy import MetaData, Select, Table, and_, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from db.engine_registry import EXTERNAL_ENGINES
+from exceptions import (
+    DataNotFoundError,
+    ReportDeadlineError,
+    TemplateNotFoundError,
+    UnfilteredQueryError,
+)
+from loaded_env import get_variables
+from models import Db
+from schemas.render_plan import QueryPlan, RenderPlan
 from schemas.templater import TemplaterRequestDump
+from schemas.templates_info import TemplatesInfo
+from utils.cache import (
+    RENDER_PLAN_CACHE,
+    TEMPLATES_INFO_CACHE,
+    VIEW_METADATA_CACHE,
+)
 from utils.logger import GLOBAL_LOGGER
+from utils.query_rows import QueryRows
+from utils.result_cache import QUERY_RESULT_CACHE, make_result_cache_key
 from utils.unitofwork import IUnitOfWork
 
 
 class ExternalQueryExecutor:
     """Класс для обработки запросов и получения данных из баз данных."""
 
-    def __init__(self):
-        """Инициализирует обработчик запросов."""
-        self._session_factories_cache: Dict[int, async_sessionmaker] = {}
-
     async def _get_or_create_session_factory(
         self, uow: IUnitOfWork, db_id: int
     ) -> async_sessionmaker:
-        """Получает фабрику сессий из кэша.
+        """Получает фабрику сессий из реестра движков.
 
-        Функция получает фабрику сессий для `db_id` из кэша. Если ее нет,
-        создает и кэширует.
+        Функция сверяет версию строки `system_configuration.db` с версией
+        движка в `EXTERNAL_ENGINES`. Если движка нет или он устарел,
+        загружает данные подключения и пересоздает его.
 
         Args:
             uow (IUnitOfWork): Unit of Work для доступа к базам данных.
@@ -41,57 +63,84 @@ class ExternalQueryExecutor:
             ValueError: Выбрасывает исключение, если данных для подключения к
             базе данных с `db_id` не найдено.
         """
-        if db_id not in self._session_factories_cache:
-            GLOBAL_LOGGER.debug(
-                f"Фабрика сессий для db_id={db_id} не найдена в кэше.\
-            Создаем новую..."
-            )
-            db_connection_details = await self._get_db_details(uow, db_id)
-            if not db_connection_details:
-                raise ValueError(
-                    f"Не найдены данные подключения к database_id: {db_id}"
-                )
+        version = await uow.dbs.get_version(db_id)
+        if version is not None and EXTERNAL_ENGINES.is_actual(db_id, version):
+            return EXTERNAL_ENGINES.get_session_maker(db_id)
 
-            self._session_factories_cache[db_id] = (
-                self._create_external_session_factory(db_connection_details)
+        GLOBAL_LOGGER.debug(
+            f"Фабрика сессий для db_id={db_id} не найдена в реестре.\
+        Создаем новую..."
+        )
+        db_connection_details = await self._get_db_details(uow, db_id)
+        if not db_connection_details:
+            raise ValueError(
+                f"Не найдены данные подключения к database_id: {db_id}"
             )
-
-        return self._session_factories_cache[db_id]
+        return await EXTERNAL_ENGINES.register(db_connection_details)
 
     async def _execute(
-        self, uow: IUnitOfWork, query: Query, filter_params: Dict
-    ) -> List[Dict]:
+        self,
+        external_session_factory: async_sessionmaker,
+        query: QueryPlan,
+        filter_params: Dict,
+        use_cache: bool = True,
+        columns: FrozenSet[str] | None = None,
+    ) -> QueryRows:
         """Подключается к внешней БД и выполняет запрос.
 
         Функция подключается к базе данных и выполняет несколько запросов
-        для получения необходимых данных.
+        для получения необходимых данных. Фильтры применяются по всем
+        переданным параметрам, а выбираются только колонки `columns`.
+        Результат сохраняется в `QUERY_RESULT_CACHE` на `query.cache_ttl`
+        секунд.
 
         Args:
-            uow (IUnitOfWork): Unit of Work для доступа к базам данных.
-            query (Query): Объект `query` являющийся отражением таблицы
-            полученный посредством `sqlalchemy`.
+            external_session_factory (async_sessionmaker): Фабрика сессий
+            внешней базы данных запроса.
+            query (QueryPlan): Запрос из плана справки.
             filter_params (Dict): Параметры для фильтрации данных в запросах.
+            use_cache (bool, optional): Брать результат из кэша, если он
+            там есть. Defaults to True.
+            columns (FrozenSet[str] | None, optional): Колонки, используемые
+            в шаблоне. Если не переданы, выбираются все колонки
+            представления. Defaults to None.
 
         Returns:
-            List[Dict]: Функция возвращает результат выполненного запроса.
+            QueryRows: Функция возвращает результат выполненного запроса.
 
         Raises:
             DataNotFoundError: Подсказывает для какого запроса и с какими
             параметрами не найдены данные.
+            UnfilteredQueryError: Ни один параметр фильтрации не подходит
+            для представления.
         """
-        external_session_factory = await self._get_or_create_session_factory(
-            uow, query.database_id
+        cache_key = make_result_cache_key(
+            query.id, query.version, filter_params, columns
         )
+        if use_cache:
+            cached_results = QUERY_RESULT_CACHE.get(cache_key)
+            if cached_results is not None:
+                GLOBAL_LOGGER.debug(
+                    f"Результат для {query.id} с параметрами\
+                          {filter_params} получен из кэша"
+                )
+                return cached_results
 
         async with external_session_factory() as session:
             view = await self._get_view_table(session, query)
-            stmt = select(view)
+            selected_columns = [
+                view.c[column]
+                for column in sorted(columns or ())
+                if column in view.c
+            ]
+            stmt = (
+                select(*selected_columns) if selected_columns else select(view)
+            )
             stmt = await self._apply_filters(
-                stmt, view, {"inn": filter_params["inn"][0]}
+                stmt, view, filter_params or {}, query.allow_unfiltered
             )
 
-            result = await session.execute(stmt)
-            view_results = result.mappings().all()
+            view_results = await self._fetch_rows(session, stmt)
             if not view_results:
                 raise DataNotFoundError(
                     f"Данные для query_id: {query.id} с параметрами\
@@ -102,50 +151,80 @@ class ExternalQueryExecutor:
                     f"Все удачно для {query.id} с параметрами\
                           {filter_params} - {view_results=}"
                 )
-            return view_results
 
-    async def _get_db_details(self, uow: IUnitOfWork, db_id: int) -> Db | None:
-        """Получает объект `Db` из основной базы.
+        QUERY_RESULT_CACHE.set(
+            cache_key,
+            view_results,
+            (
+                get_variables().RESULT_CACHE_DEFAULT_TTL
+                if query.cache_ttl is None
+                else query.cache_ttl
+            ),
+        )
+        return view_results
+
+    async def _fetch_rows(
+        self, session: AsyncSession, stmt: Select
+    ) -> QueryRows:
+        """Получает строки результата запроса.
+
+        При `EXTERNAL_FETCH_STREAMING` строки читаются через серверный курсор
+        пачками по `EXTERNAL_FETCH_BATCH_SIZE` и сразу складываются в
+        `QueryRows`, без промежуточного списка `RowMapping`. Ограничен
+        только буфер драйвера: результат целиком собирается до
+        формирования справки, так как его сериализуют кэш результатов и
+        отпечаток данных `RENDERED_REPORT_CACHE`, поэтому пиковая память
+        растет с числом строк.
 
         Args:
-            uow (IUnitOfWork): Unit of Work для доступа к базам данных.
-            db_id (int): ID базы данных для которой нужно получить объект `Db`.
+            session (AsyncSession): Сессия внешней базы данных.
+            stmt (Select): Запрос к представлению.
 
         Returns:
-            Db | None: Функция возвращает искомый объект или ничего, в
-            зависимости от результата выполнения запроса.
+            QueryRows: Строки результата.
 
         """
-        return await uow.dbs.find_one(id=db_id)
+        settings = get_variables()
+        if not settings.EXTERNAL_FETCH_STREAMING:
+            result = await session.execute(stmt)
+            return QueryRows(result.keys(), result.all())
 
-    def _create_external_session_factory(self, db: Db) -> async_sessionmaker:
-        """Создает новую фабрику сессий.
+        result = await session.stream(
+            stmt.execution_options(
+                yield_per=settings.EXTERNAL_FETCH_BATCH_SIZE
+            )
+        )
+        rows = QueryRows(result.keys())
+        async for partition in result.partitions():
+            rows.extend(partition)
+        return rows
+
+    async def _get_db_details(self, uow: IUnitOfWork, db_id: int) -> Db | None:
+        """Получает объект `Db` из основной базы.
 
         Args:
-            db (Db): Объект `Db` с информацией о подключении к базе данных.
+            uow (IUnitOfWork): Unit of Work для доступа к базам данных.
+            db_id (int): ID базы данных для которой нужно получить объект `Db`.
 
         Returns:
-            async_sessionmaker: Функция возвращает сессию `async_sessionmaker`.
+            Db | None: Функция возвращает искомый объект или ничего, в
+            зависимости от результата выполнения запроса.
 
         """
-        conn_params = {
-            "drivername": db.dbms,
-            "host": db.host,
-            "port": db.port,
-            "database": db.name,
-            "username": db.username,
-            "password": db.password,
-        }
-        return get_session_maker(conn_params)
+        return await uow.dbs.find_one(id=db_id)
 
     async def _get_view_table(
-        self, session: async_sessionmaker, query: Query
+        self, session: async_sessionmaker, query: QueryPlan
     ) -> Table:
         """Получает представление базы данных.
 
+        Отражение представления кэшируется в `VIEW_METADATA_CACHE` по ключу
+        `(database_id, view_name)`, поэтому запросы к каталогу базы данных
+        выполняются только при первом обращении или после истечения TTL.
+
         Args:
             session (async_sessionmaker): Объект асинхронной сессии.
-            query (Query): Объект запроса.
+            query (QueryPlan): Запрос из плана справки.
 
         Returns:
             Table: Функция возвращает объект `Table`, предстваляющий отражение
@@ -153,37 +232,127 @@ class ExternalQueryExecutor:
 
         """
         view_name = f"query_{query.id}" if query.code is None else query.code
-        return await session.run_sync(
-            lambda sync_session: Table(
-                view_name,
-                MetaData(),
-                schema="cbias_spravki",
-                autoload_with=sync_session.get_bind(),
+        cache_key = (query.database_id, view_name)
+        view = VIEW_METADATA_CACHE.get(cache_key)
+        if view is None:
+            view = await session.run_sync(
+                lambda sync_session: Table(
+                    view_name,
+                    MetaData(),
+                    schema="cbias_spravki",
+                    autoload_with=sync_session.get_bind(),
+                )
             )
-        )
+            VIEW_METADATA_CACHE.set(cache_key, view)
+        return view
+
+    def invalidate_view_metadata(
+        self, database_id: int, view_name: str | None = None
+    ) -> None:
+        """Сбрасывает кэш отраженных представлений.
+
+        Args:
+            database_id (int): ID внешней базы данных.
+            view_name (str | None, optional): Имя представления. Если не
+                передано, сбрасываются все представления базы данных.
+                Defaults to None.
+
+        Returns:
+            None: Функция работает с `VIEW_METADATA_CACHE`.
+
+        """
+        if view_name is None:
+            VIEW_METADATA_CACHE.invalidate_where(
+                lambda key: key[0] == database_id
+            )
+        else:
+            VIEW_METADATA_CACHE.invalidate((database_id, view_name))
+
+    async def warm_view_metadata_cache(self, uow: IUnitOfWork) -> None:
+        """Заполняет кэш отражений для всех запросов из
+        `page_configuration.query`.
+
+        Args:
+            uow (IUnitOfWork): Unit of Work для доступа к базам данных.
+
+        Returns:
+            None: Функция работает с `VIEW_METADATA_CACHE`.
+
+        """
+        queries_by_db: Dict[int, list] = {}
+        for query in await uow.queries.get_view_codes():
+            queries_by_db.setdefault(query.database_id, []).append(query)
+
+        for database_id, queries in queries_by_db.items():
+            try:
+                session_factory = await self._get_or_create_session_factory(
+                    uow, database_id
+                )
+            except ValueError as e:
+                GLOBAL_LOGGER.warning(f"{e}")
+                continue
+            async with session_factory() as session:
+                for query in queries:
+                    try:
+                        await self._get_view_table(session, query)
+                    except Exception as e:
+                        GLOBAL_LOGGER.warning(
+                            f"Не удалось отразить представление для "
+                            f"query_id: {query.id} - {e}"
+                        )
+        GLOBAL_LOGGER.info("Кэш отражений представлений заполнен")
 
     async def _apply_filters(
-        self, stmt: select, view: Table, params: Dict
+        self,
+        stmt: select,
+        view: Table,
+        params: Dict,
+        allow_unfiltered: bool = False,
     ) -> select:
         """Применяет фильтры к запросу.
 
+        Параметры, для которых нет колонки в представлении, пропускаются.
+        Если не применен ни один фильтр, запрос выбрал бы все представление,
+        поэтому он выполняется только при `allow_unfiltered`.
+
         Args:
             stmt (select): Изначальный запрос.
             view (Table): Таблица - представление.
             params (Dict): Параметры фильтрации.
+            allow_unfiltered (bool, optional): Разрешить запрос без
+            фильтров. Defaults to False.
 
         Returns:
             select: Функция возвращает запрос с добавленными фильтрами.
 
+        Raises:
+            UnfilteredQueryError: Не применен ни один фильтр, а запрос без
+            фильтров не разрешен.
         """
         filters = []
         for key, value in params.items():
-            if hasattr(view.c, key):
-                column = getattr(view.c, key)
+            if key in view.c:
+                column = view.c[key]
                 converted_values = self._convert_value(value, column.type)
                 filters.append(column.in_(converted_values))
+            else:
+                GLOBAL_LOGGER.warning(
+                    f"Колонки {key} нет в представлении {view.name},"
+                    " фильтр пропущен"
+                )
 
-        return stmt.where(and_(*filters)) if filters else stmt
+        if not filters:
+            if not allow_unfiltered:
+                GLOBAL_LOGGER.error(
+                    f"К представлению {view.name} не применен ни один "
+                    f"фильтр, параметры: {params}"
+                )
+                raise UnfilteredQueryError(
+                    f"Ни один параметр фильтрации не подходит для "
+                    f"представления {view.name}"
+                )
+            return stmt
+        return stmt.where(and_(*filters))
 
     def _convert_value(self, value: Any, column_type: Any) -> List[Any]:
         """Конвертирует значения фильтрации.
@@ -196,7 +365,7 @@ class ExternalQueryExecutor:
             List[Any]: Фунция возвращает сконвертированный объект.
 
         """
-        iterable_value = always_iterable(value, base_type=(str, list))
+        iterable_value = always_iterable(value, base_type=(str, bytes))
         return list(map(column_type.python_type, iterable_value))
 
     async def get_data(
@@ -208,10 +377,14 @@ class ExternalQueryExecutor:
         target_dict: dict,
         template_file_path: str,
         is_pdf: bool = False,
+        column_resolver: (
+            Callable[[str], Awaitable[Dict[int, FrozenSet[str]]]] | None
+        ) = None,
     ) -> str:
         """Получает данные по запросам.
 
-        Функция получает данные согласно запросам для объекта `enquiry`.
+        Функция получает данные согласно запросам из плана формирования
+        справки `enquiry`.
 
         Args:
             enquiry_id (int): ID справки `enquiry`.
@@ -223,79 +396,336 @@ class ExternalQueryExecutor:
             template_file_path (str): Путь до директории с шаблоном справки.
             is_pdf (bool, optional): Флаг, определяющий тип генеруемой справки.
             Defaults to False.
+            column_resolver (Callable | None, optional): Функция, которая по
+            пути к шаблону возвращает используемые в нем колонки каждого
+            запроса. Defaults to None.
 
         Returns:
             str: Функция возвращает путь до шаблона справки.
 
         """
-        enquiry = await uow.enquiries.get_data_by_id(enquiry_id)
-        for template in enquiry[0].templates:
-            if template.template_file_path.split(".")[1] == template_type:
-                if (is_pdf and "pdf" not in template.template_file_path) or (
-                    not is_pdf and "pdf" in template.template_file_path
+        render_plan = await self.get_render_plan(enquiry_id, uow)
+        if render_plan is None:
+            GLOBAL_LOGGER.warning(f"Справка с id={enquiry_id} не найдена")
+            return template_file_path
+        for template in render_plan.templates:
+            if not self._is_template_of(
+                template.template_file_path, template_type, is_pdf
+            ):
+                continue
+            template_file_path = template.template_file_path
+            queries = {
+                query.id: query
+                for block in template.blocks
+                for query in block.queries
+            }
+            await self._fetch_concurrently(
+                uow,
+                list(queries.values()),
+                templater_params["filter_params"],
+                target_dict,
+                use_cache=not templater_params.get("bypass_cache", False),
+                referenced_columns=(
+                    await column_resolver(template_file_path)
+                    if column_resolver
+                    else None
+                ),
+            )
+        return template_file_path
+
+    async def get_bundle_data(
+        self,
+        enquiry_id: int,
+        uow: IUnitOfWork,
+        templater_params: TemplaterRequestDump,
+        targets: List[
+            Tuple[
+                str,
+                bool,
+                Callable[[str], Awaitable[Dict[int, FrozenSet[str]]]],
+            ]
+        ],
+        target_dict: dict,
+    ) -> List[Tuple[str, FrozenSet[int]]]:
+        """Получает данные для нескольких форматов справки за один проход.
+
+        Запросы всех выбранных шаблонов объединяются и выполняются одним
+        вызовом `_fetch_concurrently`: запрос, который используется в
+        нескольких шаблонах, выполняется один раз с объединением их колонок.
+
+        Args:
+            enquiry_id (int): ID справки `enquiry`.
+            uow (IUnitOfWork): Unit of Work для доступа к базам данных.
+            templater_params (TemplaterRequestDump): Параметры фильтрации
+            запросов.
+            targets (List[Tuple[str, bool, Callable]]): Тип шаблона, флаг
+            шаблона для `.pdf` и функция, возвращающая используемые в
+            шаблоне колонки каждого запроса, - для каждого формата.
+            target_dict (dict): Словарь для модификации, ключ - `query.id`.
+
+        Returns:
+            List[Tuple[str, FrozenSet[int]]]: Путь до шаблона и ID его
+            запросов в порядке `targets`.
+
+        Raises:
+            TemplateNotFoundError: У справки нет шаблона одного из
+            форматов. Запросы в этом случае не выполняются.
+
+        """
+        render_plan = await self.get_render_plan(enquiry_id, uow)
+        if render_plan is None:
+            GLOBAL_LOGGER.warning(f"Справка с id={enquiry_id} не найдена")
+        templates = render_plan.templates if render_plan else []
+
+        queries: Dict[int, QueryPlan] = {}
+        # None - шаблону нужны все колонки запроса
+        columns: Dict[int, FrozenSet[str] | None] = {}
+        selected: List[Tuple[str, FrozenSet[int]]] = []
+        for template_type, is_pdf, column_resolver in targets:
+            template_file_path = ""
+            query_ids: set[int] = set()
+            for template in templates:
+                if not self._is_template_of(
+                    template.template_file_path, template_type, is_pdf
                 ):
                     continue
                 template_file_path = template.template_file_path
+                referenced_columns = await column_resolver(template_file_path)
                 for block in template.blocks:
                     for query in block.queries:
-                        try:
-                            view_data = await self._execute(
-                                uow, query, templater_params["filter_params"]
-                            )
-                            target_dict[query.id] = view_data
-                        except DataNotFoundError as e:
-                            GLOBAL_LOGGER.debug(f"{e}, время: {time.ctime()}")
-        return template_file_path
+                        query_ids.add(query.id)
+                        query_columns = referenced_columns.get(query.id)
+                        if query.id not in queries:
+                            queries[query.id] = query
+                            columns[query.id] = query_columns
+                        elif query_columns is None or (
+                            columns[query.id] is None
+                        ):
+                            columns[query.id] = None
+                        else:
+                            columns[query.id] |= query_columns
+            if not template_file_path:
+                report_format = "pdf" if is_pdf else template_type
+                GLOBAL_LOGGER.warning(
+                    f"У справки с id={enquiry_id} нет шаблона формата "
+                    f"{report_format}"
+                )
+                raise TemplateNotFoundError(
+                    f"Шаблон формата {report_format} для справки "
+                    f"id={enquiry_id} не найден"
+                )
+            selected.append((template_file_path, frozenset(query_ids)))
+
+        await self._fetch_concurrently(
+            uow,
+            list(queries.values()),
+            templater_params["filter_params"],
+            target_dict,
+            use_cache=not templater_params.get("bypass_cache", False),
+            referenced_columns={
+                query_id: query_columns
+                for query_id, query_columns in columns.items()
+                if query_columns is not None
+            },
+        )
+        return selected
+
+    @staticmethod
+    def _is_template_of(
+        template_file_path: str, template_type: str, is_pdf: bool
+    ) -> bool:
+        """Проверяет, подходит ли шаблон для формата справки.
+
+        Шаблоны для `.pdf` отличаются по вхождению `pdf` в путь.
+        """
+        if template_file_path.split(".")[1] != template_type:
+            return False
+        return is_pdf == ("pdf" in template_file_path)
+
+    async def get_render_plan(
+        self, enquiry_id: int, uow: IUnitOfWork
+    ) -> RenderPlan | None:
+        """Получает план формирования справки.
+
+        План (шаблоны, блоки, запросы и ID баз данных) загружается одним
+        запросом и кэшируется в `RENDER_PLAN_CACHE`. Кэшированный план
+        используется, пока не изменились `version` и `updated_at` справки.
+
+        Args:
+            enquiry_id (int): ID справки `enquiry`.
+            uow (IUnitOfWork): Unit of Work для доступа к базам данных.
+
+        Returns:
+            RenderPlan | None: План справки или None, если справки нет.
+
+        """
+        stamp = await uow.enquiries.get_plan_stamp(enquiry_id)
+        if stamp is None:
+            RENDER_PLAN_CACHE.invalidate(enquiry_id)
+            return None
+
+        render_plan = RENDER_PLAN_CACHE.get(enquiry_id)
+        if render_plan is not None and stamp == (
+            render_plan.version,
+            render_plan.updated_at,
+        ):
+            return render_plan
+
+        render_plan = await uow.enquiries.get_render_plan(enquiry_id)
+        if render_plan is not None:
+            RENDER_PLAN_CACHE.set(enquiry_id, render_plan)
+        return render_plan
+
+    async def _fetch_concurrently(
+        self,
+        uow: IUnitOfWork,
+        queries: List[QueryPlan],
+        filter_params: Dict,
+        target_dict: dict,
+        use_cache: bool = True,
+        referenced_columns: Dict[int, FrozenSet[str]] | None = None,
+    ) -> None:
+        """Выполняет запросы шаблона параллельно.
+
+        Фабрики сессий для всех баз данных создаются заранее, так как
+        сессия основной базы `uow` не допускает конкурентного использования.
+        Число одновременных запросов к одной базе данных ограничено
+        `EXTERNAL_DB_MAX_CONCURRENCY` на весь процесс, а общее время
+        выполнения - `REPORT_FETCH_TIMEOUT`. Ошибка запроса отменяет
+        остальные запросы справки.
+
+        Args:
+            uow (IUnitOfWork): Unit of Work для доступа к базам данных.
+            queries (List[QueryPlan]): Запросы всех блоков шаблона.
+            filter_params (Dict): Параметры для фильтрации данных в запросах.
+            target_dict (dict): Словарь для модификации, ключ - `query.id`.
+            use_cache (bool, optional): Использовать кэш результатов.
+            Defaults to True.
+            referenced_columns (Dict[int, FrozenSet[str]] | None, optional):
+            Колонки шаблона по `query.id`. Defaults to None.
+
+        Returns:
+            None: Функция заполняет `target_dict` напрямую.
+
+        Raises:
+            ReportDeadlineError: Запросы не уложились в отведенное время.
+        """
+        settings = get_variables()
+        session_factories: Dict[int, async_sessionmaker] = {}
+        for query in queries:
+            if query.database_id not in session_factories:
+                session_factories[query.database_id] = (
+                    await self._get_or_create_session_factory(
+                        uow, query.database_id
+                    )
+                )
+
+        async def fetch_one(query: QueryPlan) -> None:
+            async with EXTERNAL_ENGINES.get_query_semaphore(query.database_id):
+                try:
+                    target_dict[query.id] = await self._execute(
+                        session_factories[query.database_id],
+                        query,
+                        filter_params,
+                        use_cache,
+                        (referenced_columns or {}).get(query.id),
+                    )
+                except DataNotFoundError as e:
+                    GLOBAL_LOGGER.debug(f"{e}, время: {time.ctime()}")
+
+        # Ошибка одного запроса отменяет остальные, чтобы они не занимали
+        # соединения пула после того, как справка уже не сформируется
+        try:
+            async with asyncio.timeout(settings.REPORT_FETCH_TIMEOUT):
+                async with asyncio.TaskGroup() as group:
+                    for query in queries:
+                        group.create_task(fetch_one(query))
+        except TimeoutError as e:
+            raise ReportDeadlineError(
+                f"Запросы для справки не выполнены за "
+                f"{settings.REPORT_FETCH_TIMEOUT} секунд"
+            ) from e
+        except ExceptionGroup as group:
+            raise group.exceptions[0] from None
 
     async def get_template_info(
         self, enquiry_id: int, uow: IUnitOfWork
-    ) -> List:
-        """Получает доступные форматы шаблонов.
+    ) -> TemplatesInfo | None:
+        """Получает доступные форматы шаблонов и поля справки.
+
+        Ответ собирается из плана справки и одного запроса по полям и их
+        значениям, сериализуется один раз и кэшируется в
+        `TEMPLATES_INFO_CACHE` вместе с ETag до изменения значений полей.
 
         Args:
             enquiry_id (int): ID справки для получения шаблонов.
             uow (IUnitOfWork): Unit of Work для доступа к базам данных.
 
         Returns:
-            List: Функция возвращает список доступных форматов шаблонов.
+            TemplatesInfo | None: Готовый ответ или None, если справки нет.
 
         """
-        templates_types = list()
-        fields = list()
-        enquiry = await uow.enquiries.get_data_by_id(enquiry_id)
-        if not enquiry:
-            return []
-        for template in enquiry[0].templates:
-            if (
+        templates_info = TEMPLATES_INFO_CACHE.get(enquiry_id)
+        if templates_info is not None:
+            return templates_info
+
+        render_plan = await self.get_render_plan(enquiry_id, uow)
+        if render_plan is None:
+            return None
+        templates_types = list(
+            dict.fromkeys(
                 template.template_file_path.split(".")[1]
-                not in templates_types
-            ):
-                templates_types.append(
-                    template.template_file_path.split(".")[1]
+                for template in render_plan.templates
+            )
+        )
+        templates_types.append("pdf")
+
+        fields = await uow.enquiries.get_input_fields_info(enquiry_id)
+        input_field_ids = set()
+        shared_input_field_ids = set()
+        for field in fields:
+            input_field_id = field.pop("input_field_id")
+            input_field_ids.add(input_field_id)
+            if not field.pop("enquiry_specific"):
+                shared_input_field_ids.add(input_field_id)
+        content = json.dumps(
+            {"formats": templates_types, "fields": fields},
+            ensure_ascii=False,
+            separators=(",", ":"),
+        ).encode("utf-8")
+        templates_info = TemplatesInfo(
+            content=content,
+            etag=f'"{hashlib.sha256(content).hexdigest()[:32]}"',
+            input_field_ids=frozenset(input_field_ids),
+            shared_input_field_ids=frozenset(shared_input_field_ids),
+        )
+        TEMPLATES_INFO_CACHE.set(enquiry_id, templates_info)
+        return templates_info
+
+    @staticmethod
+    def invalidate_template_info(enquiry_id: int) -> None:
+        """Сбрасывает кэш `get_template_info` после изменения значений.
+
+        Сбрасывается ответ самой справки и ответы справок, у которых
+        общие значения с ее полями. Если ответа справки нет в кэше, ее
+        поля неизвестны, поэтому сбрасываются все ответы с общими полями.
+
+        Args:
+            enquiry_id (int): ID справки, значения полей которой изменены.
+
+        """
+        templates_info = TEMPLATES_INFO_CACHE.get(enquiry_id)
+        TEMPLATES_INFO_CACHE.invalidate(enquiry_id)
+        if templates_info is None:
+            TEMPLATES_INFO_CACHE.invalidate_values_where(
+                lambda cached: bool(cached.shared_input_field_ids)
+            )
+        else:
+            TEMPLATES_INFO_CACHE.invalidate_values_where(
+                lambda cached: not cached.shared_input_field_ids.isdisjoint(
+                    templates_info.input_field_ids
                 )
-        for input_field_index in enquiry[0].input_fields:
-            fields.append(
-                {
-                    "title": input_field_index.input_field.title,
-                    "field_key": input_field_index.input_field.field_key,
-                    "field_type": input_field_index.input_field.field_type,
-                    "values": [
-                        {
-                            "id": field.id,
-                            "value": field.input_field_value,
-                            "user_fio": f"{field.user.data[0].last_name} "
-                            f"{field.user.data[0].name} "
-                            f"{field.user.data[0].middle_name}",
-                            "created_at": field.created_at.strftime(
-                                "%d.%m.%Y"
-                            ),
-                        }
-                        for field in input_field_index.relevant_values
-                        if not field.is_deleted
-                    ],
-                }
             )
-        return {"formats": templates_types, "fields": fields}
 
     async def delete_input_field_value_soft(
         self, enquiry_id: int, uow: IUnitOfWork, input_field_value_id: int
@@ -331,22 +761,26 @@ class ExternalQueryExecutor:
             return True
         value_to_delete.is_deleted = True
         await uow.commit()
+        self.invalidate_template_info(enquiry_id)
         GLOBAL_LOGGER.debug(
             f"Значение {input_field_value_id} было мягко удалено."
         )
         return True
 
-    async def add_input_field_value(
+    async def add_input_field_values(
         self,
         enquiry_id: int,
         uow: IUnitOfWork,
         fields: Dict[str, str],
         user_id: int | None,
     ) -> None:
-        """Добавление значения поля в БД.
+        """Сохраняет значения полей справки одним запросом.
+
+        Значения, которые уже есть у поля справки, не добавляются повторно:
+        проверка выполняется в том же `INSERT ... SELECT`.
 
         Args:
-            enquiry_id (int): ID справки для которой добавляется поле.
+            enquiry_id (int): ID справки для которой добавляются поля.
             uow (IUnitOfWork): UOW для подключения к БД.
             fields (Dict[str, str]): Словарь полей:
                 ключ - `input_field.field_key`,
@@ -357,32 +791,16 @@ class ExternalQueryExecutor:
             None: Функция работает с БД.
 
         """
-        ((field_key, field_value),) = fields.items()
-        enquiry = await uow.enquiries.get_data_by_id(enquiry_id)
-        for input_field_index in enquiry[0].input_fields:
-            if field_key != input_field_index.input_field.field_key:
-                GLOBAL_LOGGER.debug(
-                    f"Поля {field_key} нет в справке с id={enquiry_id}"
-                )
-                continue
-            field_value_exists = any(
-                record.input_field_value == field_value
-                for record in input_field_index.values
-            )
-            if not field_value_exists:
-                field_data = {
-                    "enquiry_input_field_id": input_field_index.id,
-                    "input_field_value": field_value,
-                    "user_id": user_id,
-                    "created_at": datetime.now(),
-                }
-                new_input_field_value = InputFieldValue(**field_data)
-                uow._session.add(new_input_field_value)
-        GLOBAL_LOGGER.debug(
-            f"Попытка загрузить значение {field_value} для "
-            f"поля {field_key} в БД"
+        fields = {key: value for key, value in fields.items() if value}
+        if not fields:
+            return
+        inserted = await uow.input_field_values.add_missing_values(
+            enquiry_id, fields, user_id
         )
         await uow.commit()
+        if inserted:
+            self.invalidate_template_info(enquiry_id)
         GLOBAL_LOGGER.debug(
-            f"Значение {field_value} для поля {field_key} ЗАГРУЖЕНО в БД"
+            f"Для справки {enquiry_id} сохранено {inserted} новых значений "
+            f"полей {list(fields)}"
         )
@@ -0,0 +1,137 @@
+import asyncio
+import os
+import shutil
+import tempfile
+import time
+from tempfile import SpooledTemporaryFile
+
+from loaded_env import get_variables
+from utils.logger import GLOBAL_LOGGER
+
+WORKSPACE_PREFIX = "enquiry_ws_"
+SHM_DIR = "/dev/shm"
+
+
+def get_workspace_root() -> str:
+    """Возвращает директорию, в которой создаются рабочие каталоги.
+
+    Если `WORKSPACE_ROOT` не задан, используется tmpfs (`/dev/shm`), а при
+    его отсутствии — системная временная директория.
+
+    Returns:
+        str: Путь к корневой директории.
+
+    """
+    root = get_variables().WORKSPACE_ROOT
+    if root:
+        os.makedirs(root, exist_ok=True)
+        return root
+    if os.path.isdir(SHM_DIR) and os.access(SHM_DIR, os.W_OK):
+        return SHM_DIR
+    return tempfile.gettempdir()
+
+
+class RequestWorkspace:
+    """Уникальный рабочий каталог одного запроса на формирование справки.
+
+    Все промежуточные и итоговые файлы запроса создаются внутри каталога,
+    поэтому параллельные запросы не перезаписывают файлы друг друга.
+    """
+
+    def __init__(self, root: str | None = None):
+        """Создает рабочий каталог.
+
+        Args:
+            root (str | None, optional): Корневая директория.
+                Defaults to None.
+
+        """
+        self.path = tempfile.mkdtemp(
+            prefix=WORKSPACE_PREFIX, dir=root or get_workspace_root()
+        )
+
+    def file(self, name: str) -> str:
+        """Возвращает путь к файлу внутри рабочего каталога.
+
+        Args:
+            name (str): Имя файла.
+
+        Returns:
+            str: Полный путь к файлу.
+
+        """
+        return os.path.join(self.path, name)
+
+    def spooled_file(self) -> SpooledTemporaryFile:
+        """Создает буфер для итогового документа.
+
+        Буфер хранится в памяти и выгружается в рабочий каталог, только
+        если превышает `REPORT_SPOOL_MAX_BYTES`.
+
+        Returns:
+            SpooledTemporaryFile: Пустой буфер, открытый на чтение и запись.
+
+        """
+        return SpooledTemporaryFile(
+            max_size=get_variables().REPORT_SPOOL_MAX_BYTES, dir=self.path
+        )
+
+    def cleanup(self) -> None:
+        """Удаляет рабочий каталог вместе с содержимым."""
+        shutil.rmtree(self.path, ignore_errors=True)
+
+    def __enter__(self) -> "RequestWorkspace":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.cleanup()
+
+
+def sweep_stale_workspaces(max_age: float, root: str | None = None) -> int:
+    """Удаляет рабочие каталоги, оставшиеся от прерванных запросов.
+
+    Args:
+        max_age (float): Возраст каталога в секундах, после которого он
+            считается брошенным.
+        root (str | None, optional): Корневая директория.
+            Defaults to None.
+
+    Returns:
+        int: Число удаленных каталогов.
+
+    """
+    root = root or get_workspace_root()
+    deadline = time.time() - max_age
+    removed = 0
+    with os.scandir(root) as entries:
+        for entry in entries:
+            if not entry.name.startswith(WORKSPACE_PREFIX):
+                continue
+            try:
+                if (
+                    entry.is_dir(follow_symlinks=False)
+                    and entry.stat().st_mtime < deadline
+                ):
+                    shutil.rmtree(entry.path, ignore_errors=True)
+                    removed += 1
+            except FileNotFoundError:
+                continue
+    return removed
+
+
+async def run_workspace_sweeper() -> None:
+    """Периодически удаляет брошенные рабочие каталоги."""
+    settings = get_variables()
+    while True:
+        await asyncio.sleep(settings.WORKSPACE_SWEEP_INTERVAL)
+        try:
+            removed = await asyncio.to_thread(
+                sweep_stale_workspaces, settings.WORKSPACE_MAX_AGE
+            )
+        except OSError as e:
+            GLOBAL_LOGGER.error(f"Ошибка очистки рабочих каталогов: {e}")
+            continue
+        if removed:
+            GLOBAL_LOGGER.info(
+                f"Удалено брошенных рабочих каталогов: {removed}"
+            )
@@ -0,0 +1,98 @@
+import copy
+import io
+import re
+import zipfile
+from typing import BinaryIO, Callable
+
+# Атрибуты ZipFile, через которые часть копируется без распаковки. Они
+# не входят в публичный API и могут измениться в новой версии Python
+RAW_COPY_ATTRIBUTES = (
+    "fp",
+    "filelist",
+    "NameToInfo",
+    "start_dir",
+    "_didModify",
+)
+
+
+def _supports_raw_copy() -> bool:
+    """Проверяет, есть ли у `ZipFile` атрибуты для копирования частей."""
+    with zipfile.ZipFile(io.BytesIO(), "w") as probe:
+        return (
+            all(hasattr(probe, name) for name in RAW_COPY_ATTRIBUTES)
+            and isinstance(probe.filelist, list)
+            and isinstance(probe.NameToInfo, dict)
+        )
+
+
+RAW_COPY_SUPPORTED = _supports_raw_copy()
+
+
+def rewrite_zip(
+    source: bytes,
+    output: BinaryIO,
+    members_pattern: re.Pattern,
+    patch: Callable[[str, bytes], bytes],
+    extra_members: dict[str, bytes] | None = None,
+    raw_copy: bool = RAW_COPY_SUPPORTED,
+) -> list[str]:
+    """Переписывает ZIP-архив за один проход, изменяя только нужные части.
+
+    Части, имена которых подходят под `members_pattern`, распаковываются,
+    передаются в `patch` и сжимаются заново. Остальные части копируются
+    байт в байт вместе с локальными заголовками, без распаковки и
+    повторного сжатия. Если такое копирование не поддерживается версией
+    `zipfile`, они переписываются через `writestr`. Части из
+    `extra_members` дописываются в конец.
+
+    Args:
+        source (bytes): Исходный архив.
+        output (BinaryIO): Пустой буфер для нового архива.
+        members_pattern (re.Pattern): Шаблон имен изменяемых частей.
+        patch (Callable[[str, bytes], bytes]): Функция изменения содержимого
+            части, получает имя и содержимое.
+        extra_members (dict[str, bytes] | None, optional): Новые части
+            архива по имени. Defaults to None.
+        raw_copy (bool, optional): Копировать неизменяемые части без
+            распаковки. Defaults to `RAW_COPY_SUPPORTED`.
+
+    Returns:
+        list[str]: Имена частей, содержимое которых изменилось.
+
+    """
+    changed = []
+    with zipfile.ZipFile(io.BytesIO(source)) as zip_in:
+        infos = zip_in.infolist()
+        # Часть занимает байты от своего заголовка до заголовка следующей
+        # части или до центрального каталога
+        offsets = sorted(info.header_offset for info in infos)
+        ends = dict(zip(offsets, offsets[1:] + [zip_in.start_dir]))
+        raw = memoryview(source)
+
+        with zipfile.ZipFile(output, "w") as zip_out:
+            for info in infos:
+                new_info = copy.copy(info)
+                if members_pattern.fullmatch(info.filename):
+                    content = zip_in.read(info)
+                    patched = patch(info.filename, content)
+                    if patched != content:
+                        changed.append(info.filename)
+                    zip_out.writestr(new_info, patched)
+                    continue
+                if not raw_copy:
+                    zip_out.writestr(new_info, zip_in.read(info))
+                    continue
+
+                new_info.header_offset = zip_out.fp.tell()
+                zip_out.fp.write(
+                    raw[info.header_offset : ends[info.header_offset]]
+                )
+                zip_out.filelist.append(new_info)
+                zip_out.NameToInfo[new_info.filename] = new_info
+                zip_out.start_dir = zip_out.fp.tell()
+                zip_out._didModify = True
+
+            for name, content in (extra_members or {}).items():
+                zip_out.writestr(name, content, zipfile.ZIP_DEFLATED)
+                changed.append(name)
+    return changed
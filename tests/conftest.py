@@ -0,0 +1,22 @@
+import os
+import sys
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "src")
+sys.path.insert(0, SRC_DIR)
+
+# Настройки без .env: модули читают их при импорте, внешние сервисы в
+# тестах не используются
+for name, value in {
+    "app_name": "enquiry-tests",
+    "app_description": "enquiry-tests",
+    "DB_HOST": "localhost",
+    "DB_NAME": "enquiry",
+    "DB_PORT": "5432",
+    "DB_USER": "enquiry",
+    "DB_PASS": "enquiry",
+    "DB_DRIVER_NAME": "postgresql+asyncpg",
+    "LOG_MESSAGE_FORMAT": "{message}",
+    "LOG_DATETIME_FORMAT": "HH:mm:ss",
+    "LOG_TO_CONSOLE": "false",
+}.items():
+    os.environ.setdefault(name, value)
@@ -0,0 +1,46 @@
+import asyncio
+
+import pytest
+from sqlalchemy import Column, Integer, MetaData, String, Table, select
+
+from exceptions import UnfilteredQueryError
+from utils.utils import ExternalQueryExecutor
+
+VIEW = Table(
+    "query_1",
+    MetaData(),
+    Column("inn", String),
+    Column("year", Integer),
+    schema="cbias_spravki",
+)
+
+
+def apply_filters(params, allow_unfiltered=False):
+    return asyncio.run(
+        ExternalQueryExecutor()._apply_filters(
+            select(VIEW), VIEW, params, allow_unfiltered
+        )
+    )
+
+
+def test_filters_by_view_columns():
+    stmt = apply_filters({"inn": ["77"], "year": "2024"})
+    where = str(stmt.whereclause)
+    assert "inn IN" in where
+    assert "year IN" in where
+
+
+def test_unknown_keys_are_skipped():
+    stmt = apply_filters({"inn": ["77"], "typo": ["1"]})
+    assert "typo" not in str(stmt.whereclause)
+
+
+@pytest.mark.parametrize("params", [{}, {"typo": ["77"]}])
+def test_no_applied_filter_is_rejected(params):
+    with pytest.raises(UnfilteredQueryError):
+        apply_filters(params)
+
+
+def test_unfiltered_query_allowed_explicitly():
+    stmt = apply_filters({"typo": ["77"]}, allow_unfiltered=True)
+    assert stmt.whereclause is None
@@ -0,0 +1,202 @@
+import asyncio
+import io
+import os
+import time
+
+import pytest
+
+from exceptions import ArtefactTooLargeError
+from schemas.templater import TemplaterRequest
+from services.report_jobs import ReportJobQueue
+from utils import job_store
+from utils.job_store import (
+    JOB_DONE,
+    JOB_QUEUED,
+    JOB_RUNNING,
+    ArtefactStore,
+    ReportJobStore,
+)
+
+LEASE = 60
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(job_store.time, "time", lambda: now[0])
+    return now
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / "jobs" / "jobs.db")
+
+
+def open_store(path: str) -> ReportJobStore:
+    store = ReportJobStore(path, LEASE)
+    store.open()
+    return store
+
+
+def test_store_does_not_open_database_until_open(db_path):
+    store = ReportJobStore(db_path, LEASE)
+
+    assert not os.path.exists(db_path)
+    store.open()
+    assert os.path.exists(db_path)
+    store.close()
+
+
+def test_create_and_lease(db_path):
+    store = open_store(db_path)
+
+    job = store.create(1, "xlsx", {"fields": {}})
+
+    assert job["status"] == JOB_QUEUED
+    assert store.list_queued() == [job["id"]]
+    assert store.mark_running(job["id"])
+    assert not store.mark_running(job["id"])
+    job = store.get(job["id"])
+    assert job["status"] == JOB_RUNNING
+    assert job["owner"] == store.owner
+    assert store.list_queued() == []
+    store.close()
+
+
+def test_heartbeat_keeps_lease(db_path, clock):
+    store = open_store(db_path)
+    job_id = store.create(1, "xlsx", {})["id"]
+    store.mark_running(job_id)
+
+    clock[0] += LEASE - 1
+    store.heartbeat([job_id])
+    clock[0] += LEASE - 1
+
+    assert store.requeue_expired() == []
+    assert store.get(job_id)["status"] == JOB_RUNNING
+    store.close()
+
+
+def test_expired_lease_is_requeued(db_path, clock):
+    first = open_store(db_path)
+    second = open_store(db_path)
+    job_id = first.create(1, "xlsx", {})["id"]
+    first.mark_running(job_id)
+
+    clock[0] += LEASE + 1
+
+    assert second.requeue_expired() == [job_id]
+    job = second.get(job_id)
+    assert job["status"] == JOB_QUEUED
+    assert job["owner"] is None
+    assert second.mark_running(job_id)
+    # Прежний владелец потерял аренду и не завершает задачу
+    first.mark_done(job_id, 10)
+    assert second.get(job_id)["status"] == JOB_RUNNING
+    second.mark_done(job_id, 20)
+    job = second.get(job_id)
+    assert (job["status"], job["size"]) == (JOB_DONE, 20)
+    first.close()
+    second.close()
+
+
+def test_purge_removes_finished_jobs(db_path, clock):
+    store = open_store(db_path)
+    finished_id = store.create(1, "xlsx", {})["id"]
+    store.mark_running(finished_id)
+    store.mark_failed(finished_id, "error")
+    queued_id = store.create(1, "xlsx", {})["id"]
+
+    clock[0] += 10
+
+    assert store.purge(clock[0]) == 1
+    assert store.get(finished_id) is None
+    assert store.get(queued_id) is not None
+    store.close()
+
+
+def test_artefact_put_and_open(tmp_path):
+    artefacts = ArtefactStore(str(tmp_path), 1024, 60)
+
+    assert artefacts.put("abc", io.BytesIO(b"report")) == 6
+    with artefacts.open("abc") as file:
+        assert file.read() == b"report"
+    assert artefacts.open("missing") is None
+    with pytest.raises(ValueError):
+        artefacts.open("../abc")
+
+
+def test_artefact_too_large(tmp_path):
+    artefacts = ArtefactStore(str(tmp_path), 4, 60)
+
+    with pytest.raises(ArtefactTooLargeError):
+        artefacts.put("abc", io.BytesIO(b"report"))
+    assert os.listdir(tmp_path) == []
+
+
+def test_artefact_expires(tmp_path):
+    artefacts = ArtefactStore(str(tmp_path), 1024, 60)
+    artefacts.put("abc", io.BytesIO(b"report"))
+    stale = time.time() - 120
+    os.utime(tmp_path / "abc", (stale, stale))
+
+    assert artefacts.open("abc") is None
+    assert not os.path.exists(tmp_path / "abc")
+
+
+def test_artefact_sweep_evicts_oldest(tmp_path):
+    artefacts = ArtefactStore(str(tmp_path), 10, 60)
+    for index, job_id in enumerate(("first", "second")):
+        artefacts.put(job_id, io.BytesIO(b"12345"))
+        mtime = time.time() - 10 + index
+        os.utime(tmp_path / job_id, (mtime, mtime))
+
+    artefacts.put("third", io.BytesIO(b"12345"))
+
+    assert sorted(os.listdir(tmp_path)) == ["second", "third"]
+
+
+class FakeWorkspace:
+    def cleanup(self) -> None:
+        pass
+
+
+def test_worker_survives_job_error(db_path, tmp_path, monkeypatch):
+    store = ReportJobStore(db_path, LEASE)
+    artefacts = ArtefactStore(str(tmp_path / "artefacts"), 1024, 60)
+    queue = ReportJobQueue(store, artefacts, workers=1)
+
+    async def render(job):
+        return io.BytesIO(b"report"), FakeWorkspace()
+
+    monkeypatch.setattr(queue, "_render", render)
+    mark_running = store.mark_running
+    calls = []
+
+    def failing_mark_running(job_id):
+        calls.append(job_id)
+        if len(calls) == 1:
+            raise RuntimeError("database is locked")
+        return mark_running(job_id)
+
+    monkeypatch.setattr(store, "mark_running", failing_mark_running)
+
+    async def run():
+        await queue.start()
+        try:
+            params = TemplaterRequest(fields={})
+            failed = await queue.submit(1, "xlsx", params)
+            done = await queue.submit(1, "xlsx", params)
+            return (
+                await queue.wait(failed["id"], 5),
+                await queue.wait(done["id"], 5),
+            )
+        finally:
+            await queue.shutdown()
+
+    failed, done = asyncio.run(run())
+
+    assert failed["status"] == JOB_QUEUED
+    assert done["status"] == JOB_DONE
+    with artefacts.open(done["id"]) as file:
+        assert file.read() == b"report"
@@ -0,0 +1,153 @@
+import os
+from copy import copy
+
+import openpyxl
+import pytest
+from openpyxl.styles import Border, Font, PatternFill, Side
+
+from loaded_env import get_variables
+from schemas.templater import TemplaterRequest
+from services import xlsx_streaming
+from services.templaterXlsx import TemplaterXlsx, _compile_xlsx_template
+from utils.query_rows import QueryRows
+
+STYLE_ATTRIBUTES = (
+    "font",
+    "fill",
+    "border",
+    "alignment",
+    "number_format",
+    "protection",
+)
+
+
+def build_template(path: str, block_merge: str = "D4:E4") -> None:
+    book = openpyxl.Workbook()
+    sheet = book.active
+    sheet["A1"] = "Справка {{title}}"
+    sheet.merge_cells("A1:E1")
+    sheet["A2"] = "{{1:0;name}}"
+    sheet["A3"] = "№"
+    sheet["B3"] = "Имя"
+    sheet["C3"] = "Сумма"
+    side = Side(style="thin")
+    for column_index, column_name in enumerate(("n", "name", "amount"), 1):
+        cell = sheet.cell(
+            row=4, column=column_index, value=f"{{{{1;{column_name}}}}}"
+        )
+        cell.font = Font(bold=True)
+        cell.border = Border(left=side, right=side, top=side, bottom=side)
+        cell.fill = PatternFill("solid", fgColor="FFF2CC")
+        cell.number_format = "#,##0.00"
+    sheet["D4"] = "{{2;x}}"
+    sheet.merge_cells(block_merge)
+    sheet["A5"] = "Итого"
+    sheet["A6"] = "{{3;v}}"
+    sheet["B6"] = "{{3;w}}"
+    sheet["C6"] = "const"
+    sheet["A7"] = "{{99;missing}}"
+    sheet["A8"] = "Подвал"
+    sheet.merge_cells("A8:B9")
+    sheet.row_dimensions[4].height = 30
+    sheet.row_dimensions[5].height = 20
+    sheet.column_dimensions["B"].width = 40
+    book.save(path)
+
+
+def build_responses() -> dict[int, QueryRows]:
+    return {
+        1: QueryRows(
+            ["n", "name", "amount"],
+            [(i, f"name {i}", i * 1.5) for i in range(4)],
+        ),
+        2: QueryRows(["x"], [("a",), ("b",)]),
+        3: QueryRows(["v", "w"], [(1, None), (2, "q")]),
+    }
+
+
+@pytest.fixture
+def template_path(tmp_path):
+    path = str(tmp_path / "template.xlsx")
+    build_template(path)
+    return path
+
+
+def render(path: str, streaming: bool, monkeypatch) -> openpyxl.Workbook:
+    monkeypatch.setattr(
+        get_variables(), "XLSX_STREAMING_MIN_ROWS", 0 if streaming else 10**9
+    )
+    templater = TemplaterXlsx(
+        None, 1, TemplaterRequest(fields={"title": "Т"})
+    )
+    templater.template_file_path = path
+    templater.query_responses = build_responses()
+    try:
+        return openpyxl.load_workbook(templater._render())
+    finally:
+        templater.cleanup_workspace()
+
+
+def snapshot(book: openpyxl.Workbook) -> dict:
+    sheet = book.active
+    return {
+        "cells": [
+            [
+                (
+                    cell.value,
+                    # Стили ячейки - StyleProxy, сравниваются их копии
+                    *(copy(getattr(cell, name)) for name in STYLE_ATTRIBUTES),
+                )
+                for cell in row
+            ]
+            for row in sheet.iter_rows()
+        ],
+        "merges": sorted(str(merged) for merged in sheet.merged_cells),
+        "rows": {
+            index: (dimension.height, dimension.hidden)
+            for index, dimension in sheet.row_dimensions.items()
+            if dimension.height or dimension.hidden
+        },
+        "columns": {
+            key: dimension.width
+            for key, dimension in sheet.column_dimensions.items()
+        },
+        "footer": sheet.oddFooter.right.text,
+    }
+
+
+def test_streaming_matches_regular_render(template_path, monkeypatch):
+    calls = []
+    original_render = xlsx_streaming.XlsxStreamWriter.render
+
+    def spy_render(self):
+        calls.append(self)
+        return original_render(self)
+
+    regular = snapshot(render(template_path, False, monkeypatch))
+    monkeypatch.setattr(
+        xlsx_streaming.XlsxStreamWriter, "render", spy_render
+    )
+    streamed = snapshot(render(template_path, True, monkeypatch))
+
+    assert calls
+    assert streamed == regular
+
+
+def test_streaming_merges_do_not_overlap(template_path, monkeypatch):
+    sheet = render(template_path, True, monkeypatch).active
+    cells = [
+        cell
+        for merged in sheet.merged_cells.ranges
+        for cell in merged.cells
+    ]
+    assert len(cells) == len(set(cells))
+
+
+def test_multirow_block_merge_is_not_streamable(tmp_path):
+    path = str(tmp_path / "template.xlsx")
+    build_template(path, block_merge="D4:E5")
+    stat = os.stat(path)
+
+    compiled = _compile_xlsx_template(path, stat.st_mtime_ns, stat.st_size)
+
+    assert not compiled.streamable
@@ -0,0 +1,117 @@
+import os
+from copy import copy
+
+import openpyxl
+import pytest
+from openpyxl.styles import Alignment, Border, Font, PatternFill, Side
+
+from conftest import SRC_DIR
+from services.templaterXlsx import _compile_xlsx_template
+
+STYLE_ATTRIBUTES = (
+    "font",
+    "fill",
+    "border",
+    "alignment",
+    "number_format",
+    "protection",
+)
+
+
+def build_template(path: str) -> None:
+    book = openpyxl.Workbook()
+    sheet = book.active
+    sheet.title = "Справка"
+    sheet["A1"] = "Справка {{title}}"
+    sheet.merge_cells("A1:D1")
+    sheet.row_dimensions[1].height = 32
+    sheet.column_dimensions["B"].width = 40
+    side = Side(style="thin")
+    for column_index, column_name in enumerate(("n", "name", "amount"), 1):
+        cell = sheet.cell(
+            row=3, column=column_index, value=f"{{{{1;{column_name}}}}}"
+        )
+        cell.font = Font(name="Times New Roman", size=11, bold=True)
+        cell.border = Border(left=side, right=side, top=side, bottom=side)
+        cell.fill = PatternFill("solid", fgColor="FFF2CC")
+        cell.alignment = Alignment(wrap_text=True, vertical="top")
+        cell.number_format = "#,##0.00"
+    sheet.merge_cells("B5:C6")
+    sheet["B5"] = "Итого"
+    sheet.row_dimensions[5].hidden = True
+    other = book.create_sheet("Прочее")
+    other["A1"] = 42
+    other.column_dimensions["A"].width = 12
+    book.save(path)
+
+
+@pytest.fixture(
+    params=["bundled", "styled"],
+)
+def template_path(request, tmp_path):
+    if request.param == "bundled":
+        return os.path.join(SRC_DIR, "templates", "template0.xlsx")
+    path = str(tmp_path / "template.xlsx")
+    build_template(path)
+    return path
+
+
+def compile_template(path: str):
+    stat = os.stat(path)
+    return _compile_xlsx_template(path, stat.st_mtime_ns, stat.st_size)
+
+
+def snapshot(book: openpyxl.Workbook) -> dict:
+    sheets = {}
+    for sheet in book.worksheets:
+        sheets[sheet.title] = {
+            "cells": {
+                # Стили ячейки - StyleProxy, сравниваются их копии
+                cell.coordinate: (
+                    cell.value,
+                    *(copy(getattr(cell, name)) for name in STYLE_ATTRIBUTES),
+                )
+                for row in sheet.iter_rows()
+                for cell in row
+            },
+            "merges": sorted(str(merged) for merged in sheet.merged_cells),
+            "rows": {
+                index: (dimension.height, dimension.hidden)
+                for index, dimension in sheet.row_dimensions.items()
+            },
+            "columns": {
+                key: (dimension.width, dimension.hidden)
+                for key, dimension in sheet.column_dimensions.items()
+            },
+            "dimensions": sheet.dimensions,
+        }
+    return {"active": book.active.title, "sheets": sheets}
+
+
+def test_new_workbook_matches_load_workbook(template_path):
+    clone = compile_template(template_path).new_workbook()
+    assert snapshot(clone) == snapshot(openpyxl.load_workbook(template_path))
+
+
+def test_new_workbook_saves_like_load_workbook(template_path, tmp_path):
+    clone_path = tmp_path / "clone.xlsx"
+    loaded_path = tmp_path / "loaded.xlsx"
+    compile_template(template_path).new_workbook().save(clone_path)
+    openpyxl.load_workbook(template_path).save(loaded_path)
+    assert snapshot(openpyxl.load_workbook(clone_path)) == snapshot(
+        openpyxl.load_workbook(loaded_path)
+    )
+
+
+def test_new_workbook_copies_are_independent(template_path):
+    compiled = compile_template(template_path)
+    first = compiled.new_workbook()
+    sheet = first.active
+    sheet["A1"] = "changed"
+    sheet.row_dimensions[100].height = 10
+    sheet.column_dimensions["Z"].width = 5
+
+    second = compiled.new_workbook()
+    assert second.active["A1"].value != "changed"
+    assert 100 not in second.active.row_dimensions
+    assert "Z" not in second.active.column_dimensions
@@ -0,0 +1,69 @@
+import io
+import os
+import re
+import zipfile
+
+import pytest
+
+from conftest import SRC_DIR
+from utils.zip_rewriter import RAW_COPY_SUPPORTED, rewrite_zip
+
+TEMPLATE_PATH = os.path.join(SRC_DIR, "templates", "template0.docx")
+DOCUMENT_PATTERN = re.compile(r"word/document\.xml")
+
+
+def patch(name: str, content: bytes) -> bytes:
+    return content.replace(b"<w:body>", b"<w:body><!-- patched -->")
+
+
+def rewrite(raw_copy: bool) -> tuple[bytes, list[str]]:
+    with open(TEMPLATE_PATH, "rb") as file:
+        source = file.read()
+    output = io.BytesIO()
+    changed = rewrite_zip(
+        source,
+        output,
+        DOCUMENT_PATTERN,
+        patch,
+        extra_members={"customXml/extra.xml": b"<extra/>"},
+        raw_copy=raw_copy,
+    )
+    return output.getvalue(), changed
+
+
+def members(archive: bytes) -> list[tuple[str, bytes]]:
+    with zipfile.ZipFile(io.BytesIO(archive)) as zip_file:
+        assert zip_file.testzip() is None
+        return [
+            (info.filename, zip_file.read(info))
+            for info in zip_file.infolist()
+        ]
+
+
+def test_raw_copy_is_supported():
+    assert RAW_COPY_SUPPORTED
+
+
+@pytest.mark.parametrize("raw_copy", [True, False])
+def test_rewrite_patches_only_matching_members(raw_copy):
+    archive, changed = rewrite(raw_copy)
+    with zipfile.ZipFile(TEMPLATE_PATH) as template:
+        expected = {
+            info.filename: template.read(info)
+            for info in template.infolist()
+        }
+
+    result = dict(members(archive))
+    assert changed == ["word/document.xml", "customXml/extra.xml"]
+    assert result.pop("customXml/extra.xml") == b"<extra/>"
+    assert result.pop("word/document.xml") == patch(
+        "", expected.pop("word/document.xml")
+    )
+    assert result == expected
+
+
+def test_raw_copy_matches_public_api_output():
+    raw_archive, raw_changed = rewrite(raw_copy=True)
+    public_archive, public_changed = rewrite(raw_copy=False)
+    assert raw_changed == public_changed
+    assert members(raw_archive) == members(public_archive)